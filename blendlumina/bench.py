@@ -0,0 +1,139 @@
+"""
+Minimal HTTP benchmark runner.
+
+A scenario is a name plus a callable that returns the next request as a dict
+(``method``, ``path``, optional ``data``). ``run_scenarios`` sends every
+scenario ``warmup + iterations`` times through a transport and reports latency
+percentiles, throughput and SQL query counts for the measured iterations.
+
+Two transports are available:
+
+* ``ClientTransport`` goes through ``django.test.Client`` in this process, i.e.
+  the full middleware stack and the real URLconf; query counts are captured
+  with ``CaptureQueriesContext``.
+* ``HttpTransport`` sends real HTTP requests to a running server (runserver,
+  gunicorn, ...) with one keep-alive connection; query counts are read from
+  the ``X-Query-Count`` header, which the server only sends in ``DEBUG``.
+
+The report is a plain dict that serialises to JSON, so runs on different
+commits or databases can be diffed.
+"""
+import http.client
+import json
+import time
+from urllib.parse import urlsplit
+
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+
+def percentile(sorted_values, fraction):
+    """线性插值的百分位数，sorted_values 需已排序"""
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class ClientTransport:
+    """通过 Django 测试客户端在进程内发送请求"""
+    name = 'client'
+
+    def __init__(self, user=None):
+        self.client = Client(HTTP_HOST='localhost', raise_request_exception=False)
+        if user is not None:
+            self.client.force_login(user)
+
+    def send(self, method, path, data=None):
+        kwargs = {}
+        if data is not None:
+            kwargs = {'data': json.dumps(data), 'content_type': 'application/json'}
+        # DEBUG 下查询日志有长度上限，逐个请求清空
+        reset_queries()
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method.lower())(path, **kwargs)
+        return response.status_code, len(context)
+
+
+class HttpTransport:
+    """向运行中的服务器发送 HTTP 请求，查询数取自 X-Query-Count 响应头"""
+    name = 'http'
+
+    def __init__(self, base_url, token=None):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(parts.netloc, timeout=30)
+        self.prefix = parts.path.rstrip('/')
+        self.headers = {'Accept': 'application/json'}
+        if token:
+            self.headers['Authorization'] = f'Token {token}'
+
+    def send(self, method, path, data=None):
+        headers = dict(self.headers)
+        body = None
+        if data is not None:
+            body = json.dumps(data).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        self.connection.request(method.upper(), self.prefix + path, body=body, headers=headers)
+        response = self.connection.getresponse()
+        response.read()
+        queries = response.getheader('X-Query-Count')
+        return response.status, int(queries) if queries is not None else None
+
+
+def summarize(latencies, statuses, queries, elapsed):
+    latencies = sorted(latencies)
+    counts = [count for count in queries if count is not None]
+    errors = sum(1 for status in statuses if status >= 400)
+    by_status = {}
+    for status in statuses:
+        by_status[str(status)] = by_status.get(str(status), 0) + 1
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'status': by_status,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'queries': {
+            'min': min(counts),
+            'max': max(counts),
+            'mean': round(sum(counts) / len(counts), 2),
+        } if counts else None,
+    }
+
+
+def run_scenario(transport, next_request, iterations, warmup=0):
+    """执行一个场景，返回统计结果"""
+    for _ in range(warmup):
+        request = next_request()
+        transport.send(request['method'], request['path'], request.get('data'))
+
+    latencies, statuses, queries = [], [], []
+    elapsed = 0.0
+    for _ in range(iterations):
+        # 准备请求（如预先创建待支付订单）不计入耗时
+        request = next_request()
+        started = time.perf_counter()
+        status, count = transport.send(request['method'], request['path'], request.get('data'))
+        duration = time.perf_counter() - started
+        elapsed += duration
+        latencies.append(duration)
+        statuses.append(status)
+        queries.append(count)
+    return summarize(latencies, statuses, queries, elapsed)
+
+
+def run_scenarios(transport, scenarios, iterations, warmup=0, on_result=None):
+    """依次执行多个场景，返回 {名称: 统计结果}"""
+    results = {}
+    for name, next_request in scenarios.items():
+        results[name] = run_scenario(transport, next_request, iterations, warmup)
+        if on_result:
+            on_result(name, results[name])
+    return results
@@ -0,0 +1,70 @@
+"""
+Conditional GET for DRF detail endpoints.
+
+``ConditionalRetrieveMixin`` derives an ETag and ``Last-Modified`` from the
+object's ``updated_at`` plus the generations of the models its nested data
+comes from (e.g. the category tree). ``If-None-Match`` / ``If-Modified-Since``
+are answered with a 304 after one indexed ``values_list`` query, before the
+object is loaded or serialized.
+
+Related rows that live in their own tables (product images, tag relations)
+touch the parent's ``updated_at`` when they change. Buffered counters such as
+``views_count`` are deliberately not part of the validators: they change on
+every visit and would turn every poll into a full response. The body is
+therefore only semantically equivalent between two matching responses, so
+the ETag is weak (``W/"..."``); ``If-None-Match`` uses weak comparison.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .generations import get_generations_modified
+
+
+class ConditionalRetrieveMixin:
+    """retrieve 支持 ETag / Last-Modified 条件请求"""
+    validator_field = 'updated_at'
+    # 嵌套数据所依赖模型的版本号标签，如 'products.category'
+    validator_generations = ()
+
+    def get_validator_queryset(self):
+        return self.filter_queryset(self.get_queryset()).prefetch_related(None)
+
+    def get_validators(self, request):
+        """返回 (etag, last_modified 时间戳)；对象不存在时返回 None"""
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.get_validator_queryset().filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        updated_at = queryset.order_by().values_list(self.validator_field, flat=True).first()
+        if updated_at is None:
+            return None
+
+        generations, generation_modified = get_generations_modified(self.validator_generations)
+        renderer = getattr(request, 'accepted_renderer', None)
+        raw = ':'.join([
+            queryset.model._meta.label_lower,
+            str(self.kwargs[lookup_url_kwarg]),
+            updated_at.isoformat(),
+            '.'.join(str(value) for value in generations),
+            getattr(renderer, 'format', ''),
+        ])
+        # 计数不参与校验，同一 ETag 的响应体可能不同，只能是弱 ETag
+        etag = 'W/' + quote_etag(hashlib.md5(raw.encode('utf-8')).hexdigest())
+        last_modified = updated_at.timestamp()
+        if generation_modified is not None:
+            last_modified = max(last_modified, generation_modified)
+        return etag, int(last_modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        validators = self.get_validators(request)
+        if validators is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        etag, last_modified = validators
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response.headers['ETag'] = etag
+            response.headers['Last-Modified'] = http_date(last_modified)
+        return response
@@ -0,0 +1,151 @@
+"""
+Write-behind counters for views_count / likes_count style columns.
+
+Increments are coalesced in process and flushed periodically as batched
+``UPDATE ... SET field = field + N`` statements, so a hot row no longer takes
+a full-row ``save()`` per hit. Readers can merge the buffered deltas into the
+stored value with ``counter_buffer.live_value``.
+
+Settings:
+    COUNTER_WRITE_BEHIND     关闭时每次递增立即执行 F() 更新（默认 True）
+    COUNTER_FLUSH_INTERVAL   最长缓冲秒数（默认 5）
+    COUNTER_FLUSH_THRESHOLD  缓冲的不同计数键数量上限，超过立即刷新（默认 500）
+"""
+import atexit
+import logging
+import threading
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+from django.db.models import F
+from django.dispatch import Signal
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+# 刷新完成后发送，changed 为 {模型标签: {主键, ...}}
+counters_flushed = Signal()
+
+
+class CounterBuffer:
+    """进程内计数缓冲区"""
+
+    def __init__(self):
+        self._deltas = defaultdict(int)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+    @property
+    def write_behind(self):
+        return getattr(settings, 'COUNTER_WRITE_BEHIND', True)
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'COUNTER_FLUSH_INTERVAL', 5)
+
+    @property
+    def flush_threshold(self):
+        return getattr(settings, 'COUNTER_FLUSH_THRESHOLD', 500)
+
+    def increment(self, instance, field, amount=1):
+        """递增计数并返回合并缓冲后的近似值"""
+        model = type(instance)
+        if not self.write_behind:
+            model._default_manager.filter(pk=instance.pk).update(**{field: F(field) + amount})
+            setattr(instance, field, getattr(instance, field) + amount)
+            return getattr(instance, field)
+
+        key = (model._meta.label, instance.pk, field)
+        with self._lock:
+            self._deltas[key] += amount
+            pending = self._deltas[key]
+            size = len(self._deltas)
+            if self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        if size >= self.flush_threshold:
+            self.flush()
+        return getattr(instance, field) + pending
+
+    def pending(self, model, pk, field):
+        """尚未写入数据库的增量"""
+        return self._deltas.get((model._meta.label, pk, field), 0)
+
+    def live_value(self, instance, field):
+        """数据库中的值加上缓冲的增量"""
+        return (getattr(instance, field) or 0) + self.pending(type(instance), instance.pk, field)
+
+    def flush(self):
+        """把缓冲的增量合并为批量 F() 更新写入数据库，返回执行的 UPDATE 数"""
+        with self._flush_lock:
+            with self._lock:
+                deltas, self._deltas = self._deltas, defaultdict(int)
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not deltas:
+                return 0
+
+            # 相同模型、字段和增量的行合并为一条 UPDATE
+            groups = defaultdict(list)
+            for (label, pk, field), amount in deltas.items():
+                if amount:
+                    groups[(label, field, amount)].append(pk)
+
+            changed = defaultdict(set)
+            written = set()
+            try:
+                for group, pks in groups.items():
+                    label, field, amount = group
+                    model = apps.get_model(label)
+                    model._default_manager.filter(pk__in=pks).update(**{field: F(field) + amount})
+                    changed[label].update(pks)
+                    written.add(group)
+            except Exception:
+                logger.exception('计数刷新失败，未写入的增量已放回缓冲区')
+                self._restore(deltas, written)
+                raise
+            counters_flushed.send(sender=self.__class__, changed=dict(changed))
+            return len(written)
+
+    def _restore(self, deltas, written):
+        with self._lock:
+            for (label, pk, field), amount in deltas.items():
+                if (label, field, amount) not in written:
+                    self._deltas[(label, pk, field)] += amount
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        except Exception:
+            # 已记录日志，增量留待下次刷新
+            pass
+        finally:
+            # 定时线程使用独立的数据库连接，用完即关闭
+            connection.close()
+
+
+counter_buffer = CounterBuffer()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        counter_buffer.flush()
+    except Exception:
+        pass
+
+
+class LiveCounterField(serializers.IntegerField):
+    """只读计数字段，输出数据库值与缓冲增量之和"""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        return counter_buffer.live_value(instance, self.source)
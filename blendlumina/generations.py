@@ -0,0 +1,84 @@
+"""
+Per-model generation counters stored in the Django cache.
+
+A generation is a monotonically increasing integer bumped whenever rows of a
+tracked model are saved or deleted. Cached data keyed by a generation is
+therefore invalidated exactly, without TTL guessing. The time of the latest
+bump is stored alongside, so HTTP validators can derive ``Last-Modified``.
+
+The counters must be visible to every process, so the default cache has to be
+a shared backend such as Redis; ``blendlumina.shared_cache`` refuses to start
+on a process-local one. Bumps run after the surrounding transaction commits:
+a process that sees the new generation always reads the committed rows, and
+a rolled-back write bumps nothing.
+"""
+import time
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+GENERATION_KEY_PREFIX = 'generation:'
+
+
+def _generation_key(label):
+    return f'{GENERATION_KEY_PREFIX}{label}'
+
+
+def _modified_key(label):
+    return f'{GENERATION_KEY_PREFIX}{label}:modified'
+
+
+def get_generation(label):
+    """获取某个模型当前的版本号"""
+    return cache.get(_generation_key(label), 0)
+
+
+def get_generations(labels):
+    """一次读取多个模型的版本号，按传入顺序返回"""
+    keys = [_generation_key(label) for label in labels]
+    values = cache.get_many(keys)
+    return [values.get(key, 0) for key in keys]
+
+
+def get_generations_modified(labels):
+    """
+    一次读取多个模型的版本号及最近一次递增的时间戳。
+
+    返回 (版本号列表, 时间戳)；没有任何递增记录时时间戳为 None。
+    """
+    keys = [_generation_key(label) for label in labels]
+    modified_keys = [_modified_key(label) for label in labels]
+    values = cache.get_many(keys + modified_keys)
+    stamps = [values[key] for key in modified_keys if key in values]
+    return [values.get(key, 0) for key in keys], max(stamps) if stamps else None
+
+
+def bump_generation(label):
+    """事务提交后递增模型版本号，使依赖它的缓存全部失效；不在事务中时立即递增"""
+    transaction.on_commit(partial(_bump, label))
+
+
+def _bump(label):
+    key = _generation_key(label)
+    cache.set(_modified_key(label), time.time(), timeout=None)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # 键不存在（首次写入或缓存被清空）
+        if cache.add(key, 1, timeout=None):
+            return 1
+        return cache.incr(key)
+
+
+def _bump_for_instance(sender, **kwargs):
+    bump_generation(sender._meta.label_lower)
+
+
+def track_model(model):
+    """为模型注册 post_save / post_delete 信号，写入时自动递增版本号"""
+    label = model._meta.label_lower
+    post_save.connect(_bump_for_instance, sender=model, dispatch_uid=f'generation:save:{label}')
+    post_delete.connect(_bump_for_instance, sender=model, dispatch_uid=f'generation:delete:{label}')
+    return label
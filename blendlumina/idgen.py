@@ -0,0 +1,175 @@
+"""
+Snowflake-style 64-bit ids for order numbers and payment transaction ids.
+
+An id is ``timestamp << 22 | worker << 12 | sequence``:
+
+* 41 bits of milliseconds since ``EPOCH`` (2024-01-01 UTC, about 69 years);
+* 10 bits of worker id, unique per process;
+* 12 bits of sequence, 4096 ids per millisecond per process.
+
+Ids are allocated in process without touching the database, they never repeat
+across processes as long as worker ids are unique, and they grow with time, so
+inserts land at the right edge of the unique index instead of at random pages.
+If the clock steps back, or the sequence runs out within a millisecond, the
+generator keeps counting from the last timestamp it issued rather than
+waiting, so ids stay monotonic per process.
+
+The worker id is ``ID_WORKER_ID`` when set (give every process its own, e.g.
+from a gunicorn ``post_fork`` hook). Otherwise each process leases a free one
+from the Django cache with ``cache.add`` and renews the lease while it runs
+(``cache.touch`` followed by an owner check, never a blind ``set``);
+this needs a cache shared by all hosts (Redis or Memcached). With a
+process-local cache every process would lease the same ids, so leasing raises
+``ImproperlyConfigured`` unless ``SHARED_CACHE_REQUIRED`` is off (a single
+process, see ``blendlumina/shared_cache.py``). A forked child notices the new
+pid and leases its own id.
+
+``new_order_number()`` and ``new_transaction_id()`` render ids as fixed-width
+base36, so string order matches numeric order: ``BL`` + 13 characters for
+orders, ``TXN`` / ``REF`` + 13 characters for payments and refunds.
+
+Settings:
+    ID_WORKER_ID     固定的 worker id（0-1023），为空时从缓存租用
+    ID_WORKER_LEASE  租用 worker id 的有效期（秒，默认 3600），过半时续租
+"""
+import os
+import socket
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+from .shared_cache import cache_is_shared, shared_cache_required
+
+EPOCH = 1704067200000  # 2024-01-01T00:00:00Z，毫秒；修改会破坏已有ID的顺序
+WORKER_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+BASE36_WIDTH = 13  # 2**64 在 base36 下为 13 位
+BASE36_DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+WORKER_KEY_PREFIX = 'idgen:worker:'
+
+
+class SnowflakeGenerator:
+    """进程内的ID生成器，线程安全"""
+
+    def __init__(self, worker_id=None):
+        self._fixed_worker_id = worker_id
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._worker_id = None
+        self._owner = None
+        self._leased_at = 0
+        self._last_timestamp = -1
+        self._sequence = 0
+
+    @property
+    def lease(self):
+        return getattr(settings, 'ID_WORKER_LEASE', 3600)
+
+    @property
+    def worker_id(self):
+        with self._lock:
+            return self._ensure_worker()
+
+    def _ensure_worker(self):
+        if self._pid != os.getpid():
+            self._reset()
+        if self._worker_id is None:
+            configured = self._fixed_worker_id
+            if configured is None:
+                configured = getattr(settings, 'ID_WORKER_ID', None)
+            if configured is not None:
+                configured = int(configured)
+                if not 0 <= configured <= MAX_WORKER_ID:
+                    raise ValueError(f'ID_WORKER_ID 必须在 0-{MAX_WORKER_ID} 之间')
+                self._worker_id = configured
+            else:
+                self._worker_id = self._lease_worker_id()
+        elif self._owner is not None and time.monotonic() - self._leased_at > self.lease / 2:
+            self._renew_lease()
+        return self._worker_id
+
+    def _lease_worker_id(self):
+        """从缓存租用一个空闲的 worker id，起点由主机名和进程号决定以减少冲突"""
+        if shared_cache_required() and not cache_is_shared():
+            raise ImproperlyConfigured('未设置 ID_WORKER_ID，且默认缓存不是进程间共享的后端，无法租用唯一的 worker id')
+        self._owner = f'{socket.gethostname()}:{self._pid}:{uuid.uuid4().hex[:8]}'
+        start = zlib.crc32(f'{socket.gethostname()}:{self._pid}'.encode()) % (MAX_WORKER_ID + 1)
+        for offset in range(MAX_WORKER_ID + 1):
+            worker_id = (start + offset) % (MAX_WORKER_ID + 1)
+            if cache.add(f'{WORKER_KEY_PREFIX}{worker_id}', self._owner, self.lease):
+                self._leased_at = time.monotonic()
+                return worker_id
+        raise RuntimeError('没有可用的 worker id，请设置 ID_WORKER_ID')
+
+    def _renew_lease(self):
+        """
+        续租：先 touch 延长有效期，再确认归属。
+
+        租用只用 cache.add，不会覆盖未过期的键，因此 touch 成功后到确认之间键不会易主；
+        不写入值，也就不会抢占其他进程在本租约过期后租到的同一个 worker id。
+        """
+        key = f'{WORKER_KEY_PREFIX}{self._worker_id}'
+        if cache.touch(key, self.lease) and cache.get(key) == self._owner:
+            self._leased_at = time.monotonic()
+        else:
+            # 租约已过期（或已被其他进程占用，touch 只延长了对方的租约），换一个 worker id；
+            # 时间戳继续递增，不会与旧ID重复
+            self._worker_id = self._lease_worker_id()
+
+    def next_id(self):
+        with self._lock:
+            worker_id = self._ensure_worker()
+            timestamp = max(int(time.time() * 1000) - EPOCH, self._last_timestamp)
+            if timestamp == self._last_timestamp:
+                self._sequence += 1
+                if self._sequence > MAX_SEQUENCE:
+                    # 本毫秒的序号用完（或时钟回拨），借用下一毫秒
+                    timestamp += 1
+                    self._sequence = 0
+            else:
+                self._sequence = 0
+            self._last_timestamp = timestamp
+            return (timestamp << (WORKER_BITS + SEQUENCE_BITS)) | (worker_id << SEQUENCE_BITS) | self._sequence
+
+
+def to_base36(value, width=BASE36_WIDTH):
+    """定宽 base36，字符串顺序与数值顺序一致"""
+    digits = []
+    while value:
+        value, remainder = divmod(value, 36)
+        digits.append(BASE36_DIGITS[remainder])
+    return ''.join(reversed(digits)).rjust(width, '0')
+
+
+def id_timestamp(value):
+    """ID 中的生成时间"""
+    milliseconds = (value >> (WORKER_BITS + SEQUENCE_BITS)) + EPOCH
+    return datetime.fromtimestamp(0, tz=dt_timezone.utc) + timedelta(milliseconds=milliseconds)
+
+
+generator = SnowflakeGenerator()
+
+
+def next_id():
+    return generator.next_id()
+
+
+def new_order_number():
+    """订单号：BL + 13 位 base36"""
+    return f'BL{to_base36(generator.next_id())}'
+
+
+def new_transaction_id(prefix='TXN'):
+    """支付流水号：TXN（支付）或 REF（退款）+ 13 位 base36"""
+    return f'{prefix}{to_base36(generator.next_id())}'
@@ -1,6 +1,12 @@
 """
 Custom middleware to bypass CSRF checks for API endpoints
 """
+from django.conf import settings
+
+from .query_budget import (
+    DEFAULT_REPORT_EVERY, QueryRecorder, QueryStats, check_budget, log_query_summary, resolve_budget, route_summary,
+)
+
 
 class DisableCSRFMiddleware:
     def __init__(self, get_response):
@@ -10,4 +16,33 @@ class DisableCSRFMiddleware:
         # 完全禁用 CSRF 检查
         setattr(request, '_dont_enforce_csrf_checks', True)
         response = self.get_response(request)
-        return response 
\ No newline at end of file
+        return response
+
+
+class QueryBudgetMiddleware:
+    """记录每个请求的 SQL 查询数、耗时和重复查询，检查视图集声明的查询预算"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+
+        route, budget = resolve_budget(request)
+        stats = QueryStats(route, recorder, budget)
+        response.query_stats = stats
+        if settings.DEBUG:
+            response['X-Query-Count'] = str(stats.count)
+            response['X-Query-Time'] = f'{stats.duration * 1000:.1f}ms'
+            response['X-Query-Duplicates'] = str(stats.duplicates)
+            if budget is not None:
+                response['X-Query-Budget'] = str(budget)
+
+        handled = route_summary.add(stats)
+        report_every = getattr(settings, 'QUERY_BUDGET_REPORT_EVERY', DEFAULT_REPORT_EVERY)
+        if report_every and handled % report_every == 0:
+            log_query_summary()
+        check_budget(stats)
+        return response
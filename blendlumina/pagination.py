@@ -0,0 +1,182 @@
+"""
+Pagination classes shared by the list endpoints.
+
+``KeysetPagination`` seeks past the last row of the previous page with a
+``(ordering field, id)`` predicate instead of ``OFFSET``, so each page costs
+the same no matter how deep the client scrolls, and no ``COUNT(*)`` is run.
+``HybridPagination`` keeps the default page-number behaviour and switches to
+keyset pagination per request (``?pagination=cursor`` or a ``cursor`` param).
+"""
+import base64
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """游标分页：按 (排序字段, id) 定位下一页，支持任意单字段排序"""
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    invalid_cursor_message = '无效的游标'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    @staticmethod
+    def get_ordering(queryset):
+        """返回 (字段名, 是否降序)；排序不是普通字段时返回 None"""
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        if not ordering:
+            return 'pk', False
+        first = ordering[0]
+        if not isinstance(first, str) or first == '?':
+            return None
+        name = first.lstrip('-')
+        if '__' in name:
+            return None
+        if name != 'pk':
+            try:
+                queryset.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                return None
+        return name, first.startswith('-')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size_value = self.get_page_size(request)
+        ordering = self.get_ordering(queryset)
+        if ordering is None:
+            ordering = ('pk', True)
+        name, descending = ordering
+        self.ordering_key = ('-' if descending else '') + name
+
+        field = None if name == 'pk' else queryset.model._meta.get_field(name)
+        if field is not None and field.primary_key:
+            field, name = None, 'pk'
+        nullable = field is not None and field.null
+
+        order_by = []
+        if field is not None:
+            expression = F(name)
+            if descending:
+                order_by.append(expression.desc(nulls_last=True) if nullable else expression.desc())
+            else:
+                order_by.append(expression.asc(nulls_first=True) if nullable else expression.asc())
+        order_by.append('-pk' if descending else 'pk')
+        queryset = queryset.order_by(*order_by)
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            try:
+                queryset = queryset.filter(self.seek_predicate(name, field, descending, cursor))
+            except (TypeError, ValueError, ValidationError):
+                # 游标中的 pk 或排序值无法转换为字段类型
+                raise NotFound(self.invalid_cursor_message)
+
+        rows = list(queryset[:self.page_size_value + 1])
+        self.has_next = len(rows) > self.page_size_value
+        rows = rows[:self.page_size_value]
+        self.next_position = None
+        if self.has_next and rows:
+            last = rows[-1]
+            value = None if field is None else field.value_from_object(last)
+            if value is not None:
+                value = field.value_to_string(last)
+            self.next_position = {'o': self.ordering_key, 'v': value, 'pk': last.pk}
+        return rows
+
+    @staticmethod
+    def seek_predicate(name, field, descending, cursor):
+        """生成“位于游标之后”的过滤条件；NULL 视为最小值"""
+        op = 'lt' if descending else 'gt'
+        after_pk = Q(**{f'pk__{op}': cursor['pk']})
+        if field is None:
+            return after_pk
+        value = cursor['v']
+        if value is None:
+            if descending:
+                return Q(**{f'{name}__isnull': True}) & after_pk
+            return Q(**{f'{name}__isnull': False}) | (Q(**{f'{name}__isnull': True}) & after_pk)
+        predicate = Q(**{f'{name}__{op}': value}) | (Q(**{name: value}) & after_pk)
+        if descending and field.null:
+            predicate |= Q(**{f'{name}__isnull': True})
+        return predicate
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            cursor['pk'], cursor['v'], cursor['o']
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if cursor['o'] != self.ordering_key:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, position):
+        data = json.dumps(position, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(data).decode('ascii')
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class HybridPagination(PageNumberPagination):
+    """默认页码分页；?pagination=cursor 或带 cursor 参数时改用游标分页"""
+    mode_query_param = 'pagination'
+    cursor_mode = 'cursor'
+    keyset_class = KeysetPagination
+
+    def use_keyset(self, request, queryset):
+        params = request.query_params
+        requested = (
+            params.get(self.mode_query_param) == self.cursor_mode
+            or self.keyset_class.cursor_query_param in params
+        )
+        # 按相关度等表达式排序的结果无法用游标定位，退回页码分页
+        return requested and self.keyset_class.get_ordering(queryset) is not None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.use_keyset(request, queryset):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,251 @@
+"""
+Per-request SQL instrumentation and per-endpoint query budgets.
+
+``QueryBudgetMiddleware`` wraps every database connection with
+``connection.execute_wrapper`` for the duration of a request and records the
+number of queries, the total SQL time and a fingerprint of every statement
+(literals and ``IN`` lists collapsed). Statements whose fingerprint occurs more
+than once are reported as duplicates: that is the signature of an N+1.
+
+Viewsets declare budgets per action::
+
+    class OrderViewSet(viewsets.ModelViewSet):
+        query_budgets = {'list': 6, 'retrieve': 6}
+
+The result of each request is
+
+* attached to the response as ``response.query_stats``;
+* sent as ``X-Query-Count`` / ``X-Query-Time`` / ``X-Query-Duplicates`` /
+  ``X-Query-Budget`` headers when ``DEBUG`` is on;
+* added to a rolling per-route window in this process, see
+  ``get_query_summary()``; the summary is logged every
+  ``QUERY_BUDGET_REPORT_EVERY`` requests.
+
+A request over its budget is logged as a warning. With
+``QUERY_BUDGET_ENFORCE = True`` (``QueryBudgetTestMixin`` turns it on) it
+raises ``QueryBudgetExceeded`` instead, so a test that requests the endpoint
+fails.
+
+Settings:
+    QUERY_BUDGET_ENFORCE       超出预算时抛出异常（默认 False，测试中开启）
+    QUERY_BUDGET_WINDOW        每个路由保留的最近请求数（默认 200）
+    QUERY_BUDGET_REPORT_EVERY  每处理多少个请求输出一次汇总日志（默认 1000，0 为不输出）
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.test.utils import CaptureQueriesContext, override_settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 200
+DEFAULT_REPORT_EVERY = 1000
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """请求的查询数超出所声明的预算"""
+
+
+def fingerprint(sql):
+    """SQL 的形状：去掉字面量，合并 IN 列表，用于识别重复查询"""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """作为 execute_wrapper 记录查询次数、耗时和指纹"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @contextmanager
+    def record(self):
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(self))
+            yield self
+
+    @property
+    def duplicates(self):
+        """重复执行的查询数（同一指纹除第一次外的次数）"""
+        return sum(count - 1 for count in self.fingerprints.values() if count > 1)
+
+    def top_duplicates(self, limit=3):
+        return [(sql, count) for sql, count in self.fingerprints.most_common(limit) if count > 1]
+
+
+class QueryStats:
+    """单个请求的统计结果"""
+
+    def __init__(self, route, recorder, budget):
+        self.route = route
+        self.count = recorder.count
+        self.duration = recorder.duration
+        self.duplicates = recorder.duplicates
+        self.top_duplicates = recorder.top_duplicates()
+        self.budget = budget
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.count > self.budget
+
+    def describe(self):
+        lines = [f'{self.route}: {self.count} 次查询（预算 {self.budget}），SQL 耗时 {self.duration * 1000:.1f}ms']
+        for sql, count in self.top_duplicates:
+            lines.append(f'  重复 {count} 次: {sql[:300]}')
+        return '\n'.join(lines)
+
+
+def resolve_budget(request):
+    """(路由名称, 预算)；预算来自视图集的 query_budgets[action]，未声明时为 None"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return f'{request.method} <unresolved>', None
+    route = f'{request.method} {match.view_name or match.route}'
+    view = match.func
+    actions = getattr(view, 'actions', None)
+    if actions:
+        action = actions.get(request.method.lower())
+    else:
+        action = request.method.lower()
+    budgets = getattr(getattr(view, 'cls', None), 'query_budgets', None) or {}
+    return route, budgets.get(action)
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class RouteSummary:
+    """按路由保留最近若干请求的统计，进程内有效"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.windows = {}
+        self.budgets = {}
+        self.requests = 0
+
+    def add(self, stats):
+        window_size = getattr(settings, 'QUERY_BUDGET_WINDOW', DEFAULT_WINDOW)
+        with self.lock:
+            window = self.windows.get(stats.route)
+            if window is None or window.maxlen != window_size:
+                window = self.windows[stats.route] = deque(window or (), maxlen=window_size)
+            window.append((stats.count, stats.duration, stats.duplicates))
+            self.budgets[stats.route] = stats.budget
+            self.requests += 1
+            return self.requests
+
+    def summary(self):
+        with self.lock:
+            windows = {route: list(window) for route, window in self.windows.items()}
+            budgets = dict(self.budgets)
+        result = {}
+        for route, samples in sorted(windows.items()):
+            counts = [count for count, _, _ in samples]
+            budget = budgets.get(route)
+            result[route] = {
+                'requests': len(samples),
+                'queries_p50': _percentile(counts, 0.5),
+                'queries_p95': _percentile(counts, 0.95),
+                'queries_max': max(counts),
+                'sql_ms_mean': round(sum(duration for _, duration, _ in samples) * 1000 / len(samples), 2),
+                'duplicates_max': max(duplicates for _, _, duplicates in samples),
+                'budget': budget,
+                'over_budget': sum(1 for count in counts if budget is not None and count > budget),
+            }
+        return result
+
+    def reset(self):
+        with self.lock:
+            self.windows.clear()
+            self.budgets.clear()
+            self.requests = 0
+
+
+route_summary = RouteSummary()
+
+
+def get_query_summary():
+    """各路由最近请求的查询统计"""
+    return route_summary.summary()
+
+
+def reset_query_summary():
+    route_summary.reset()
+
+
+def log_query_summary():
+    for route, row in get_query_summary().items():
+        logger.info(
+            '%s requests=%d queries p50=%d p95=%d max=%d sql=%.2fms duplicates=%d budget=%s over=%d',
+            route, row['requests'], row['queries_p50'], row['queries_p95'], row['queries_max'],
+            row['sql_ms_mean'], row['duplicates_max'], row['budget'], row['over_budget'],
+        )
+
+
+def check_budget(stats):
+    if not stats.over_budget:
+        return
+    if getattr(settings, 'QUERY_BUDGET_ENFORCE', False):
+        raise QueryBudgetExceeded(stats.describe())
+    logger.warning('查询数超出预算\n%s', stats.describe())
+
+
+class QueryBudgetTestMixin:
+    """
+    测试用例混入：开启预算检查，请求超出视图集声明的预算时测试失败。
+
+    另提供 assertMaxQueries，用于检查未声明预算的代码路径。
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        enforce = override_settings(QUERY_BUDGET_ENFORCE=True)
+        enforce.enable()
+        cls.addClassCleanup(enforce.disable)
+
+    def assertWithinQueryBudget(self, response, budget=None):
+        """检查响应的查询数；budget 为空时使用视图集声明的预算"""
+        stats = getattr(response, 'query_stats', None)
+        if stats is None:
+            self.fail('响应没有查询统计，请确认已启用 QueryBudgetMiddleware')
+        limit = stats.budget if budget is None else budget
+        if limit is None:
+            self.fail(f'{stats.route} 未声明查询预算')
+        if stats.count > limit:
+            self.fail(stats.describe())
+
+    @contextmanager
+    def assertMaxQueries(self, maximum, using='default'):
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        if len(context) > maximum:
+            queries = '\n'.join(f'{i}. {query["sql"]}' for i, query in enumerate(context.captured_queries, start=1))
+            self.fail(f'执行了 {len(context)} 次查询，上限 {maximum}\n{queries}')
@@ -0,0 +1,147 @@
+"""
+Versioned response cache for public read-only viewsets.
+
+A viewset declares the models its payload is built from::
+
+    class BannerViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
+        cache_models = [Banner]
+
+GET responses are cached under a key made of the absolute URL (scheme, host
+and path, since payloads embed absolute links), the sorted query
+parameters, the ``Accept`` header and the current generation of every
+declared model. Saving or deleting a row bumps its generation (see
+``blendlumina.generations``), so the next request simply misses. Nothing has
+to be deleted and no TTL has to be guessed. Entries and generations live in
+the shared default cache (Redis), so a write in one process invalidates the
+responses cached by all of them. Declared models must be tracked once, in the
+owning app's ``signals`` module.
+
+Only rendered JSON responses with status 200 are stored; the browsable API
+and errors always go through the view. Hits and misses are counted per
+viewset in the cache and reported by ``manage.py response_cache_stats``.
+
+Settings:
+    RESPONSE_CACHE_ENABLED  总开关（默认 True）
+    RESPONSE_CACHE_TIMEOUT  缓存条目的最长保留时间（秒，默认一天），只用于回收空间
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from .generations import get_generations
+
+RESPONSE_CACHE_PREFIX = 'response_cache:'
+STATS_PREFIX = f'{RESPONSE_CACHE_PREFIX}stats:'
+DEFAULT_RESPONSE_CACHE_TIMEOUT = 60 * 60 * 24
+# 随缓存内容一起回放的响应头
+REPLAYED_HEADERS = ('ETag', 'Last-Modified', 'Content-Language')
+
+_cached_views = set()
+
+
+def _incr(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def record(view_name, outcome):
+    """记录一次命中（hit）或未命中（miss）"""
+    _incr(f'{STATS_PREFIX}{view_name}:{outcome}')
+
+
+def get_response_cache_stats():
+    """各视图集的命中统计：{名称: {'hits', 'misses', 'hit_rate'}}"""
+    names = sorted(_cached_views)
+    keys = [f'{STATS_PREFIX}{name}:{outcome}' for name in names for outcome in ('hit', 'miss')]
+    values = cache.get_many(keys)
+    stats = {}
+    for name in names:
+        hits = values.get(f'{STATS_PREFIX}{name}:hit', 0)
+        misses = values.get(f'{STATS_PREFIX}{name}:miss', 0)
+        total = hits + misses
+        stats[name] = {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else None}
+    return stats
+
+
+def reset_response_cache_stats():
+    cache.delete_many([
+        f'{STATS_PREFIX}{name}:{outcome}' for name in _cached_views for outcome in ('hit', 'miss')
+    ])
+
+
+class CachedResponseMixin:
+    """按路径、查询参数和模型版本号缓存 GET 响应"""
+    # 响应内容所依赖的模型，任一模型写入都会使缓存失效
+    cache_models = ()
+    # 缓存条目的最长保留时间；内容与时间有关（如按当前时间筛选）时可设置较短的值
+    cache_timeout = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        _cached_views.add(cls.__name__)
+
+    def get_response_cache_key(self, request):
+        labels = [model._meta.label_lower for model in self.cache_models]
+        generations = '.'.join(str(value) for value in get_generations(labels))
+        params = '&'.join(
+            f'{key}={value}'
+            for key in sorted(request.GET)
+            for value in sorted(request.GET.getlist(key))
+        )
+        # 响应中的图片和分页链接是绝对地址，键中需包含协议和主机
+        raw = '|'.join([request.build_absolute_uri(request.path), params, request.META.get('HTTP_ACCEPT', '')])
+        digest = hashlib.md5(raw.encode('utf-8')).hexdigest()
+        return f'{RESPONSE_CACHE_PREFIX}{type(self).__name__}:{generations}:{digest}'
+
+    def get_response_cache_timeout(self):
+        if self.cache_timeout is not None:
+            return self.cache_timeout
+        return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', DEFAULT_RESPONSE_CACHE_TIMEOUT)
+
+    def store_response(self, key, response):
+        entry = {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'headers': {name: response[name] for name in REPLAYED_HEADERS if response.has_header(name)},
+        }
+        cache.set(key, entry, self.get_response_cache_timeout())
+
+    def cached_response(self, request, entry):
+        headers = entry['headers']
+        response = get_conditional_response(
+            request,
+            etag=headers.get('ETag'),
+            last_modified=parse_http_date_safe(headers.get('Last-Modified', '')),
+        )
+        if response is None:
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        for name, value in headers.items():
+            response[name] = value
+        response['X-Cache'] = 'HIT'
+        return response
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method != 'GET' or not getattr(settings, 'RESPONSE_CACHE_ENABLED', True):
+            return super().dispatch(request, *args, **kwargs)
+
+        key = self.get_response_cache_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            record(type(self).__name__, 'hit')
+            return self.cached_response(request, entry)
+
+        record(type(self).__name__, 'miss')
+        response = super().dispatch(request, *args, **kwargs)
+        renderer = getattr(response, 'accepted_renderer', None)
+        if response.status_code == 200 and getattr(renderer, 'format', None) == 'json':
+            # DRF 的响应在视图返回后才渲染，渲染完成时写入缓存
+            response.add_post_render_callback(lambda rendered: self.store_response(key, rendered))
+        response['X-Cache'] = 'MISS'
+        return response
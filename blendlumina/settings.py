@@ -54,6 +54,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # 最先执行，统计整个请求（含会话、认证）的 SQL 查询
+    'blendlumina.middleware.QueryBudgetMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -200,3 +202,67 @@ CORS_ALLOW_CREDENTIALS = True
 # File upload settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
+
+# 缓存：模型版本号、ID 租约和购物车需要在所有进程和主机间共享，见 blendlumina/shared_cache.py
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1'),
+    }
+}
+SHARED_CACHE_REQUIRED = True  # 单进程的开发或测试环境使用本地内存缓存时设为 False
+
+# 计数器写缓冲（浏览量/点赞数），见 blendlumina/counters.py
+COUNTER_WRITE_BEHIND = True
+COUNTER_FLUSH_INTERVAL = 5  # 秒
+COUNTER_FLUSH_THRESHOLD = 500
+
+# 商品排行榜，见 products/rankings.py
+PRODUCT_RANKING = {
+    'TOP_N': 50,
+    'WEIGHTS': {'views': 1.0, 'likes': 3.0, 'sales': 10.0},
+    'DECAY': 'exponential',  # 或 'gravity'
+    'HALF_LIFE_DAYS': 30,
+    'GRAVITY': 1.5,
+    'MIN_RECOMPUTE_INTERVAL': 300,
+}
+
+# 商品图片衍生图（WebP 缩略图），见 products/images.py
+IMAGE_DERIVATIVES = {'thumb': 320, 'medium': 960}  # 名称: 最长边像素
+IMAGE_DERIVATIVE_QUALITY = 80
+IMAGE_PIPELINE_WORKERS = 2
+IMAGE_PIPELINE_ASYNC = True
+
+# 公开只读接口的响应缓存，见 blendlumina/response_cache.py
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_TIMEOUT = 60 * 60 * 24  # 秒，仅用于回收空间，失效由模型版本号保证
+
+# 相似作品，见 products/similarity.py
+PRODUCT_SIMILARITY = {
+    'TOP_K': 12,
+    'BLOCK_SIZE': 256,
+    'COLUMN_BLOCK_SIZE': 8192,
+    'WEIGHTS': {'category': 1.0, 'parent_category': 0.5, 'material': 1.0, 'technique': 1.0, 'tag': 1.0},
+}
+
+# 接口 SQL 查询预算，见 blendlumina/query_budget.py
+QUERY_BUDGET_ENFORCE = False  # 测试中由 QueryBudgetTestMixin 开启
+QUERY_BUDGET_WINDOW = 200
+QUERY_BUDGET_REPORT_EVERY = 1000
+
+# 限量作品库存预留，见 orders/inventory.py
+INVENTORY_RESERVATION_TTL = 15 * 60  # 未支付订单的预留保留秒数，过期后由 release_expired_reservations 释放
+
+# 购物车存储引擎，见 orders/cart_storage.py
+CART_STORAGE = 'database'  # 'cache' 时购物车保存在缓存中，批量写回 Cart 表（需多进程共享的缓存，如 Redis）
+CART_CACHE_TIMEOUT = 7 * 24 * 3600
+CART_FLUSH_INTERVAL = 5  # 秒
+CART_FLUSH_THRESHOLD = 200
+
+# 订单号与支付流水号生成，见 blendlumina/idgen.py
+ID_WORKER_ID = None  # 每个进程唯一（0-1023）；为空时从缓存租用，多主机部署需共享缓存
+ID_WORKER_LEASE = 3600  # 秒
+
+# 支付接口幂等键，见 orders/idempotency.py
+IDEMPOTENCY_KEY_TTL = 24 * 3600  # 秒，过期的键由 purge_idempotency_keys 清理
+IDEMPOTENCY_PROCESSING_TIMEOUT = 60  # 秒，首次请求超过该时间仍未完成时，重试可接管幂等键
@@ -0,0 +1,44 @@
+"""
+Guard for state that must be shared by every process.
+
+Generation counters, worker id leases and cache-backed carts live in the
+default Django cache, so that cache must be the same for all gunicorn workers,
+management commands and hosts (Redis, see ``CACHES`` in settings). A
+process-local backend would silently give each process its own copy: one
+worker bumps a generation and the others keep serving stale data.
+
+``ensure_shared_cache()`` runs at startup (``ProductsConfig.ready``) and
+raises ``ImproperlyConfigured`` when the default cache is process-local,
+unless ``SHARED_CACHE_REQUIRED`` is turned off for a single-process setup
+(local development, tests).
+
+Settings:
+    SHARED_CACHE_REQUIRED  默认缓存必须是进程间共享的后端（默认 True）
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+
+# 每个进程各自一份数据的缓存后端
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_shared(alias='default'):
+    backend = type(caches[alias])
+    return f'{backend.__module__}.{backend.__qualname__}' not in PROCESS_LOCAL_BACKENDS
+
+
+def shared_cache_required():
+    return getattr(settings, 'SHARED_CACHE_REQUIRED', True)
+
+
+def ensure_shared_cache():
+    """默认缓存为进程内后端且要求共享时抛出 ImproperlyConfigured"""
+    if shared_cache_required() and not cache_is_shared():
+        raise ImproperlyConfigured(
+            '默认缓存是进程内后端，版本号、ID 租约和购物车无法在进程间共享；'
+            '请在 CACHES 中配置 Redis，或在单进程环境中设置 SHARED_CACHE_REQUIRED = False'
+        )
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("content", "0002_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(
+                fields=["is_approved", "created_at", "id"],
+                name="article_appr_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(
+                fields=["is_approved", "views_count", "id"],
+                name="article_appr_views_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="article",
+            index=models.Index(
+                fields=["is_approved", "likes_count", "id"],
+                name="article_appr_likes_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="news",
+            index=models.Index(
+                fields=["is_published", "published_at", "id"],
+                name="news_pub_published_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="news",
+            index=models.Index(
+                fields=["is_published", "views_count", "id"], name="news_pub_views_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="news",
+            index=models.Index(
+                fields=["is_published", "created_at", "id"], name="news_pub_created_idx"
+            ),
+        ),
+    ]
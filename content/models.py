@@ -98,6 +98,11 @@ class News(models.Model):
         verbose_name = '艺术新闻'
         verbose_name_plural = '艺术新闻'
         ordering = ['-published_at', '-created_at']
+        indexes = [
+            models.Index(fields=['is_published', 'published_at', 'id'], name='news_pub_published_idx'),
+            models.Index(fields=['is_published', 'views_count', 'id'], name='news_pub_views_idx'),
+            models.Index(fields=['is_published', 'created_at', 'id'], name='news_pub_created_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -120,6 +125,11 @@ class Article(models.Model):
         verbose_name = '用户文章'
         verbose_name_plural = '用户文章'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_approved', 'created_at', 'id'], name='article_appr_created_idx'),
+            models.Index(fields=['is_approved', 'views_count', 'id'], name='article_appr_views_idx'),
+            models.Index(fields=['is_approved', 'likes_count', 'id'], name='article_appr_likes_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -1,4 +1,6 @@
 from rest_framework import serializers
+from blendlumina.counters import LiveCounterField
+from products.serializers import ProductListSerializer
 from .models import Banner, Topic, TopicProduct, News, Article, Activity, SearchRecommendation
 
 
@@ -15,18 +17,24 @@ class TopicSerializer(serializers.ModelSerializer):
 
 
 class TopicProductSerializer(serializers.ModelSerializer):
+    product_info = ProductListSerializer(source='product', read_only=True)
+    
     class Meta:
         model = TopicProduct
         fields = '__all__'
 
 
 class NewsSerializer(serializers.ModelSerializer):
+    views_count = LiveCounterField()
+    
     class Meta:
         model = News
         fields = '__all__'
 
 
 class NewsListSerializer(serializers.ModelSerializer):
+    views_count = LiveCounterField()
+    
     class Meta:
         model = News
         fields = ['id', 'title', 'summary', 'cover_image', 'news_type', 'author', 'views_count', 'published_at']
@@ -34,6 +42,8 @@ class NewsListSerializer(serializers.ModelSerializer):
 
 class ArticleSerializer(serializers.ModelSerializer):
     author_username = serializers.CharField(source='author.username', read_only=True)
+    views_count = LiveCounterField()
+    likes_count = LiveCounterField()
     
     class Meta:
         model = Article
@@ -43,6 +53,8 @@ class ArticleSerializer(serializers.ModelSerializer):
 
 class ArticleListSerializer(serializers.ModelSerializer):
     author_username = serializers.CharField(source='author.username', read_only=True)
+    views_count = LiveCounterField()
+    likes_count = LiveCounterField()
     
     class Meta:
         model = Article
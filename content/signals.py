@@ -0,0 +1,9 @@
+from blendlumina.generations import track_model
+from .models import Activity, Banner, SearchRecommendation, Topic
+
+
+# 公开接口的响应缓存以这些模型的版本号为键
+track_model(Banner)
+track_model(Topic)
+track_model(Activity)
+track_model(SearchRecommendation)
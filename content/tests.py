@@ -1,3 +1,65 @@
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from blendlumina.response_cache import get_response_cache_stats
+from .models import Banner, Topic
+
+# 测试在单进程中运行，使用进程内缓存即可
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ResponseCacheTests(TestCase):
+    """公开只读接口的响应缓存：首次未命中、再次命中，声明的模型写入后失效"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.banner = Banner.objects.create(title='春季展', image='banners/spring.jpg', banner_type='activity')
+        cls.topic = Topic.objects.create(title='山水专题', description='描述', cover_image='topics/cover.jpg')
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.assertIn(response.status_code, (200, 304), response.content)
+        return response
+
+    def test_miss_then_hit(self):
+        first = self.get('/api/banners/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            second = self.get('/api/banners/')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(get_response_cache_stats()['BannerViewSet'], {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+        # 查询参数不同的请求单独缓存
+        self.assertEqual(self.get('/api/banners/?page=1')['X-Cache'], 'MISS')
+
+    def test_model_save_invalidates(self):
+        self.get('/api/banners/')
+        self.assertEqual(self.get('/api/banners/')['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.banner.title = '夏季展'
+            self.banner.save()
+        response = self.get('/api/banners/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertIn('夏季展', response.content.decode())
+
+        # 其他模型的写入不影响轮播图的缓存
+        with self.captureOnCommitCallbacks(execute=True):
+            self.topic.save()
+        self.assertEqual(self.get('/api/banners/')['X-Cache'], 'HIT')
+
+    def test_hit_answers_conditional_requests(self):
+        url = f'/api/topics/{self.topic.pk}/'
+        etag = self.get(url)['ETag']
+        response = self.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.status_code, 304)
+
+    @override_settings(RESPONSE_CACHE_ENABLED=False)
+    def test_disabled(self):
+        self.assertFalse(self.get('/api/banners/').has_header('X-Cache'))
@@ -2,6 +2,10 @@ from django.shortcuts import render
 from rest_framework import viewsets, permissions, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from blendlumina.conditional import ConditionalRetrieveMixin
+from blendlumina.counters import counter_buffer
+from blendlumina.pagination import HybridPagination
+from blendlumina.response_cache import CachedResponseMixin
 from .models import Banner, Topic, TopicProduct, News, Article, Activity, SearchRecommendation
 from .serializers import (
     BannerSerializer, TopicSerializer, TopicProductSerializer, NewsSerializer, NewsListSerializer,
@@ -9,10 +13,12 @@ from .serializers import (
 )
 
 
-class BannerViewSet(viewsets.ReadOnlyModelViewSet):
+class BannerViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Banner.objects.filter(is_active=True)
     serializer_class = BannerSerializer
     permission_classes = [permissions.AllowAny]
+    cache_models = [Banner]
+    cache_timeout = 60  # active 按当前时间筛选，缓存不宜过长
     
     @action(detail=False, methods=['get'])
     def active(self, request):
@@ -27,10 +33,11 @@ class BannerViewSet(viewsets.ReadOnlyModelViewSet):
         return Response(serializer.data)
 
 
-class TopicViewSet(viewsets.ReadOnlyModelViewSet):
+class TopicViewSet(CachedResponseMixin, ConditionalRetrieveMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Topic.objects.filter(is_active=True)
     serializer_class = TopicSerializer
     permission_classes = [permissions.AllowAny]
+    cache_models = [Topic]
     
     @action(detail=False, methods=['get'])
     def featured(self, request):
@@ -41,12 +48,13 @@ class TopicViewSet(viewsets.ReadOnlyModelViewSet):
 
 
 class TopicProductViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = TopicProduct.objects.all()
+    # 商品信息来自商品卡片，整页一次查询
+    queryset = TopicProduct.objects.select_related('product', 'product__card')
     serializer_class = TopicProductSerializer
     permission_classes = [permissions.AllowAny]
 
 
-class NewsViewSet(viewsets.ReadOnlyModelViewSet):
+class NewsViewSet(ConditionalRetrieveMixin, viewsets.ReadOnlyModelViewSet):
     queryset = News.objects.filter(is_published=True)
     serializer_class = NewsSerializer
     permission_classes = [permissions.AllowAny]
@@ -54,6 +62,7 @@ class NewsViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ['title', 'content', 'summary']
     ordering_fields = ['published_at', 'views_count', 'created_at']
     ordering = ['-published_at']
+    pagination_class = HybridPagination
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -64,9 +73,8 @@ class NewsViewSet(viewsets.ReadOnlyModelViewSet):
     def increment_views(self, request, pk=None):
         """增加浏览量"""
         news = self.get_object()
-        news.views_count += 1
-        news.save()
-        return Response({'message': '浏览量增加成功'})
+        views_count = counter_buffer.increment(news, 'views_count')
+        return Response({'message': '浏览量增加成功', 'views_count': views_count})
     
     @action(detail=False, methods=['get'])
     def featured(self, request):
@@ -86,7 +94,7 @@ class NewsViewSet(viewsets.ReadOnlyModelViewSet):
         return Response({'error': '请提供新闻类型'}, status=400)
 
 
-class ArticleViewSet(viewsets.ModelViewSet):
+class ArticleViewSet(ConditionalRetrieveMixin, viewsets.ModelViewSet):
     queryset = Article.objects.all()
     serializer_class = ArticleSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -94,6 +102,7 @@ class ArticleViewSet(viewsets.ModelViewSet):
     search_fields = ['title', 'content']
     ordering_fields = ['created_at', 'views_count', 'likes_count']
     ordering = ['-created_at']
+    pagination_class = HybridPagination
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -109,17 +118,15 @@ class ArticleViewSet(viewsets.ModelViewSet):
     def increment_views(self, request, pk=None):
         """增加浏览量"""
         article = self.get_object()
-        article.views_count += 1
-        article.save()
-        return Response({'message': '浏览量增加成功'})
+        views_count = counter_buffer.increment(article, 'views_count')
+        return Response({'message': '浏览量增加成功', 'views_count': views_count})
     
     @action(detail=True, methods=['post'])
     def increment_likes(self, request, pk=None):
         """增加点赞数"""
         article = self.get_object()
-        article.likes_count += 1
-        article.save()
-        return Response({'message': '点赞成功'})
+        likes_count = counter_buffer.increment(article, 'likes_count')
+        return Response({'message': '点赞成功', 'likes_count': likes_count})
     
     @action(detail=False, methods=['get'])
     def featured(self, request):
@@ -136,10 +143,12 @@ class ArticleViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class ActivityViewSet(viewsets.ReadOnlyModelViewSet):
+class ActivityViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Activity.objects.filter(is_active=True)
     serializer_class = ActivitySerializer
     permission_classes = [permissions.AllowAny]
+    cache_models = [Activity]
+    cache_timeout = 60  # upcoming 按当前时间筛选，缓存不宜过长
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['title', 'description', 'location']
     ordering_fields = ['start_time', 'end_time', 'created_at']
@@ -162,8 +171,9 @@ class ActivityViewSet(viewsets.ReadOnlyModelViewSet):
         return Response(serializer.data)
 
 
-class SearchRecommendationViewSet(viewsets.ReadOnlyModelViewSet):
+class SearchRecommendationViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     queryset = SearchRecommendation.objects.filter(is_active=True)
     serializer_class = SearchRecommendationSerializer
     permission_classes = [permissions.AllowAny]
+    cache_models = [SearchRecommendation]
     ordering = ['sort_order']
@@ -0,0 +1,6 @@
+from blendlumina.generations import track_model
+from .models import CustomizationTheme
+
+
+# 公开接口的响应缓存以该模型的版本号为键
+track_model(CustomizationTheme)
@@ -4,6 +4,8 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.db import transaction
+from blendlumina.response_cache import CachedResponseMixin
+from products.models import Usage
 from .models import CustomizationRequest, CustomizationTheme, CommercialCooperation, CustomizationQuote, CustomizationProgress
 from .serializers import (
     CustomizationRequestSerializer, CustomizationRequestCreateSerializer, CustomizationThemeSerializer,
@@ -11,10 +13,12 @@ from .serializers import (
 )
 
 
-class CustomizationThemeViewSet(viewsets.ReadOnlyModelViewSet):
+class CustomizationThemeViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     queryset = CustomizationTheme.objects.filter(is_active=True)
     serializer_class = CustomizationThemeSerializer
     permission_classes = [permissions.AllowAny]
+    # 序列化结果包含用途名称
+    cache_models = [CustomizationTheme, Usage]
 
 
 class CustomizationRequestViewSet(viewsets.ModelViewSet):
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Cart, Wishlist, Order, OrderItem, Payment
+from .models import Cart, Wishlist, Order, OrderItem, Payment, InventoryReservation, IdempotencyKey
 
 
 @admin.register(Cart)
@@ -62,3 +62,25 @@ class PaymentAdmin(admin.ModelAdmin):
     )
     
     readonly_fields = ('created_at',)
+
+
+@admin.register(InventoryReservation)
+class InventoryReservationAdmin(admin.ModelAdmin):
+    list_display = ('order', 'product', 'quantity', 'status', 'expires_at', 'created_at')
+    list_filter = ('status', 'expires_at')
+    search_fields = ('order__order_number', 'product__title')
+    ordering = ('-created_at',)
+    
+    readonly_fields = ('order', 'product', 'quantity', 'status', 'expires_at', 'created_at')
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(admin.ModelAdmin):
+    list_display = ('user', 'key', 'status_code', 'created_at', 'expires_at')
+    list_filter = ('status_code', 'created_at')
+    search_fields = ('user__username', 'key')
+    ordering = ('-created_at',)
+    
+    readonly_fields = (
+        'user', 'key', 'fingerprint', 'status_code', 'response_body', 'created_at', 'claimed_at', 'expires_at'
+    )
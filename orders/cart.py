@@ -0,0 +1,104 @@
+"""
+Cart summary service.
+
+``cart_summary(user)`` reads the whole cart in one query: every line comes back
+with the product's current price, status, stock and artist, and the line total
+``quantity * price`` is computed by the database. Totals, item counts and the
+per-artist subtotals used for split shipping are rolled up from that single
+result, so the cost does not grow with the number of lines.
+
+The same pass flags lines that cannot be checked out as they are:
+
+* ``unavailable``: the product is no longer published;
+* ``repriced``: the price changed since the line was added (``Cart.unit_price``),
+  or the line predates price snapshots (``unit_price`` is NULL) and the price
+  was never confirmed; checkout rejects the same lines, see
+  ``orders.services.check_prices``;
+* ``insufficient_stock``: a limited work has fewer pieces left than requested.
+
+Unavailable lines are listed but excluded from all totals. Carts kept in the
+cache (``CART_STORAGE = 'cache'``) are written to the table first.
+"""
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.db.models import DecimalField, ExpressionWrapper, F
+
+from .cart_storage import get_cart_storage
+from .models import Cart
+
+LINE_TOTAL = ExpressionWrapper(F('quantity') * F('product__price'), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+
+def cart_lines(user):
+    """购物车各行及其商品的当前信息（一次查询）"""
+    return (
+        Cart.objects.filter(user=user)
+        .order_by('added_at', 'id')
+        .values(
+            'id', 'product_id', 'quantity', 'unit_price',
+            title=F('product__title'),
+            price=F('product__price'),
+            product_status=F('product__status'),
+            available_quantity=F('product__available_quantity'),
+            artist_id=F('product__artist_id'),
+            artist_name=F('product__artist__artist_name'),
+        )
+        .annotate(line_total=LINE_TOTAL)
+    )
+
+
+def summarize_lines(lines):
+    """由购物车行汇总总金额、件数和按艺术家的小计"""
+    items = []
+    artists = OrderedDict()
+    total = Decimal('0')
+    item_count = 0
+    flags = {'unavailable': [], 'repriced': [], 'insufficient_stock': []}
+    for line in lines:
+        available = line['product_status'] == 'published'
+        # 与结算的 check_prices 同一规则：没有价格快照视为未确认的改价
+        repriced = line['unit_price'] is None or line['unit_price'] != line['price']
+        insufficient_stock = line['available_quantity'] is not None and line['available_quantity'] < line['quantity']
+        for flag, flagged in (('unavailable', not available), ('repriced', repriced),
+                              ('insufficient_stock', insufficient_stock)):
+            if flagged:
+                flags[flag].append(line['product_id'])
+        items.append({
+            'id': line['id'],
+            'product_id': line['product_id'],
+            'title': line['title'],
+            'artist_id': line['artist_id'],
+            'quantity': line['quantity'],
+            'unit_price': line['unit_price'],
+            'current_price': line['price'],
+            'line_total': line['line_total'],
+            'available': available,
+            'repriced': repriced,
+            'insufficient_stock': insufficient_stock,
+        })
+        if not available:
+            continue
+        total += line['line_total']
+        item_count += line['quantity']
+        artist = artists.setdefault(line['artist_id'], {
+            'artist_id': line['artist_id'],
+            'artist_name': line['artist_name'],
+            'item_count': 0,
+            'subtotal': Decimal('0'),
+        })
+        artist['item_count'] += line['quantity']
+        artist['subtotal'] += line['line_total']
+    return {
+        'items': items,
+        'item_count': item_count,
+        'total': total,
+        'artists': list(artists.values()),
+        **flags,
+    }
+
+
+def cart_summary(user):
+    """用户购物车的汇总"""
+    get_cart_storage().persist(user)
+    return summarize_lines(cart_lines(user))
@@ -0,0 +1,326 @@
+"""
+Pluggable storage for shopping carts.
+
+``CartViewSet`` reads and writes carts through ``get_cart_storage()``; the
+engine is chosen by ``CART_STORAGE``:
+
+* ``'database'`` (default): every change goes straight to the ``Cart`` table.
+* ``'cache'``: the hot copy of a user's cart is one compact record in the
+  Django cache, a list of ``[product_id, quantity, unit_price, added_at, id]``.
+  Reads use the record and fall back to the ``Cart`` table when it is missing
+  (and re-populate it). Writes only replace the record and mark the user
+  dirty. Dirty carts are written behind in batches, every
+  ``CART_FLUSH_INTERVAL`` seconds or as soon as ``CART_FLUSH_THRESHOLD`` users
+  are dirty: the records are diffed against the table with one read, then one
+  delete, one ``bulk_update`` and one ``bulk_create`` per batch.
+
+The ``Cart`` table stays the durable store. Code that reads it directly (the
+cart summary, checkout) calls ``storage.persist(user)`` first, which diffs
+that user's cache record against the table and writes the differences. The
+dirty set is per process, so ``persist`` does not consult it: the change may
+have been made by another worker whose flush has not run yet.
+
+With the cache engine the cache must be shared by all processes (Redis or
+Memcached). A record evicted before it is flushed loses the changes made since
+the previous flush, and two concurrent writes to the same cart are
+last-writer-wins; both are acceptable for carts, not for orders. Lines added
+while a cart lives in the cache have no ``id`` until the record is rebuilt from
+the table, so clients should use the product-keyed actions.
+
+Settings:
+    CART_STORAGE          'database' 或 'cache'（默认 'database'）
+    CART_CACHE_TIMEOUT    购物车缓存记录的有效期（秒，默认 7 天）
+    CART_FLUSH_INTERVAL   最长缓冲秒数（默认 5）
+    CART_FLUSH_THRESHOLD  待写入的购物车数量上限，超过立即刷新（默认 200）
+"""
+import atexit
+import logging
+import threading
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils import timezone
+
+from products.models import Product
+from .models import Cart
+
+logger = logging.getLogger(__name__)
+
+CART_KEY_PREFIX = 'cart:'
+LINE_FIELDS = ('id', 'product_id', 'quantity', 'unit_price', 'added_at')
+
+
+class DatabaseCartStorage:
+    """每次修改直接写入 Cart 表"""
+
+    durable = True
+
+    def lines(self, user):
+        """购物车各行 [{'id', 'product_id', 'quantity', 'unit_price', 'added_at'}]，按加入时间排序"""
+        return list(Cart.objects.filter(user=user).order_by('added_at', 'id').values(*LINE_FIELDS))
+
+    def items(self, user):
+        """购物车各行的 Cart 对象，商品及其卡片已加载"""
+        return Cart.objects.filter(user=user).select_related('product', 'product__card').order_by('added_at', 'id')
+
+    def add(self, user, product_id, quantity, unit_price):
+        """加入商品，已在购物车中时累加数量；返回该行"""
+        cart_item, created = Cart.objects.get_or_create(
+            user=user,
+            product_id=product_id,
+            defaults={'quantity': quantity, 'unit_price': unit_price}
+        )
+        if not created:
+            cart_item.quantity += quantity
+            cart_item.unit_price = unit_price
+            cart_item.save()
+        return cart_item
+
+    def set_quantity(self, user, product_id, quantity):
+        """修改数量，数量不大于 0 时移除；返回修改后的行，商品不在购物车中或已移除时返回 None"""
+        if quantity <= 0:
+            self.remove(user, [product_id])
+            return None
+        cart_item = Cart.objects.filter(user=user, product_id=product_id).first()
+        if cart_item is None:
+            return None
+        cart_item.quantity = quantity
+        cart_item.save()
+        return cart_item
+
+    def remove(self, user, product_ids):
+        Cart.objects.filter(user=user, product_id__in=list(product_ids)).delete()
+
+    def persist(self, user):
+        """把该用户尚未写入的修改写入 Cart 表"""
+
+    def flush(self):
+        return 0
+
+
+class CacheCartStorage(DatabaseCartStorage):
+    """购物车保存在缓存中，批量异步写回 Cart 表"""
+
+    durable = False
+
+    def __init__(self):
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'CART_CACHE_TIMEOUT', 7 * 24 * 3600)
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'CART_FLUSH_INTERVAL', 5)
+
+    @property
+    def flush_threshold(self):
+        return getattr(settings, 'CART_FLUSH_THRESHOLD', 200)
+
+    @staticmethod
+    def key(user_id):
+        return f'{CART_KEY_PREFIX}{user_id}'
+
+    @staticmethod
+    def _pack(line):
+        unit_price = line['unit_price']
+        return [
+            line['product_id'],
+            line['quantity'],
+            str(unit_price) if unit_price is not None else None,
+            line['added_at'].timestamp(),
+            line['id'],
+        ]
+
+    @staticmethod
+    def _unpack(row):
+        product_id, quantity, unit_price, added_at, line_id = row
+        return {
+            'id': line_id,
+            'product_id': product_id,
+            'quantity': quantity,
+            'unit_price': Decimal(unit_price) if unit_price is not None else None,
+            'added_at': datetime.fromtimestamp(added_at, tz=dt_timezone.utc),
+        }
+
+    def lines(self, user):
+        record = cache.get(self.key(user.pk))
+        if record is None:
+            lines = super().lines(user)
+            cache.set(self.key(user.pk), [self._pack(line) for line in lines], self.timeout)
+            return lines
+        return [self._unpack(row) for row in record]
+
+    def _save(self, user, lines):
+        cache.set(self.key(user.pk), [self._pack(line) for line in lines], self.timeout)
+        self._mark_dirty(user.pk)
+
+    def _item(self, user, line, product=None):
+        cart_item = Cart(user=user, **line)
+        if product is not None:
+            cart_item.product = product
+        return cart_item
+
+    def items(self, user):
+        lines = self.lines(user)
+        products = Product.objects.select_related('card').in_bulk([line['product_id'] for line in lines])
+        return [
+            self._item(user, line, products[line['product_id']])
+            for line in lines if line['product_id'] in products
+        ]
+
+    def add(self, user, product_id, quantity, unit_price):
+        lines = self.lines(user)
+        for line in lines:
+            if line['product_id'] == product_id:
+                line['quantity'] += quantity
+                line['unit_price'] = unit_price
+                break
+        else:
+            line = {'id': None, 'product_id': product_id, 'quantity': quantity,
+                    'unit_price': unit_price, 'added_at': timezone.now()}
+            lines.append(line)
+        self._save(user, lines)
+        return self._item(user, line)
+
+    def set_quantity(self, user, product_id, quantity):
+        if quantity <= 0:
+            self.remove(user, [product_id])
+            return None
+        lines = self.lines(user)
+        for line in lines:
+            if line['product_id'] == product_id:
+                line['quantity'] = quantity
+                self._save(user, lines)
+                return self._item(user, line)
+        return None
+
+    def remove(self, user, product_ids):
+        product_ids = set(product_ids)
+        lines = self.lines(user)
+        remaining = [line for line in lines if line['product_id'] not in product_ids]
+        if len(remaining) != len(lines):
+            self._save(user, remaining)
+
+    def _mark_dirty(self, user_id):
+        with self._lock:
+            self._dirty.add(user_id)
+            size = len(self._dirty)
+            if self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._flush_from_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        if size >= self.flush_threshold:
+            self.flush()
+
+    def persist(self, user):
+        """按缓存记录写回该用户的购物车；修改可能来自其他进程，不以本进程的待写入集合为准"""
+        with self._lock:
+            self._dirty.discard(user.pk)
+        try:
+            self._write([user.pk])
+        except Exception:
+            self._mark_dirty(user.pk)
+            raise
+
+    def flush(self):
+        """把待写入的购物车批量写回 Cart 表，返回写入的购物车数"""
+        with self._flush_lock:
+            with self._lock:
+                user_ids, self._dirty = self._dirty, set()
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not user_ids:
+                return 0
+            user_ids = sorted(user_ids)
+            batch_size = self.flush_threshold
+            written = 0
+            for start in range(0, len(user_ids), batch_size):
+                batch = user_ids[start:start + batch_size]
+                try:
+                    written += self._write(batch)
+                except Exception:
+                    logger.exception('购物车写回失败，未写入的购物车已放回缓冲区')
+                    with self._lock:
+                        self._dirty.update(user_ids[start:])
+                    raise
+            return written
+
+    def _write(self, user_ids):
+        """按缓存记录重写这些用户的 Cart 行；缓存记录已失效的用户跳过"""
+        keys = {self.key(user_id): user_id for user_id in user_ids}
+        records = cache.get_many(list(keys))
+        carts = {keys[key]: [self._unpack(row) for row in record] for key, record in records.items()}
+        if not carts:
+            return 0
+        wanted = {(user_id, line['product_id']): line for user_id, lines in carts.items() for line in lines}
+        existing_products = set(
+            Product.objects.filter(pk__in={product_id for _, product_id in wanted}).values_list('pk', flat=True)
+        )
+        rows = {(row.user_id, row.product_id): row for row in Cart.objects.filter(user_id__in=list(carts))}
+
+        stale = [row.pk for key, row in rows.items() if key not in wanted or key[1] not in existing_products]
+        changed = []
+        created = []
+        for key, line in wanted.items():
+            if key[1] not in existing_products:
+                continue
+            row = rows.get(key)
+            if row is None:
+                created.append(Cart(user_id=key[0], product_id=key[1], quantity=line['quantity'],
+                                    unit_price=line['unit_price']))
+            elif (row.quantity, row.unit_price) != (line['quantity'], line['unit_price']):
+                row.quantity = line['quantity']
+                row.unit_price = line['unit_price']
+                changed.append(row)
+        if not (stale or changed or created):
+            return len(carts)
+        with transaction.atomic():
+            if stale:
+                Cart.objects.filter(pk__in=stale).delete()
+            if changed:
+                Cart.objects.bulk_update(changed, ['quantity', 'unit_price'])
+            if created:
+                Cart.objects.bulk_create(created, ignore_conflicts=True)
+        return len(carts)
+
+    def _flush_from_timer(self):
+        try:
+            self.flush()
+        except Exception:
+            # 已记录日志，购物车留待下次刷新
+            pass
+        finally:
+            # 定时线程使用独立的数据库连接，用完即关闭
+            connection.close()
+
+
+STORAGES = {'database': DatabaseCartStorage, 'cache': CacheCartStorage}
+_storages = {}
+_storages_lock = threading.Lock()
+
+
+def get_cart_storage():
+    """当前配置的购物车存储引擎（每种引擎一个进程内实例）"""
+    name = getattr(settings, 'CART_STORAGE', 'database')
+    with _storages_lock:
+        if name not in _storages:
+            _storages[name] = STORAGES[name]()
+        return _storages[name]
+
+
+@atexit.register
+def _flush_at_exit():
+    for storage in list(_storages.values()):
+        try:
+            storage.flush()
+        except Exception:
+            pass
@@ -0,0 +1,185 @@
+"""
+Idempotency keys for payment actions.
+
+Clients send an ``Idempotency-Key`` header (any unique string up to 255
+characters, e.g. a UUID) with ``process_payment`` and ``refund``. Decorating an
+action with ``@idempotent`` makes the first request with a given key run
+normally and stores its response; retries with the same key get the stored
+response back without running the action again, so a flaky network can no
+longer create duplicate ``Payment`` rows.
+
+* Keys are scoped to the user. The stored entry also keeps a fingerprint of
+  the method, path and body; reusing a key for a different request is
+  rejected with 422.
+* The first request claims the key by inserting an ``IdempotencyKey`` row
+  (unique on user and key) before the action runs; a concurrent retry that
+  loses the insert gets 409 until the first request finishes.
+* A claim is a lease: a worker that crashes mid-request never releases it, so
+  a retry arriving more than ``IDEMPOTENCY_PROCESSING_TIMEOUT`` seconds after
+  the claim takes it over with a conditional update on ``claimed_at`` and
+  runs the action. The original request, should it still finish, no longer
+  owns the row and neither stores nor releases it.
+* Responses below 500 are stored in the row and in the cache. Replays are
+  served from the cache, or from the indexed row on a cache miss, and never
+  touch ``Order`` or ``Payment``. Replayed responses carry
+  ``Idempotent-Replayed: true``.
+* A 5xx response or an exception releases the claim, so the client may retry
+  with the same key.
+
+Entries expire after ``IDEMPOTENCY_KEY_TTL`` seconds; expired rows are ignored
+and removed by ``python manage.py purge_idempotency_keys``.
+
+Settings:
+    IDEMPOTENCY_KEY_TTL             幂等键的保留时间（秒，默认 24 小时）
+    IDEMPOTENCY_PROCESSING_TIMEOUT  首次请求的处理时限（秒，默认 60），超过后重试可接管该键
+"""
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+KEY_MAX_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+CACHE_PREFIX = 'idempotency:'
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_PROCESSING_TIMEOUT = 60
+
+
+def get_ttl():
+    return getattr(settings, 'IDEMPOTENCY_KEY_TTL', DEFAULT_TTL)
+
+
+def get_processing_timeout():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_PROCESSING_TIMEOUT', DEFAULT_PROCESSING_TIMEOUT))
+
+
+def request_fingerprint(request):
+    """方法、路径和请求体的摘要"""
+    body = json.dumps(request.data, cls=JSONEncoder, sort_keys=True, ensure_ascii=False)
+    raw = '\n'.join([request.method, request.path, body])
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def cache_key(user_id, key):
+    return f'{CACHE_PREFIX}{user_id}:{hashlib.sha256(key.encode("utf-8")).hexdigest()}'
+
+
+def _replay(entry, fingerprint):
+    if entry['fingerprint'] != fingerprint:
+        return Response({'error': f'{HEADER} 已用于不同的请求'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    response = Response(entry['body'], status=entry['status_code'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _claim(user, key, fingerprint):
+    """
+    占用幂等键。返回 (行, None) 表示由本请求处理；返回 (None, 响应) 表示直接返回该响应。
+    """
+    now = timezone.now()
+    stored = IdempotencyKey.objects.filter(user=user, key=key).first()
+    if stored is not None and stored.expires_at <= now:
+        stored.delete()
+        stored = None
+    if stored is None:
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    user=user, key=key, fingerprint=fingerprint, expires_at=now + timedelta(seconds=get_ttl())
+                ), None
+        except IntegrityError:
+            stored = IdempotencyKey.objects.filter(user=user, key=key).first()
+            if stored is None:
+                return None, Response({'error': '请求正在处理中，请稍后重试'}, status=status.HTTP_409_CONFLICT)
+    if stored.status_code is None:
+        if stored.fingerprint != fingerprint:
+            return None, Response({'error': f'{HEADER} 已用于不同的请求'}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        if stored.claimed_at <= now - get_processing_timeout() and _take_over(stored, now):
+            return stored, None
+        return None, Response({'error': '请求正在处理中，请稍后重试'}, status=status.HTTP_409_CONFLICT)
+    entry = {'fingerprint': stored.fingerprint, 'status_code': stored.status_code, 'body': stored.response_body}
+    timeout = (stored.expires_at - now).total_seconds()
+    cache.set(cache_key(user.pk, key), entry, timeout)
+    return None, _replay(entry, fingerprint)
+
+
+def _take_over(stored, now):
+    """接管超过处理时限仍未完成的占用；并发的重试中只有一个能成功"""
+    taken = IdempotencyKey.objects.filter(
+        pk=stored.pk, status_code__isnull=True, claimed_at=stored.claimed_at
+    ).update(claimed_at=now)
+    stored.claimed_at = now
+    return taken == 1
+
+
+def _owned(claimed):
+    """仍由本请求占用的行（未被超时接管）"""
+    return IdempotencyKey.objects.filter(pk=claimed.pk, status_code__isnull=True, claimed_at=claimed.claimed_at)
+
+
+def _store(claimed, response):
+    body = json.loads(json.dumps(response.data, cls=JSONEncoder))
+    if not _owned(claimed).update(status_code=response.status_code, response_body=body):
+        return
+    entry = {'fingerprint': claimed.fingerprint, 'status_code': response.status_code, 'body': body}
+    cache.set(cache_key(claimed.user_id, claimed.key), entry, get_ttl())
+
+
+def _release(claimed):
+    _owned(claimed).delete()
+
+
+def idempotent(view_func):
+    """视图集 action 装饰器：带 Idempotency-Key 请求头的重复请求返回首次的响应"""
+
+    @wraps(view_func)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return view_func(self, request, *args, **kwargs)
+        if len(key) > KEY_MAX_LENGTH:
+            return Response({'error': f'{HEADER} 不能超过 {KEY_MAX_LENGTH} 个字符'}, status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = request_fingerprint(request)
+        entry = cache.get(cache_key(request.user.pk, key))
+        if entry is not None:
+            return _replay(entry, fingerprint)
+
+        claimed, response = _claim(request.user, key, fingerprint)
+        if response is not None:
+            return response
+        try:
+            response = view_func(self, request, *args, **kwargs)
+        except Exception:
+            _release(claimed)
+            raise
+        if response.status_code >= 500:
+            # 服务端错误不保存，允许使用同一幂等键重试
+            _release(claimed)
+        else:
+            _store(claimed, response)
+        return response
+
+    return wrapper
+
+
+def purge_expired(batch_size=1000):
+    """删除已过期的幂等键，返回删除的行数"""
+    total = 0
+    now = timezone.now()
+    while True:
+        pks = list(IdempotencyKey.objects.filter(expires_at__lte=now).values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return total
+        IdempotencyKey.objects.filter(pk__in=pks).delete()
+        total += len(pks)
@@ -0,0 +1,137 @@
+"""
+Inventory reservations for limited-edition works.
+
+``Product.available_quantity`` holds the sellable stock of a limited work
+(``None`` means unlimited). Checkout takes stock with one conditional update
+per limited line::
+
+    UPDATE product SET available_quantity = available_quantity - n
+    WHERE id = %s AND available_quantity >= n
+
+The database applies the check and the decrement atomically and only locks
+that single row until the order transaction commits, so hundreds of concurrent
+checkouts for the same work cannot oversell it, and checkouts for other works
+are not blocked at all. Rows are decremented in id order to avoid deadlocks
+between multi-line orders.
+
+Editing ``limited_quantity`` (e.g. in the admin) shifts ``available_quantity``
+by the same delta with an ``F()`` update, never below zero; turning
+``is_limited`` on for a work that was already selling starts it at
+``limited_quantity`` minus the units in orders that are not cancelled or
+refunded. See ``Product.sync_available_quantity``.
+
+Every decrement is recorded as a ``held`` ``InventoryReservation`` that
+expires after ``INVENTORY_RESERVATION_TTL`` seconds. Payment confirms the
+reservations of an order; ``python manage.py release_expired_reservations``
+(run it from cron) cancels unpaid orders whose reservations expired and
+returns their stock, one batch per transaction. Both paths lock the order row
+first, so a payment and the sweeper never act on the same order at once.
+
+Settings:
+    INVENTORY_RESERVATION_TTL  预留有效期（秒，默认 900）
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from products.models import Product
+from .models import InventoryReservation, Order
+
+DEFAULT_RESERVATION_TTL = 15 * 60
+# 超时后仍在这些状态的订单视为已付款，其预留直接确认
+RELEASABLE_STATUSES = ('pending_payment', 'cancelled', 'refunded')
+
+
+class InsufficientStock(Exception):
+    """限量作品可售数量不足"""
+
+    def __init__(self, product_id):
+        super().__init__(f'商品 {product_id} 库存不足')
+        self.product_id = product_id
+
+
+def get_reservation_ttl():
+    return timedelta(seconds=getattr(settings, 'INVENTORY_RESERVATION_TTL', DEFAULT_RESERVATION_TTL))
+
+
+def take_stock(products, quantities):
+    """
+    为限量商品扣减可售数量，需在调用方的事务中执行；返回 [(商品ID, 数量)]。
+
+    products 为 {商品ID: 商品}（需含 available_quantity），quantities 为 {商品ID: 数量}。
+    任一商品库存不足时抛出 InsufficientStock，事务回滚后已扣减的数量随之恢复。
+    """
+    taken = []
+    now = timezone.now()
+    for product_id in sorted(quantities):
+        if products[product_id].available_quantity is None:
+            continue
+        quantity = quantities[product_id]
+        updated = Product.objects.filter(pk=product_id, available_quantity__gte=quantity).update(
+            available_quantity=F('available_quantity') - quantity,
+            updated_at=now,
+        )
+        if not updated:
+            raise InsufficientStock(product_id)
+        taken.append((product_id, quantity))
+    return taken
+
+
+def hold(order, taken):
+    """记录订单的库存预留"""
+    expires_at = timezone.now() + get_reservation_ttl()
+    InventoryReservation.objects.bulk_create([
+        InventoryReservation(order=order, product_id=product_id, quantity=quantity, expires_at=expires_at)
+        for product_id, quantity in taken
+    ])
+
+
+def confirm(order_ids):
+    """支付完成后确认预留；调用方需已锁定订单行"""
+    return InventoryReservation.objects.filter(order_id__in=order_ids, status='held').update(status='confirmed')
+
+
+def release(order_ids):
+    """释放预留并归还库存；调用方需已锁定订单行，返回归还的件数"""
+    reservations = InventoryReservation.objects.filter(order_id__in=order_ids, status='held')
+    quantities = defaultdict(int)
+    for product_id, quantity in reservations.values_list('product_id', 'quantity'):
+        quantities[product_id] += quantity
+    if not quantities:
+        return 0
+    now = timezone.now()
+    for product_id in sorted(quantities):
+        Product.objects.filter(pk=product_id, available_quantity__isnull=False).update(
+            available_quantity=F('available_quantity') + quantities[product_id],
+            updated_at=now,
+        )
+    reservations.update(status='released')
+    return sum(quantities.values())
+
+
+def release_expired(batch_size=500):
+    """
+    处理一批已过期的预留，返回处理的订单数。
+
+    未支付的订单被取消并归还库存；正被其他事务锁定（如支付中）的订单留到下一轮。
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        order_ids = list(
+            InventoryReservation.objects.filter(status='held', expires_at__lte=now)
+            .order_by('expires_at').values_list('order_id', flat=True).distinct()[:batch_size]
+        )
+        if not order_ids:
+            return 0
+        orders = dict(
+            Order.objects.select_for_update(skip_locked=True).filter(pk__in=order_ids).values_list('pk', 'status')
+        )
+        releasable = [pk for pk, status in orders.items() if status in RELEASABLE_STATUSES]
+        release(releasable)
+        confirm([pk for pk, status in orders.items() if status not in RELEASABLE_STATUSES])
+        Order.objects.filter(pk__in=releasable, status='pending_payment').update(status='cancelled', updated_at=now)
+    return len(orders)
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from orders.idempotency import purge_expired
+
+
+class Command(BaseCommand):
+    help = '删除已过期的支付幂等键（建议由 cron 每天执行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批删除的行数')
+
+    def handle(self, *args, **options):
+        total = purge_expired(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'清理完成，共删除 {total} 个过期幂等键'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from orders.inventory import release_expired
+
+
+class Command(BaseCommand):
+    help = '取消预留已过期的未支付订单并归还限量作品库存（建议由 cron 每分钟执行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='每个事务处理的订单数')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = release_expired(options['batch_size'])
+            if not processed:
+                break
+            total += processed
+        self.stdout.write(self.style.SUCCESS(f'过期预留处理完成，共处理 {total} 个订单'))
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("orders", "0003_initial"),
+        ("products", "0012_product_available_quantity"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InventoryReservation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("quantity", models.PositiveIntegerField(verbose_name="数量")),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("held", "预留中"),
+                            ("confirmed", "已确认"),
+                            ("released", "已释放"),
+                        ],
+                        default="held",
+                        max_length=20,
+                        verbose_name="状态",
+                    ),
+                ),
+                ("expires_at", models.DateTimeField(verbose_name="过期时间")),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="创建时间"),
+                ),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reservations",
+                        to="orders.order",
+                        verbose_name="订单",
+                    ),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reservations",
+                        to="products.product",
+                        verbose_name="商品",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "库存预留",
+                "verbose_name_plural": "库存预留",
+                "indexes": [
+                    models.Index(
+                        fields=["status", "expires_at"],
+                        name="reservation_status_expiry_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("orders", "0004_inventory_reservation"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cart",
+            name="unit_price",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=2,
+                max_digits=10,
+                null=True,
+                verbose_name="加入时单价",
+            ),
+        ),
+    ]
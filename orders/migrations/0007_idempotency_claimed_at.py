@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:34
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("orders", "0006_idempotency_key"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="idempotencykey",
+            name="claimed_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, verbose_name="占用时间"
+            ),
+        ),
+    ]
@@ -1,5 +1,7 @@
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from blendlumina.idgen import new_order_number
 from users.models import User
 from products.models import Product
 
@@ -9,6 +11,8 @@ class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='cart_items', verbose_name='用户')
     product = models.ForeignKey(Product, on_delete=models.CASCADE, verbose_name='商品')
     quantity = models.PositiveIntegerField(default=1, verbose_name='数量')
+    # 加入购物车时的单价，与当前价格不同时在购物车汇总中提示改价
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name='加入时单价')
     added_at = models.DateTimeField(auto_now_add=True, verbose_name='添加时间')
     
     class Meta:
@@ -80,8 +84,8 @@ class Order(models.Model):
     
     def save(self, *args, **kwargs):
         if not self.order_number:
-            import uuid
-            self.order_number = f"BL{uuid.uuid4().hex[:8].upper()}"
+            # 进程内生成、按时间递增，不会冲突，见 blendlumina/idgen.py
+            self.order_number = new_order_number()
         super().save(*args, **kwargs)
 
 
@@ -135,3 +139,51 @@ class Payment(models.Model):
     
     def __str__(self):
         return f"{self.order.order_number} - {self.get_payment_method_display()}"
+
+
+class InventoryReservation(models.Model):
+    """限量作品的库存预留：下单时扣减可售数量，支付后确认，超时未支付由清理任务释放"""
+    STATUS_CHOICES = [
+        ('held', '预留中'),
+        ('confirmed', '已确认'),
+        ('released', '已释放'),
+    ]
+    
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='reservations', verbose_name='订单')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations', verbose_name='商品')
+    quantity = models.PositiveIntegerField(verbose_name='数量')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='held', verbose_name='状态')
+    expires_at = models.DateTimeField(verbose_name='过期时间')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+    
+    class Meta:
+        verbose_name = '库存预留'
+        verbose_name_plural = '库存预留'
+        indexes = [
+            models.Index(fields=['status', 'expires_at'], name='reservation_status_expiry_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.order_id} - {self.product_id} x{self.quantity} ({self.get_status_display()})"
+
+
+class IdempotencyKey(models.Model):
+    """支付接口的幂等键：保存请求指纹和首次处理的响应，重试时直接返回该响应"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys', verbose_name='用户')
+    key = models.CharField(max_length=255, verbose_name='幂等键')
+    fingerprint = models.CharField(max_length=64, verbose_name='请求指纹')
+    # 为空表示首次请求仍在处理中
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name='响应状态码')
+    response_body = models.JSONField(null=True, blank=True, verbose_name='响应内容')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='创建时间')
+    # 处理中的请求占用该键的时间；超过处理时限仍未完成时，重试可以接管
+    claimed_at = models.DateTimeField(default=timezone.now, verbose_name='占用时间')
+    expires_at = models.DateTimeField(db_index=True, verbose_name='过期时间')
+    
+    class Meta:
+        verbose_name = '幂等键'
+        verbose_name_plural = '幂等键'
+        unique_together = ['user', 'key']
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.key}"
@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from .models import Cart, Wishlist, Order, OrderItem, Payment
-from products.models import Product
+from products.images import derivative_url
+from products.prefetch import get_primary_image
+from .services import OrderError, create_order
 
 
 class CartSerializer(serializers.ModelSerializer):
@@ -10,13 +12,14 @@ class CartSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Cart
-        fields = ['id', 'product', 'product_title', 'product_price', 'product_image', 'quantity', 'total_price', 'added_at']
-        read_only_fields = ['total_price', 'added_at']
+        fields = ['id', 'product', 'product_title', 'product_price', 'product_image', 'quantity', 'unit_price',
+                  'total_price', 'added_at']
+        read_only_fields = ['unit_price', 'total_price', 'added_at']
     
     def get_product_image(self, obj):
-        primary_image = obj.product.images.filter(is_primary=True).first()
+        primary_image = get_primary_image(obj.product)
         if primary_image:
-            return primary_image.image.url
+            return derivative_url(primary_image, 'thumb')
         return None
 
 
@@ -31,9 +34,9 @@ class WishlistSerializer(serializers.ModelSerializer):
         read_only_fields = ['added_at']
     
     def get_product_image(self, obj):
-        primary_image = obj.product.images.filter(is_primary=True).first()
+        primary_image = get_primary_image(obj.product)
         if primary_image:
-            return primary_image.image.url
+            return derivative_url(primary_image, 'thumb')
         return None
 
 
@@ -56,8 +59,14 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only_fields = ['order_number', 'created_at', 'updated_at']
 
 
+class OrderLineSerializer(serializers.Serializer):
+    """下单时的一行商品"""
+    product_id = serializers.IntegerField(min_value=1)
+    quantity = serializers.IntegerField(min_value=1, max_value=10000)
+
+
 class OrderCreateSerializer(serializers.ModelSerializer):
-    items = serializers.ListField(child=serializers.DictField(), write_only=True)
+    items = OrderLineSerializer(many=True, allow_empty=False, write_only=True)
     
     class Meta:
         model = Order
@@ -66,36 +75,19 @@ class OrderCreateSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         items_data = validated_data.pop('items')
         user = self.context['request'].user
-        
-        # 计算订单总金额
-        total_amount = 0
-        for item_data in items_data:
-            product_id = item_data['product_id']
-            quantity = item_data['quantity']
-            product = Product.objects.get(id=product_id)
-            total_amount += product.price * quantity
-        
-        # 创建订单
-        order = Order.objects.create(
-            user=user,
-            total_amount=total_amount,
-            final_amount=total_amount,
-            **validated_data
-        )
-        
-        # 创建订单项
-        for item_data in items_data:
-            product_id = item_data['product_id']
-            quantity = item_data['quantity']
-            product = Product.objects.get(id=product_id)
-            OrderItem.objects.create(
-                order=order,
-                product=product,
-                quantity=quantity,
-                unit_price=product.price
-            )
-        
-        return order
+        try:
+            return create_order(user, items_data, **validated_data)
+        except OrderError as e:
+            raise serializers.ValidationError({'items': [e.message]})
+
+
+class CheckoutSerializer(serializers.ModelSerializer):
+    """购物车结算"""
+    accept_price_changes = serializers.BooleanField(default=False, write_only=True)
+    
+    class Meta:
+        model = Order
+        fields = ['shipping_address', 'contact_phone', 'contact_name', 'notes', 'accept_price_changes']
 
 
 class PaymentSerializer(serializers.ModelSerializer):
@@ -0,0 +1,159 @@
+"""
+Order creation service.
+
+``create_order`` turns a list of ``{'product_id', 'quantity'}`` lines into an
+order with a constant number of queries, however many lines it has: all
+products are loaded with one ``in_bulk``, totals are computed in one pass from
+that snapshot, and the order plus all items are written in one atomic block
+(one insert for the order, ``bulk_create`` for the items). ``unit_price`` of
+every item and the order total come from the same product snapshot, so they
+always agree.
+
+Limited-edition works are reserved inside the same transaction through
+``orders.inventory``: their stock is decremented with one conditional update
+per line before the order row is written, so an order either gets all of its
+stock or is not created at all.
+
+``checkout_cart`` builds the order from the user's cart in the same way: the
+cart rows are locked, prices are checked against the ones the user saw when
+adding each line, and the cart is cleared with one delete in the same
+transaction.
+"""
+from collections import OrderedDict
+
+from functools import partial
+
+from django.db import transaction
+
+from products.models import Product
+from .cart_storage import get_cart_storage
+from .inventory import InsufficientStock, hold, take_stock
+from .models import Cart, Order, OrderItem
+
+ITEM_BATCH_SIZE = 500
+
+
+class OrderError(Exception):
+    """订单无法创建；message 可直接返回给客户端"""
+
+    def __init__(self, message, product_ids=()):
+        super().__init__(message)
+        self.message = message
+        self.product_ids = list(product_ids)
+
+
+def merge_lines(lines):
+    """合并同一商品的多行，保持首次出现的顺序；返回 {商品ID: 数量}"""
+    quantities = OrderedDict()
+    for line in lines:
+        product_id = int(line['product_id'])
+        quantity = int(line['quantity'])
+        if quantity < 1:
+            raise OrderError('商品数量必须大于 0', [product_id])
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    if not quantities:
+        raise OrderError('订单至少需要一件商品')
+    return quantities
+
+
+def load_products(product_ids):
+    """一次查询取出全部商品，检查均存在且已发布"""
+    products = Product.objects.only('id', 'title', 'price', 'status', 'available_quantity').in_bulk(product_ids)
+    missing = [product_id for product_id in product_ids if product_id not in products]
+    if missing:
+        raise OrderError(f'商品不存在: {", ".join(map(str, missing))}', missing)
+    unavailable = [product_id for product_id in product_ids if products[product_id].status != 'published']
+    if unavailable:
+        raise OrderError(f'商品未上架或已售出: {", ".join(map(str, unavailable))}', unavailable)
+    return products
+
+
+def check_prices(products, expected_prices):
+    """
+    商品当前价格与用户看到的价格不一致时抛出 OrderError；expected_prices 为 {商品ID: 价格}。
+
+    价格为空（价格快照出现之前加入购物车的行）表示用户没有确认过价格，同样拒绝，
+    客户端展示当前价格后以 accept_price_changes 重新结算，或重新加入购物车。
+    """
+    repriced = [
+        product_id for product_id, price in expected_prices.items()
+        if price is None or products[product_id].price != price
+    ]
+    if repriced:
+        raise OrderError(f'商品价格已变动: {", ".join(map(str, repriced))}', repriced)
+
+
+def create_order(user, lines, expected_prices=None, **order_fields):
+    """
+    创建订单及全部订单项。
+
+    lines 为 [{'product_id': ..., 'quantity': ...}]，同一商品的多行会合并；
+    expected_prices 不为空时核对商品价格；order_fields 为收货地址、联系人等订单字段。
+    商品不存在、未发布、已改价或库存不足时抛出 OrderError。
+    """
+    quantities = merge_lines(lines)
+    with transaction.atomic():
+        products = load_products(list(quantities))
+        if expected_prices:
+            check_prices(products, expected_prices)
+        items = []
+        total_amount = 0
+        for product_id, quantity in quantities.items():
+            unit_price = products[product_id].price
+            total_price = unit_price * quantity
+            total_amount += total_price
+            items.append(OrderItem(
+                product_id=product_id,
+                quantity=quantity,
+                unit_price=unit_price,
+                total_price=total_price,
+            ))
+
+        try:
+            taken = take_stock(products, quantities)
+        except InsufficientStock as exc:
+            raise OrderError(str(exc), [exc.product_id])
+
+        order = Order.objects.create(
+            user=user,
+            total_amount=total_amount,
+            final_amount=total_amount,
+            **order_fields
+        )
+        for item in items:
+            item.order = order
+        OrderItem.objects.bulk_create(items, batch_size=ITEM_BATCH_SIZE)
+        hold(order, taken)
+    return order
+
+
+def checkout_cart(user, accept_price_changes=False, **order_fields):
+    """
+    把用户的购物车整体下单并清空购物车。
+
+    购物车行在事务中加锁，同一购物车的并发结算依次执行，第二次会因购物车为空而失败；
+    accept_price_changes 为假时，加入购物车后改过价的商品会使结算失败（OrderError）。
+    """
+    storage = get_cart_storage()
+    storage.persist(user)
+    with transaction.atomic():
+        rows = list(
+            Cart.objects.select_for_update().filter(user=user).order_by('added_at', 'id')
+            .values_list('product_id', 'quantity', 'unit_price')
+        )
+        if not rows:
+            raise OrderError('购物车为空')
+        product_ids = [product_id for product_id, _, _ in rows]
+        order = create_order(
+            user,
+            [{'product_id': product_id, 'quantity': quantity} for product_id, quantity, _ in rows],
+            expected_prices=None if accept_price_changes else {
+                product_id: unit_price for product_id, _, unit_price in rows
+            },
+            **order_fields
+        )
+        Cart.objects.filter(user=user, product_id__in=product_ids).delete()
+        if not storage.durable:
+            # 缓存中的购物车在提交后移除，回滚时保持原样
+            transaction.on_commit(partial(storage.remove, user, product_ids))
+    return order
@@ -1,3 +1,654 @@
-from django.test import TestCase
+import os
+from datetime import timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from blendlumina import idgen
+from blendlumina.query_budget import QueryBudgetTestMixin
+from products.cards import rebuild_all_cards
+from products.models import Category, Product, ProductImage
+from users.models import ArtistProfile, User
+from .cart import cart_summary
+from .cart_storage import get_cart_storage
+from .idempotency import request_fingerprint
+from .inventory import release_expired
+from .models import Cart, IdempotencyKey, InventoryReservation, Order, Payment, Wishlist
+from .services import OrderError, create_order, merge_lines
+
+# 测试在单进程中运行，使用进程内缓存即可
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+SHIPPING = {
+    'shipping_address': {'province': '浙江', 'city': '杭州', 'detail': '西湖区 1 号'},
+    'contact_phone': '13800000000',
+    'contact_name': '张三',
+}
+
+
+def create_products(count, **fields):
+    """创建已发布的商品（含主图和商品卡片）"""
+    category = Category.objects.create(name='油画')
+    user = User.objects.create_user('artist', password='pw', user_type='artist')
+    artist = ArtistProfile.objects.create(user=user, artist_name='画家甲')
+    products = []
+    for i in range(count):
+        product = Product.objects.create(
+            title=f'作品{i}', description='描述', artist=artist, category=category,
+            price=Decimal(100 + i), status='published', **fields
+        )
+        ProductImage.objects.create(product=product, image=f'products/p{i}.jpg', is_primary=True)
+        products.append(product)
+    rebuild_all_cards()
+    return products
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class OrderQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    """购物车、愿望清单、订单和支付接口的查询数不随行数增长，且不超过视图集声明的预算"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = create_products(8)
+        cls.buyer = User.objects.create_user('buyer', password='pw')
+        for product in cls.products:
+            Cart.objects.create(user=cls.buyer, product=product, quantity=2, unit_price=product.price)
+            Wishlist.objects.create(user=cls.buyer, product=product)
+        cls.orders = [
+            create_order(cls.buyer, [{'product_id': product.pk, 'quantity': 1} for product in cls.products], **SHIPPING)
+            for _ in range(3)
+        ]
+        for order in cls.orders:
+            Payment.objects.create(order=order, payment_method='alipay', amount=order.final_amount)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.buyer)
+
+    def request(self, method, url, data=None, expected=200):
+        response = getattr(self.client, method)(url, data, content_type='application/json')
+        self.assertEqual(response.status_code, expected, response.content)
+        self.assertWithinQueryBudget(response)
+        return response
+
+    def test_cart_list(self):
+        self.assertEqual(len(self.request('get', '/api/cart/').json()['results']), 8)
+
+    def test_cart_retrieve(self):
+        cart_item = Cart.objects.filter(user=self.buyer).first()
+        self.request('get', f'/api/cart/{cart_item.pk}/')
+
+    def test_cart_total(self):
+        self.assertEqual(self.request('get', '/api/cart/total/').json()['item_count'], 16)
+
+    def test_cart_summary(self):
+        self.request('get', '/api/cart/summary/')
+
+    def test_cart_checkout(self):
+        self.request('post', '/api/cart/checkout/', SHIPPING, expected=201)
+
+    def test_wishlist_list(self):
+        self.assertEqual(len(self.request('get', '/api/wishlist/').json()['results']), 8)
+
+    def test_wishlist_retrieve(self):
+        wishlist_item = Wishlist.objects.filter(user=self.buyer).first()
+        self.request('get', f'/api/wishlist/{wishlist_item.pk}/')
+
+    def test_order_list(self):
+        self.assertEqual(len(self.request('get', '/api/orders/').json()['results']), 3)
+
+    def test_order_retrieve(self):
+        self.request('get', f'/api/orders/{self.orders[0].pk}/')
+
+    def test_order_by_status(self):
+        self.assertEqual(len(self.request('get', '/api/orders/by_status/?status=pending_payment').json()), 3)
+
+    def test_order_create(self):
+        items = [{'product_id': product.pk, 'quantity': 1} for product in self.products]
+        self.request('post', '/api/orders/', {**SHIPPING, 'items': items}, expected=201)
+
+    def test_payment_list(self):
+        self.assertEqual(len(self.request('get', '/api/payments/').json()['results']), 3)
+
+    def test_payment_retrieve(self):
+        payment = Payment.objects.filter(order__user=self.buyer).first()
+        self.request('get', f'/api/payments/{payment.pk}/')
+
+
+@override_settings(CACHES=LOCMEM_CACHES, CART_STORAGE='cache', CART_FLUSH_INTERVAL=3600)
+class CacheCartQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    """缓存引擎下购物车接口同样不超过预算（含写回待写入修改的查询）"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = create_products(8)
+        cls.buyer = User.objects.create_user('buyer', password='pw')
+        for product in cls.products:
+            Cart.objects.create(user=cls.buyer, product=product, quantity=2, unit_price=product.price)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.buyer)
+        # 先经缓存引擎修改购物车，使汇总和结算需要先写回
+        response = self.client.post(
+            '/api/cart/set_quantity/', {'product_id': self.products[0].pk, 'quantity': 3}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def request(self, method, url, data=None, expected=200):
+        response = getattr(self.client, method)(url, data, content_type='application/json')
+        self.assertEqual(response.status_code, expected, response.content)
+        self.assertWithinQueryBudget(response)
+        return response
+
+    def test_cart_list(self):
+        self.assertEqual(len(self.request('get', '/api/cart/').json()['results']), 8)
+
+    def test_cart_retrieve(self):
+        cart_item = Cart.objects.filter(user=self.buyer).first()
+        self.request('get', f'/api/cart/{cart_item.pk}/')
+
+    def test_cart_total(self):
+        self.assertEqual(self.request('get', '/api/cart/total/').json()['item_count'], 17)
+
+    def test_cart_summary(self):
+        self.request('get', '/api/cart/summary/')
+
+    def test_cart_checkout(self):
+        order = self.request('post', '/api/cart/checkout/', SHIPPING, expected=201).json()
+        self.assertEqual(sum(item['quantity'] for item in order['items']), 17)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class InventoryTests(TestCase):
+    """限量作品的库存扣减、回滚、过期释放和支付确认"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.limited, cls.scarce = create_products(2, is_limited=True, limited_quantity=3)
+        Product.objects.filter(pk=cls.scarce.pk).update(limited_quantity=1, available_quantity=1)
+        cls.buyer = User.objects.create_user('buyer', password='pw')
+
+    def available(self, product):
+        return Product.objects.get(pk=product.pk).available_quantity
+
+    def order(self, *lines):
+        return create_order(self.buyer, [{'product_id': product.pk, 'quantity': quantity} for product, quantity in lines],
+                            **SHIPPING)
+
+    def test_conditional_decrement_refuses_to_oversell(self):
+        self.order((self.limited, 2))
+        with self.assertRaises(OrderError) as caught:
+            self.order((self.limited, 2))
+        self.assertEqual(caught.exception.product_ids, [self.limited.pk])
+        self.assertEqual(self.available(self.limited), 1)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_insufficient_stock_rolls_back_earlier_lines(self):
+        # 按商品ID顺序扣减：先扣减 limited，再因 scarce 不足失败
+        self.assertLess(self.limited.pk, self.scarce.pk)
+        with self.assertRaises(OrderError):
+            self.order((self.limited, 2), (self.scarce, 2))
+        self.assertEqual(self.available(self.limited), 3)
+        self.assertEqual(self.available(self.scarce), 1)
+        self.assertFalse(InventoryReservation.objects.exists())
+
+    def test_release_expired_restocks_only_unpaid_orders(self):
+        unpaid = self.order((self.limited, 1))
+        paid = self.order((self.limited, 1))
+        Order.objects.filter(pk=paid.pk).update(status='paid')
+        InventoryReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        self.assertEqual(release_expired(), 2)
+        self.assertEqual(Order.objects.get(pk=unpaid.pk).status, 'cancelled')
+        self.assertEqual(Order.objects.get(pk=paid.pk).status, 'paid')
+        self.assertEqual(InventoryReservation.objects.get(order=unpaid).status, 'released')
+        self.assertEqual(InventoryReservation.objects.get(order=paid).status, 'confirmed')
+        self.assertEqual(self.available(self.limited), 2)
+        self.assertEqual(release_expired(), 0)
+
+    def test_unexpired_reservations_are_kept(self):
+        self.order((self.limited, 1))
+        self.assertEqual(release_expired(), 0)
+        self.assertEqual(self.available(self.limited), 2)
+
+    def test_payment_confirms_reservations(self):
+        order = self.order((self.limited, 2))
+        self.client.force_login(self.buyer)
+        response = self.client.post('/api/payments/process_payment/', {'order_id': order.pk},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(Order.objects.get(pk=order.pk).status, 'paid')
+        self.assertEqual(InventoryReservation.objects.get(order=order).status, 'confirmed')
+        InventoryReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        release_expired()
+        self.assertEqual(self.available(self.limited), 1)
+
+    def test_limited_quantity_edits_adjust_available_quantity(self):
+        self.order((self.limited, 2))
+        product = Product.objects.get(pk=self.limited.pk)
+        product.limited_quantity = 5
+        product.save()
+        self.assertEqual(product.available_quantity, 3)
+        product.limited_quantity = 1
+        product.save()
+        self.assertEqual(self.available(self.limited), 0)
+
+    def test_enabling_limit_subtracts_units_sold(self):
+        product = Product.objects.get(pk=self.limited.pk)
+        product.is_limited = False
+        product.save()
+        self.assertIsNone(self.available(product))
+        self.order((product, 2))
+        cancelled = self.order((product, 4))
+        Order.objects.filter(pk=cancelled.pk).update(status='cancelled')
+
+        product = Product.objects.get(pk=product.pk)
+        product.is_limited = True
+        product.limited_quantity = 10
+        product.save()
+        self.assertEqual(self.available(product), 8)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, CART_STORAGE='cache', CART_FLUSH_INTERVAL=3600)
+class CacheCartStorageTests(TestCase):
+    """缓存引擎的购物车在读取 Cart 表前写回"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = create_products(3)
+        cls.buyer = User.objects.create_user('buyer', password='pw')
+
+    def setUp(self):
+        cache.clear()
+        self.storage = get_cart_storage()
+        self.addCleanup(self.storage._dirty.clear)
+
+    def test_persist_writes_changes_made_by_another_process(self):
+        self.storage.add(self.buyer, self.products[0].pk, 2, self.products[0].price)
+        # 另一个进程的修改只在共享缓存中，本进程的待写入集合里没有该用户
+        self.storage._dirty.clear()
+        self.storage.persist(self.buyer)
+        self.assertEqual(
+            list(Cart.objects.filter(user=self.buyer).values_list('product_id', 'quantity')),
+            [(self.products[0].pk, 2)],
+        )
+
+    def test_cart_summary_reads_unflushed_changes(self):
+        self.storage.add(self.buyer, self.products[1].pk, 3, self.products[1].price)
+        self.storage._dirty.clear()
+        self.assertEqual(cart_summary(self.buyer)['item_count'], 3)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CheckoutTests(TestCase):
+    """购物车结算：查询数固定、改价核对、重复结算和清空购物车"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = create_products(10)
+        cls.buyer = User.objects.create_user('buyer', password='pw')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.buyer)
+
+    def fill_cart(self, products):
+        for product in products:
+            Cart.objects.create(user=self.buyer, product=product, quantity=2, unit_price=product.price)
+
+    def checkout(self, **data):
+        return self.client.post('/api/cart/checkout/', {**SHIPPING, **data}, content_type='application/json')
+
+    def test_query_count_does_not_depend_on_cart_size(self):
+        for count in (1, 10):
+            self.fill_cart(self.products[:count])
+            # 含会话认证的 2 次查询
+            with self.assertNumQueries(13):
+                response = self.checkout()
+            self.assertEqual(response.status_code, 201, response.content)
+            self.assertEqual(len(response.json()['items']), count)
+
+    def test_checkout_clears_the_cart(self):
+        self.fill_cart(self.products[:3])
+        response = self.checkout()
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertFalse(Cart.objects.filter(user=self.buyer).exists())
+        self.assertEqual(self.client.get('/api/cart/').json()['results'], [])
+        order = Order.objects.get(pk=response.json()['id'])
+        self.assertEqual(order.total_amount, sum(product.price * 2 for product in self.products[:3]))
+
+    def test_repriced_product_is_rejected(self):
+        self.fill_cart(self.products[:2])
+        Product.objects.filter(pk=self.products[1].pk).update(price=Decimal('999'))
+        response = self.checkout()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['product_ids'], [self.products[1].pk])
+        self.assertEqual(Cart.objects.filter(user=self.buyer).count(), 2)
+        self.assertFalse(Order.objects.exists())
+
+    def test_repriced_product_is_accepted_on_request(self):
+        self.fill_cart(self.products[:2])
+        Product.objects.filter(pk=self.products[1].pk).update(price=Decimal('999'))
+        response = self.checkout(accept_price_changes=True)
+        self.assertEqual(response.status_code, 201, response.content)
+        prices = {item['product']: Decimal(item['unit_price']) for item in response.json()['items']}
+        self.assertEqual(prices[self.products[1].pk], Decimal('999'))
+        self.assertFalse(Cart.objects.filter(user=self.buyer).exists())
+
+    def test_line_without_price_snapshot_is_rejected(self):
+        self.fill_cart(self.products[:2])
+        Cart.objects.filter(user=self.buyer, product=self.products[0]).update(unit_price=None)
+        response = self.checkout()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['product_ids'], [self.products[0].pk])
+        self.assertEqual(self.checkout(accept_price_changes=True).status_code, 201)
+
+    def test_summary_flags_the_lines_checkout_rejects(self):
+        self.fill_cart(self.products[:2])
+        Cart.objects.filter(user=self.buyer, product=self.products[0]).update(unit_price=None)
+        summary = self.client.get('/api/cart/summary/').json()
+        self.assertEqual(summary['repriced'], [self.products[0].pk])
+        rejected = self.checkout()
+        self.assertEqual(rejected.status_code, 400)
+        self.assertEqual(rejected.json()['product_ids'], summary['repriced'])
+        # 客户端确认汇总中列出的改价后重新结算
+        response = self.checkout(accept_price_changes=True)
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(Decimal(response.json()['total_amount']), sum(p.price * 2 for p in self.products[:2]))
+
+    def test_second_checkout_of_the_same_cart_fails(self):
+        self.fill_cart(self.products[:2])
+        self.assertEqual(self.checkout().status_code, 201)
+        response = self.checkout()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], '购物车为空')
+        self.assertEqual(Order.objects.filter(user=self.buyer).count(), 1)
+
+    @override_settings(CART_STORAGE='cache', CART_FLUSH_INTERVAL=3600)
+    def test_checkout_clears_a_cached_cart(self):
+        storage = get_cart_storage()
+        self.addCleanup(storage._dirty.clear)
+        for product in self.products[:2]:
+            storage.add(self.buyer, product.pk, 1, product.price)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.checkout()
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(storage.lines(self.buyer), [])
+        self.assertFalse(Cart.objects.filter(user=self.buyer).exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class IdempotencyTests(TestCase):
+    """支付接口的 Idempotency-Key"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = create_products(1)
+        cls.buyer = User.objects.create_user('buyer', password='pw')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.buyer)
+        self.order = create_order(self.buyer, [{'product_id': self.products[0].pk, 'quantity': 1}], **SHIPPING)
+
+    def pay(self, key='key-1', **data):
+        return self.client.post(
+            '/api/payments/process_payment/', {'order_id': self.order.pk, **data},
+            content_type='application/json', HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_retry_replays_the_first_response(self):
+        first = self.pay()
+        self.assertEqual(first.status_code, 200, first.content)
+        second = self.pay()
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(Payment.objects.filter(order=self.order).count(), 1)
+
+    def test_replay_survives_a_cache_miss(self):
+        first = self.pay()
+        cache.clear()
+        second = self.pay()
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.json(), first.json())
+
+    def test_reusing_a_key_for_another_request_is_rejected(self):
+        self.assertEqual(self.pay().status_code, 200)
+        response = self.pay(payment_method='wechat')
+        self.assertEqual(response.status_code, 422)
+
+    def claim(self, claimed_at):
+        """模拟另一个请求已占用 key-1 且尚未完成"""
+        request = SimpleNamespace(method='POST', path='/api/payments/process_payment/', data={'order_id': self.order.pk})
+        return IdempotencyKey.objects.create(
+            user=self.buyer, key='key-1', fingerprint=request_fingerprint(request),
+            claimed_at=claimed_at, expires_at=timezone.now() + timedelta(hours=1),
+        )
+
+    def test_request_in_progress_returns_conflict(self):
+        self.claim(timezone.now())
+        self.assertEqual(self.pay().status_code, 409)
+        self.assertFalse(Payment.objects.exists())
+
+    def test_stale_claim_is_taken_over(self):
+        # 占用后进程崩溃，从未释放
+        self.claim(timezone.now() - timedelta(minutes=5))
+        response = self.pay()
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(IdempotencyKey.objects.get(key='key-1').status_code, 200)
+
+    def test_server_error_releases_the_claim(self):
+        with mock.patch('orders.views.confirm_reservations', side_effect=RuntimeError('网关超时')):
+            self.assertEqual(self.pay().status_code, 500)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertFalse(Payment.objects.exists())
+        response = self.pay()
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, SHARED_CACHE_REQUIRED=False, ID_WORKER_ID=None, ID_WORKER_LEASE=60)
+class IdGeneratorTests(TestCase):
+    """订单号与流水号：单调递增、定宽 base36、worker id 租用与续租、fork 后重新租用"""
+
+    def setUp(self):
+        cache.clear()
+
+    def worker_key(self, generator):
+        return f'{idgen.WORKER_KEY_PREFIX}{generator.worker_id}'
+
+    def test_ids_are_monotonic(self):
+        generator = idgen.SnowflakeGenerator(worker_id=7)
+        ids = [generator.next_id() for _ in range(10000)]
+        self.assertEqual(ids, sorted(set(ids)))
+        self.assertEqual({(value >> idgen.SEQUENCE_BITS) & idgen.MAX_WORKER_ID for value in ids}, {7})
+
+        # 时钟回拨时继续沿用上次的时间戳
+        with mock.patch('blendlumina.idgen.time.time', return_value=0):
+            later = [generator.next_id() for _ in range(100)]
+        self.assertEqual(later, sorted(set(later)))
+        self.assertGreater(later[0], ids[-1])
+
+    def test_base36_width_and_ordering(self):
+        self.assertEqual(idgen.to_base36(0), '0' * idgen.BASE36_WIDTH)
+        self.assertEqual(len(idgen.to_base36(2 ** 64 - 1)), idgen.BASE36_WIDTH)
+        values = [0, 35, 36, 1295, 2 ** 40, 2 ** 63, 2 ** 64 - 1]
+        self.assertEqual([idgen.to_base36(value) for value in values], sorted(idgen.to_base36(value) for value in values))
+
+        numbers = [idgen.new_order_number() for _ in range(100)]
+        self.assertTrue(all(number.startswith('BL') and len(number) == 2 + idgen.BASE36_WIDTH for number in numbers))
+        self.assertEqual(numbers, sorted(set(numbers)))
+        self.assertTrue(idgen.new_transaction_id('REF').startswith('REF'))
+
+    def test_processes_lease_distinct_workers(self):
+        first, second = idgen.SnowflakeGenerator(), idgen.SnowflakeGenerator()
+        self.assertNotEqual(first.worker_id, second.worker_id)
+        self.assertEqual(cache.get(self.worker_key(first)), first._owner)
+        self.assertEqual(cache.get(self.worker_key(second)), second._owner)
+
+    def test_renewal_keeps_own_lease(self):
+        generator = idgen.SnowflakeGenerator()
+        worker_id = generator.worker_id
+        generator._leased_at -= 31
+        with mock.patch.object(idgen.cache, 'set') as set_value:
+            self.assertEqual(generator.worker_id, worker_id)
+        set_value.assert_not_called()
+        self.assertEqual(cache.get(self.worker_key(generator)), generator._owner)
+
+    def test_renewal_never_takes_over_another_owner(self):
+        generator = idgen.SnowflakeGenerator()
+        worker_id = generator.worker_id
+        key = self.worker_key(generator)
+        # 本租约过期后，其他进程租到了同一个 worker id
+        cache.set(key, 'other-process', 60)
+        generator._leased_at -= 31
+
+        self.assertNotEqual(generator.worker_id, worker_id)
+        self.assertEqual(cache.get(key), 'other-process')
+        self.assertEqual(cache.get(self.worker_key(generator)), generator._owner)
+
+    def test_renewal_after_expiry_leases_again(self):
+        generator = idgen.SnowflakeGenerator()
+        key = self.worker_key(generator)
+        cache.delete(key)
+        generator._leased_at -= 31
+        worker_id = generator.worker_id
+        self.assertEqual(cache.get(f'{idgen.WORKER_KEY_PREFIX}{worker_id}'), generator._owner)
+
+    def test_forked_child_leases_its_own_worker(self):
+        generator = idgen.SnowflakeGenerator()
+        parent_id = generator.next_id()
+        parent_worker, parent_owner = generator.worker_id, generator._owner
+
+        with mock.patch('blendlumina.idgen.os.getpid', return_value=os.getpid() + 1):
+            child_id = generator.next_id()
+            self.assertNotEqual(generator.worker_id, parent_worker)
+            self.assertNotEqual(generator._owner, parent_owner)
+        self.assertEqual((child_id >> idgen.SEQUENCE_BITS) & idgen.MAX_WORKER_ID, generator._worker_id)
+        self.assertNotEqual(child_id, parent_id)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class OrderCreateTests(TestCase):
+    """下单：同一商品的多行合并，商品不存在或未发布时 400，查询数不随行数增长"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = create_products(10)
+        cls.buyer = User.objects.create_user('buyer', password='pw')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.buyer)
+
+    def create(self, lines):
+        return self.client.post('/api/orders/', {**SHIPPING, 'items': lines}, content_type='application/json')
+
+    def test_merge_lines(self):
+        first, second = self.products[:2]
+        lines = [
+            {'product_id': second.pk, 'quantity': 1},
+            {'product_id': str(first.pk), 'quantity': '2'},
+            {'product_id': second.pk, 'quantity': 3},
+        ]
+        self.assertEqual(list(merge_lines(lines).items()), [(second.pk, 4), (first.pk, 2)])
+        with self.assertRaises(OrderError):
+            merge_lines([{'product_id': first.pk, 'quantity': 0}])
+        with self.assertRaises(OrderError):
+            merge_lines([])
+
+    def test_duplicate_lines_become_one_item(self):
+        product = self.products[0]
+        response = self.create([{'product_id': product.pk, 'quantity': 1}, {'product_id': product.pk, 'quantity': 2}])
+        self.assertEqual(response.status_code, 201, response.content)
+        order = Order.objects.get(user=self.buyer)
+        self.assertEqual(list(order.items.values_list('product_id', 'quantity')), [(product.pk, 3)])
+        self.assertEqual(order.total_amount, product.price * 3)
+        self.assertEqual(order.final_amount, order.total_amount)
+
+    def test_unpublished_or_missing_product_is_rejected(self):
+        draft = self.products[1]
+        Product.objects.filter(pk=draft.pk).update(status='draft')
+        missing = max(product.pk for product in self.products) + 100
+        for product_id in (draft.pk, missing):
+            with self.subTest(product_id=product_id):
+                response = self.create([
+                    {'product_id': self.products[0].pk, 'quantity': 1},
+                    {'product_id': product_id, 'quantity': 1},
+                ])
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(str(product_id), response.json()['items'][0])
+        self.assertFalse(Order.objects.exists())
+
+    def test_query_count_does_not_depend_on_line_count(self):
+        counts = []
+        for size in (1, 10):
+            lines = [{'product_id': product.pk, 'quantity': 1} for product in self.products[:size]]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.create(lines)
+            self.assertEqual(response.status_code, 201, response.content)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CartSummaryTests(TestCase):
+    """购物车汇总：各类标记，以及下架商品不计入合计"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.products = create_products(4)
+        cls.buyer = User.objects.create_user('buyer', password='pw')
+        for product in cls.products:
+            Cart.objects.create(user=cls.buyer, product=product, quantity=2, unit_price=product.price)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_clean_cart(self):
+        summary = cart_summary(self.buyer)
+        self.assertEqual((summary['unavailable'], summary['repriced'], summary['insufficient_stock']), ([], [], []))
+        self.assertEqual(summary['item_count'], 8)
+        self.assertEqual(summary['total'], sum(product.price * 2 for product in self.products))
+        self.assertEqual(len(summary['artists']), 1)
+        self.assertEqual(summary['artists'][0]['subtotal'], summary['total'])
+
+    def test_unavailable(self):
+        draft = self.products[0]
+        Product.objects.filter(pk=draft.pk).update(status='draft')
+        summary = cart_summary(self.buyer)
+        self.assertEqual(summary['unavailable'], [draft.pk])
+        self.assertFalse(summary['items'][0]['available'])
+        # 下架商品仍列出，但不计入合计和艺术家小计
+        self.assertEqual(summary['item_count'], 6)
+        self.assertEqual(summary['total'], sum(product.price * 2 for product in self.products[1:]))
+        self.assertEqual(summary['artists'][0]['item_count'], 6)
+
+    def test_repriced(self):
+        repriced = self.products[1]
+        Product.objects.filter(pk=repriced.pk).update(price=Decimal('999'))
+        summary = cart_summary(self.buyer)
+        self.assertEqual(summary['repriced'], [repriced.pk])
+        item = summary['items'][1]
+        self.assertEqual(
+            (item['unit_price'], item['current_price'], item['line_total']),
+            (repriced.price, Decimal('999'), Decimal('1998')),
+        )
+
+    def test_insufficient_stock(self):
+        limited = self.products[2]
+        Product.objects.filter(pk=limited.pk).update(is_limited=True, limited_quantity=5, available_quantity=1)
+        summary = cart_summary(self.buyer)
+        self.assertEqual(summary['insufficient_stock'], [limited.pk])
+        self.assertTrue(summary['items'][2]['insufficient_stock'])
+        self.assertEqual((summary['unavailable'], summary['repriced']), ([], []))
+        # 库存足够时不标记
+        Product.objects.filter(pk=limited.pk).update(available_quantity=2)
+        self.assertEqual(cart_summary(self.buyer)['insufficient_stock'], [])
@@ -3,40 +3,94 @@ from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.db import transaction
+from django.db.models import Prefetch
+from django.http import Http404
 from django.utils import timezone
+from blendlumina.idgen import new_transaction_id
+from products.models import Product
+from .cart import cart_summary
+from .cart_storage import get_cart_storage
+from .idempotency import idempotent
+from .inventory import confirm as confirm_reservations
 from .models import Cart, Wishlist, Order, OrderItem, Payment
 from .serializers import (
-    CartSerializer, WishlistSerializer, OrderSerializer, OrderCreateSerializer, PaymentSerializer
+    CartSerializer, CheckoutSerializer, WishlistSerializer, OrderSerializer, OrderCreateSerializer, PaymentSerializer
 )
+from .services import OrderError, checkout_cart
 
 
 class CartViewSet(viewsets.ModelViewSet):
     serializer_class = CartSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # 汇总由一次查询完成，见 orders/cart.py；缓存引擎下另含写回待写入修改的 5 次查询
+    # 结算的查询数与购物车行数无关（限量作品每行另有一次库存扣减）
+    query_budgets = {'list': 5, 'retrieve': 4, 'total': 8, 'summary': 8, 'checkout': 20}
+    
+    @property
+    def storage(self):
+        """购物车存储引擎，见 orders/cart_storage.py"""
+        return get_cart_storage()
     
     def get_queryset(self):
-        return Cart.objects.filter(user=self.request.user)
+        return Cart.objects.filter(user=self.request.user).select_related('product', 'product__card')
+    
+    def get_object(self):
+        if self.storage.durable:
+            return super().get_object()
+        # 缓存引擎：在缓存中的购物车里按行ID查找
+        for cart_item in self.storage.items(self.request.user):
+            if cart_item.pk is not None and str(cart_item.pk) == str(self.kwargs['pk']):
+                return cart_item
+        raise Http404
+    
+    def list(self, request, *args, **kwargs):
+        items = self.storage.items(request.user)
+        page = self.paginate_queryset(items)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(items, many=True)
+        return Response(serializer.data)
+    
+    def perform_create(self, serializer):
+        product = serializer.validated_data['product']
+        serializer.instance = self.storage.add(
+            self.request.user, product.pk, serializer.validated_data.get('quantity', 1), product.price
+        )
+    
+    def perform_update(self, serializer):
+        instance = serializer.instance
+        quantity = serializer.validated_data.get('quantity', instance.quantity)
+        serializer.instance = self.storage.set_quantity(self.request.user, instance.product_id, quantity) or instance
+    
+    def perform_destroy(self, instance):
+        self.storage.remove(self.request.user, [instance.product_id])
+    
+    @staticmethod
+    def _int(value, default=None):
+        try:
+            return int(value if value is not None else default)
+        except (TypeError, ValueError):
+            return None
     
     @action(detail=False, methods=['post'])
     def add_to_cart(self, request):
         """添加到购物车"""
         product_id = request.data.get('product_id')
-        quantity = request.data.get('quantity', 1)
+        quantity = self._int(request.data.get('quantity'), 1)
         
         if not product_id:
             return Response({'error': '请提供商品ID'}, status=status.HTTP_400_BAD_REQUEST)
+        if quantity is None or quantity <= 0:
+            return Response({'error': '商品数量必须大于 0'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # 检查是否已在购物车中
-        cart_item, created = Cart.objects.get_or_create(
-            user=request.user,
-            product_id=product_id,
-            defaults={'quantity': quantity}
-        )
-        
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
+        # 记录加入时的单价，用于提示改价
+        product = Product.objects.filter(pk=product_id).only('id', 'price').first()
+        if product is None:
+            return Response({'error': '商品不存在'}, status=status.HTTP_404_NOT_FOUND)
         
+        # 已在购物车中时累加数量
+        cart_item = self.storage.add(request.user, product.pk, quantity, product.price)
         serializer = self.get_serializer(cart_item)
         return Response(serializer.data)
     
@@ -44,31 +98,72 @@ class CartViewSet(viewsets.ModelViewSet):
     def update_quantity(self, request, pk=None):
         """更新购物车商品数量"""
         cart_item = self.get_object()
-        quantity = request.data.get('quantity')
+        return self._set_quantity(cart_item.product_id, request.data.get('quantity'))
+    
+    @action(detail=False, methods=['post'])
+    def set_quantity(self, request):
+        """按商品ID更新购物车商品数量，数量为 0 时移除"""
+        product_id = self._int(request.data.get('product_id'))
+        if not product_id:
+            return Response({'error': '请提供商品ID'}, status=status.HTTP_400_BAD_REQUEST)
+        return self._set_quantity(product_id, request.data.get('quantity'))
+    
+    @action(detail=False, methods=['post'])
+    def remove_item(self, request):
+        """按商品ID从购物车移除"""
+        product_id = self._int(request.data.get('product_id'))
+        if not product_id:
+            return Response({'error': '请提供商品ID'}, status=status.HTTP_400_BAD_REQUEST)
+        self.storage.remove(request.user, [product_id])
+        return Response({'message': '商品已从购物车移除'})
+    
+    def _set_quantity(self, product_id, quantity):
+        quantity = self._int(quantity)
+        if quantity is None:
+            return Response({'error': '请提供商品数量'}, status=status.HTTP_400_BAD_REQUEST)
         
+        cart_item = self.storage.set_quantity(self.request.user, product_id, quantity)
         if quantity <= 0:
-            cart_item.delete()
             return Response({'message': '商品已从购物车移除'})
-        
-        cart_item.quantity = quantity
-        cart_item.save()
+        if cart_item is None:
+            return Response({'error': '商品不在购物车中'}, status=status.HTTP_404_NOT_FOUND)
         serializer = self.get_serializer(cart_item)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def total(self, request):
-        """获取购物车总金额"""
-        cart_items = self.get_queryset()
-        total = sum(item.total_price for item in cart_items)
-        return Response({'total': total})
+        """获取购物车总金额（不含已下架商品）"""
+        summary = cart_summary(request.user)
+        return Response({'total': summary['total'], 'item_count': summary['item_count']})
+    
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """购物车汇总：各行小计、按艺术家的小计，以及已下架、改价和库存不足的商品"""
+        return Response(cart_summary(request.user))
+    
+    @action(detail=False, methods=['post'])
+    def checkout(self, request):
+        """购物车结算：在一个事务中把购物车下单并清空购物车，返回订单及订单项"""
+        serializer = CheckoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            order = checkout_cart(request.user, **serializer.validated_data)
+        except OrderError as e:
+            return Response({'error': e.message, 'product_ids': e.product_ids}, status=status.HTTP_400_BAD_REQUEST)
+        
+        order = Order.objects.select_related('user').prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+        ).get(pk=order.pk)
+        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
 
 
 class WishlistViewSet(viewsets.ModelViewSet):
     serializer_class = WishlistSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budgets = {'list': 5, 'retrieve': 4}
     
     def get_queryset(self):
-        return Wishlist.objects.filter(user=self.request.user)
+        return Wishlist.objects.filter(user=self.request.user).select_related('product', 'product__card')
     
     @action(detail=False, methods=['post'])
     def add_to_wishlist(self, request):
@@ -93,9 +188,13 @@ class WishlistViewSet(viewsets.ModelViewSet):
 class OrderViewSet(viewsets.ModelViewSet):
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    # 订单项与商品一次预取，查询数与订单数无关；下单的查询数与商品行数无关，见 orders/services.py
+    query_budgets = {'list': 5, 'retrieve': 4, 'by_status': 4, 'create': 10}
     
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return Order.objects.filter(user=self.request.user).select_related('user').prefetch_related(
+            Prefetch('items', queryset=OrderItem.objects.select_related('product'))
+        )
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -116,11 +215,13 @@ class OrderViewSet(viewsets.ModelViewSet):
 class PaymentViewSet(viewsets.ModelViewSet):
     serializer_class = PaymentSerializer
     permission_classes = [permissions.IsAuthenticated]
+    query_budgets = {'list': 4, 'retrieve': 3}
     
     def get_queryset(self):
         return Payment.objects.filter(order__user=self.request.user)
     
     @action(detail=False, methods=['post'])
+    @idempotent
     def process_payment(self, request):
         """订单支付接口"""
         try:
@@ -132,42 +233,42 @@ class PaymentViewSet(viewsets.ModelViewSet):
                     'error': '请提供订单ID'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            # 获取订单
-            try:
-                order = Order.objects.get(id=order_id, user=request.user)
-            except Order.DoesNotExist:
-                return Response({
-                    'error': '订单不存在'
-                }, status=status.HTTP_404_NOT_FOUND)
-            
-            # 检查订单状态
-            if order.status != 'pending_payment':
-                return Response({
-                    'error': '订单状态不允许支付'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
             with transaction.atomic():
+                # 锁定订单行，与重复支付及过期预留清理互斥
+                try:
+                    order = Order.objects.select_for_update().get(id=order_id, user=request.user)
+                except Order.DoesNotExist:
+                    return Response({
+                        'error': '订单不存在'
+                    }, status=status.HTTP_404_NOT_FOUND)
+                
+                # 检查订单状态（超时未支付的订单已被取消）
+                if order.status != 'pending_payment':
+                    return Response({
+                        'error': '订单状态不允许支付'
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                
                 # 创建支付记录
+                # 模拟支付处理（实际项目中这里应该调用第三方支付接口）
+                # 这里我们直接设置为成功状态；流水号在进程内生成，无需先插入再回写
                 payment = Payment.objects.create(
                     order=order,
                     payment_method=payment_method,
                     amount=order.final_amount,
-                    status='pending'
+                    status='success',
+                    payment_time=timezone.now(),
+                    transaction_id=new_transaction_id('TXN')
                 )
                 
-                # 模拟支付处理（实际项目中这里应该调用第三方支付接口）
-                # 这里我们直接设置为成功状态
-                payment.status = 'success'
-                payment.payment_time = timezone.now()
-                payment.transaction_id = f"TXN{payment.id:08d}"
-                payment.save()
-                
                 # 更新订单状态
                 order.status = 'paid'
                 order.payment_time = payment.payment_time
                 order.payment_method = payment_method
                 order.save()
                 
+                # 确认限量作品的库存预留
+                confirm_reservations([order.pk])
+                
                 return Response({
                     'message': '支付成功',
                     'payment': PaymentSerializer(payment).data,
@@ -180,6 +281,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
     @action(detail=True, methods=['post'])
+    @idempotent
     def refund(self, request, pk=None):
         """退款接口"""
         try:
@@ -198,7 +300,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
                     amount=-payment.amount,  # 负数表示退款
                     status='success',
                     payment_time=timezone.now(),
-                    transaction_id=f"REF{payment.id:08d}"
+                    transaction_id=new_transaction_id('REF')
                 )
                 
                 # 更新订单状态
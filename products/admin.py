@@ -1,4 +1,6 @@
+from django import forms
 from django.contrib import admin
+from .ingest import attach_images, attach_tags
 from .models import Category, PriceRange, SizeRange, Usage, Product, ProductImage, ProductTag, ProductTagRelation
 
 
@@ -36,8 +38,37 @@ class UsageAdmin(admin.ModelAdmin):
     search_fields = ('name', 'description')
 
 
+class MultipleImageInput(forms.ClearableFileInput):
+    allow_multiple_selected = True
+
+
+class MultipleImageField(forms.ImageField):
+    """一次选择多张图片"""
+    widget = MultipleImageInput
+    
+    def clean(self, data, initial=None):
+        if isinstance(data, (list, tuple)):
+            return [super(MultipleImageField, self).clean(item, initial) for item in data]
+        cleaned = super().clean(data, initial)
+        return [cleaned] if cleaned else []
+
+
+class ProductAdminForm(forms.ModelForm):
+    upload_images = MultipleImageField(required=False, label='上传图片', help_text='可多选，追加到已有图片之后')
+    tag_names = forms.CharField(required=False, label='添加标签', help_text='多个标签用逗号分隔')
+    
+    class Meta:
+        model = Product
+        fields = '__all__'
+    
+    def clean_tag_names(self):
+        value = self.cleaned_data['tag_names'].replace('，', ',')
+        return [name for name in value.split(',') if name.strip()]
+
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
+    form = ProductAdminForm
     list_display = ('title', 'artist', 'category', 'price', 'status', 'views_count', 'created_at')
     list_filter = ('status', 'category', 'is_original', 'is_limited', 'created_at')
     search_fields = ('title', 'description', 'artist__artist_name')
@@ -47,11 +78,17 @@ class ProductAdmin(admin.ModelAdmin):
         ('基本信息', {'fields': ('title', 'description', 'artist', 'category')}),
         ('价格信息', {'fields': ('price', 'original_price')}),
         ('商品属性', {'fields': ('size', 'weight', 'materials', 'techniques', 'year_created')}),
-        ('商品设置', {'fields': ('is_original', 'is_limited', 'limited_quantity', 'status')}),
+        ('商品设置', {'fields': ('is_original', 'is_limited', 'limited_quantity', 'available_quantity', 'status')}),
         ('统计数据', {'fields': ('views_count', 'likes_count')}),
+        ('图片和标签', {'fields': ('upload_images', 'tag_names')}),
     )
     
-    readonly_fields = ('views_count', 'likes_count', 'created_at', 'updated_at')
+    readonly_fields = ('views_count', 'likes_count', 'available_quantity', 'created_at', 'updated_at')
+    
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        attach_images(form.instance, form.cleaned_data.get('upload_images', []), append=True)
+        attach_tags(form.instance, form.cleaned_data.get('tag_names', []))
 
 
 @admin.register(ProductImage)
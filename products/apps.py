@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "products"
+
+    def ready(self):
+        from blendlumina.shared_cache import ensure_shared_cache
+        from . import signals  # noqa: F401
+
+        # 模型版本号等保存在默认缓存中，必须在进程间共享
+        ensure_shared_cache()
@@ -0,0 +1,96 @@
+"""
+Indexed side table for the ``materials`` and ``techniques`` JSON lists.
+
+JSON columns cannot be indexed portably, so every value is copied into a
+``ProductAttribute`` row (product, kind, normalised value). Filters then become
+semi-joins on the ``(kind, value, product)`` index:
+
+* any of several values: ``product IN (SELECT product_id ... WHERE value IN (...))``
+* all of them: the same subquery grouped by product with
+  ``HAVING COUNT(*) = <number of values>``
+
+The table is rewritten for a product whenever it is saved with changed lists
+(post_save signal) and, for ``bulk_create`` paths, by ``finalize_bulk_products``.
+``python manage.py sync_product_attributes`` rebuilds it completely.
+"""
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Product, ProductAttribute
+
+ATTRIBUTE_FIELDS = {'material': 'materials', 'technique': 'techniques'}
+SYNCED_FIELDS = frozenset(ATTRIBUTE_FIELDS.values())
+VALUE_MAX_LENGTH = ProductAttribute._meta.get_field('value').max_length
+
+
+def normalize_value(value):
+    return str(value).strip().lower()[:VALUE_MAX_LENGTH]
+
+
+def parse_values(raw):
+    """查询参数中逗号分隔的取值，去重并规范化"""
+    values = []
+    for value in raw.split(','):
+        value = normalize_value(value)
+        if value and value not in values:
+            values.append(value)
+    return values
+
+
+def attribute_values(materials, techniques):
+    """商品的 (类型, 值) 集合"""
+    pairs = set()
+    for kind, values in (('material', materials), ('technique', techniques)):
+        if not isinstance(values, (list, tuple)):
+            continue
+        for value in values:
+            value = normalize_value(value)
+            if value:
+                pairs.add((kind, value))
+    return pairs
+
+
+def sync_product_attributes(products):
+    """重写这些商品的属性行"""
+    products = [product for product in products if product.pk is not None]
+    if not products:
+        return
+    rows = [
+        ProductAttribute(product_id=product.pk, kind=kind, value=value)
+        for product in products
+        for kind, value in sorted(attribute_values(product.materials, product.techniques))
+    ]
+    with transaction.atomic():
+        ProductAttribute.objects.filter(product_id__in=[product.pk for product in products]).delete()
+        ProductAttribute.objects.bulk_create(rows, batch_size=1000)
+
+
+def rebuild_product_attributes(batch_size=2000):
+    """重建全部商品的属性行，返回处理的商品数"""
+    total = 0
+    batch = []
+    for product in Product.objects.order_by('pk').only('id', 'materials', 'techniques').iterator(chunk_size=batch_size):
+        batch.append(product)
+        if len(batch) >= batch_size:
+            sync_product_attributes(batch)
+            total += len(batch)
+            batch = []
+    sync_product_attributes(batch)
+    total += len(batch)
+    return total
+
+
+def products_with_any(kind, values):
+    """含任一取值的商品ID子查询"""
+    return ProductAttribute.objects.filter(kind=kind, value__in=values).values('product_id')
+
+
+def products_with_all(kind, values):
+    """含全部取值的商品ID子查询"""
+    return (
+        ProductAttribute.objects.filter(kind=kind, value__in=values)
+        .values('product_id')
+        .annotate(matched=Count('id'))
+        .filter(matched=len(values))
+        .values('product_id')
+    )
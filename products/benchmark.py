@@ -0,0 +1,314 @@
+"""
+Synthetic dataset and scenarios for ``python manage.py bench``.
+
+``seed_dataset(scale, seed)`` writes a deterministic catalogue: the same scale
+and seed always produce the same artists, buyers, products, images, tags,
+orders and cart rows (only timestamps and auto-increment ids differ). All
+rows are written with ``bulk_create`` in batches; every benchmark row hangs
+off a user whose name starts with ``bench_``, so ``clear_dataset()`` removes
+exactly what was seeded.
+
+``build_scenarios(seed)`` returns the hot endpoints as request generators for
+``blendlumina.bench``. They run as ``bench_buyer_0``.
+"""
+import io
+import random
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import Max
+
+from orders.models import Cart, Order, OrderItem, Payment
+from users.models import ArtistProfile, User
+from .attributes import sync_product_attributes
+from .cards import rebuild_cards
+from .ingest import finalize_bulk_products
+from .models import Category, Product, ProductImage, ProductTag, ProductTagRelation
+from .rankings import compute_rankings
+from .sizes import parse_size_volume
+
+SCALES = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+PREFIX = 'bench_'
+TAG_PREFIX = 'bench标签'
+BATCH_SIZE = 5000
+BENCH_PASSWORD = 'bench-password'
+
+MATERIALS = ['油画布', '颜料', '宣纸', '墨', '陶土', '木材', '铜', '丝绸', '亚克力', '纸本']
+TECHNIQUES = ['写实', '抽象', '工笔', '写意', '拼贴', '雕刻', '烧制', '数码']
+TITLE_WORDS = ['山水', '花鸟', '人物', '静物', '城市', '海岸', '晨光', '夜色', '远山', '旧梦', '春日', '秋声']
+ORDER_STATUSES = ['pending_payment', 'paid', 'shipped', 'completed', 'cancelled']
+
+
+def dataset_plan(scale):
+    """各表的行数，随商品数等比例增长"""
+    products = SCALES[scale]
+    return {
+        'products': products,
+        'artists': max(10, products // 100),
+        'buyers': max(20, products // 20),
+        'tags': 200,
+        'images_per_product': 2,
+        'orders': max(50, products // 4),
+        'cart_buyers': 100,
+        'cart_items': 3,
+    }
+
+
+def dataset_size():
+    """当前基准数据集的商品数，0 表示尚未生成"""
+    return Product.objects.filter(artist__user__username__startswith=PREFIX).count()
+
+
+def clear_dataset():
+    """删除全部基准数据（从叶子表开始逐表删除）"""
+    users = User.objects.filter(username__startswith=PREFIX)
+    OrderItem.objects.filter(order__user__in=users).delete()
+    Payment.objects.filter(order__user__in=users).delete()
+    Order.objects.filter(user__in=users).delete()
+    Cart.objects.filter(user__in=users).delete()
+    products = Product.objects.filter(artist__user__in=users)
+    ProductImage.objects.filter(product__in=products).delete()
+    ProductTagRelation.objects.filter(product__in=products).delete()
+    products.delete()
+    ArtistProfile.objects.filter(user__in=users).delete()
+    users.delete()
+    ProductTag.objects.filter(name__startswith=TAG_PREFIX).delete()
+
+
+def _insert(model, objects):
+    """
+    批量插入并保证对象带主键。
+
+    数据库不返回主键时（MySQL），按插入顺序取回本批新增的连续ID；
+    基准数据在单独的事务中写入，期间不应有其他写入。
+    """
+    if not objects:
+        return objects
+    before = model.objects.aggregate(last=Max('pk'))['last'] or 0
+    model.objects.bulk_create(objects, batch_size=1000)
+    if objects[0].pk is None:
+        pks = list(model.objects.filter(pk__gt=before).order_by('pk').values_list('pk', flat=True)[:len(objects)])
+        if len(pks) != len(objects):
+            raise RuntimeError(f'{model.__name__}: 无法取回批量插入的主键')
+        for obj, pk in zip(objects, pks):
+            obj.pk = pk
+    return objects
+
+
+def _batches(total, size=BATCH_SIZE):
+    for start in range(0, total, size):
+        yield start, min(start + size, total)
+
+
+def _users(kind, count, password):
+    users = []
+    for start, end in _batches(count):
+        with transaction.atomic():
+            users.extend(_insert(User, [
+                User(
+                    username=f'{PREFIX}{kind}_{i}',
+                    email=f'{PREFIX}{kind}_{i}@example.com',
+                    password=password,
+                    user_type=kind,
+                )
+                for i in range(start, end)
+            ]))
+    return users
+
+
+def _product(rng, index, artist_id, category_id):
+    width, height = rng.randint(10, 200), rng.randint(10, 200)
+    is_limited = rng.random() < 0.2
+    product = Product(
+        title=f'{rng.choice(TITLE_WORDS)}{rng.choice(TITLE_WORDS)} No.{index}',
+        description=f'{rng.choice(TITLE_WORDS)}主题作品，{rng.choice(MATERIALS)}上的{rng.choice(TECHNIQUES)}创作。',
+        artist_id=artist_id,
+        category_id=category_id,
+        price=Decimal(rng.randint(100, 200000)),
+        size=f'{width}x{height}cm',
+        materials=rng.sample(MATERIALS, rng.randint(1, 3)),
+        techniques=rng.sample(TECHNIQUES, rng.randint(1, 2)),
+        year_created=rng.randint(1950, 2025),
+        is_original=rng.random() < 0.8,
+        is_limited=is_limited,
+        # 限量作品总有限量数量，否则 init_available_quantity 会把它当作不限量
+        limited_quantity=rng.randint(1, 50) if is_limited else None,
+        status='published' if rng.random() < 0.9 else 'draft',
+        views_count=int(rng.paretovariate(1.2) * 10),
+        likes_count=int(rng.paretovariate(1.5) * 2),
+    )
+    product.size_volume = parse_size_volume(product.size)
+    product.init_available_quantity()
+    return product
+
+
+def seed_dataset(scale, seed=42, index=True, on_progress=None):
+    """生成指定规模的基准数据集，返回各表写入的行数"""
+    plan = dataset_plan(scale)
+    rng = random.Random(seed)
+    counts = dict.fromkeys(['users', 'artists', 'products', 'images', 'tag_relations', 'orders', 'order_items', 'carts'], 0)
+
+    def progress(stage):
+        if on_progress:
+            on_progress(stage, counts)
+
+    if not Category.objects.filter(parent__isnull=False, is_active=True).exists():
+        call_command('init_categories', stdout=io.StringIO())
+    categories = list(
+        Category.objects.filter(parent__isnull=False, is_active=True).order_by('id').values_list('id', flat=True)
+    )
+
+    password = make_password(BENCH_PASSWORD)
+    artist_users = _users('artist', plan['artists'], password)
+    buyers = _users('buyer', plan['buyers'], password)
+    counts['users'] = len(artist_users) + len(buyers)
+    with transaction.atomic():
+        artists = _insert(ArtistProfile, [
+            ArtistProfile(user_id=user.pk, artist_name=f'艺术家{i}', is_approved=True)
+            for i, user in enumerate(artist_users)
+        ])
+    counts['artists'] = len(artists)
+    progress('users')
+
+    ProductTag.objects.bulk_create(
+        [ProductTag(name=f'{TAG_PREFIX}{i}') for i in range(plan['tags'])], ignore_conflicts=True
+    )
+    tags = list(ProductTag.objects.filter(name__startswith=TAG_PREFIX).order_by('name').values_list('id', flat=True))
+
+    published = []  # (商品ID, 价格)，供订单和购物车使用
+    for start, end in _batches(plan['products']):
+        products = [
+            _product(rng, i, rng.choice(artists).pk, rng.choice(categories))
+            for i in range(start, end)
+        ]
+        with transaction.atomic():
+            _insert(Product, products)
+            images = []
+            relations = []
+            for product in products:
+                for position in range(plan['images_per_product']):
+                    images.append(ProductImage(
+                        product_id=product.pk,
+                        image=f'products/bench/{product.pk}_{position}.jpg',
+                        is_primary=position == 0,
+                        sort_order=position,
+                    ))
+                for tag_id in rng.sample(tags, rng.randint(0, 3)):
+                    relations.append(ProductTagRelation(product_id=product.pk, tag_id=tag_id))
+            ProductImage.objects.bulk_create(images, batch_size=1000)
+            ProductTagRelation.objects.bulk_create(relations, batch_size=1000)
+            if index:
+                finalize_bulk_products(products)
+            else:
+                sync_product_attributes(products)
+                rebuild_cards([product.pk for product in products])
+        published.extend((product.pk, product.price) for product in products if product.status == 'published')
+        counts['products'] += len(products)
+        counts['images'] += len(images)
+        counts['tag_relations'] += len(relations)
+        progress('products')
+
+    for start, end in _batches(plan['orders']):
+        orders = []
+        order_lines = []
+        for i in range(start, end):
+            lines = [(product_id, price, rng.randint(1, 2)) for product_id, price in rng.sample(published, rng.randint(1, 3))]
+            total = sum(price * quantity for _, price, quantity in lines)
+            orders.append(Order(
+                order_number=f'BENCH{i:010d}',
+                user_id=rng.choice(buyers).pk,
+                status=rng.choice(ORDER_STATUSES),
+                total_amount=total,
+                final_amount=total,
+                shipping_address={'province': '上海', 'city': '上海', 'detail': f'测试路{i}号'},
+                contact_phone='13800000000',
+                contact_name=f'买家{i}',
+            ))
+            order_lines.append(lines)
+        with transaction.atomic():
+            _insert(Order, orders)
+            items = [
+                OrderItem(order_id=order.pk, product_id=product_id, quantity=quantity,
+                          unit_price=price, total_price=price * quantity)
+                for order, lines in zip(orders, order_lines)
+                for product_id, price, quantity in lines
+            ]
+            OrderItem.objects.bulk_create(items, batch_size=1000)
+        counts['orders'] += len(orders)
+        counts['order_items'] += len(items)
+        progress('orders')
+
+    carts = [
+        # 带上加入时的单价，结算按真实路径核对价格
+        Cart(user_id=buyer.pk, product_id=product_id, quantity=rng.randint(1, 2), unit_price=price)
+        for buyer in buyers[:plan['cart_buyers']]
+        for product_id, price in rng.sample(published, plan['cart_items'])
+    ]
+    Cart.objects.bulk_create(carts, batch_size=1000)
+    counts['carts'] = len(carts)
+
+    compute_rankings()
+    progress('done')
+    return counts
+
+
+def bench_user():
+    return User.objects.get(username=f'{PREFIX}buyer_0')
+
+
+def build_scenarios(seed=42):
+    """热点接口的请求生成器 {名称: 可调用对象}"""
+    rng = random.Random(seed)
+    user = bench_user()
+    products = list(
+        Product.objects.filter(status='published', artist__user__username__startswith=PREFIX)
+        .order_by('id').values_list('id', flat=True)
+    )
+    if not products:
+        raise ValueError('基准数据集中没有已发布的商品')
+    sample = [products[rng.randrange(len(products))] for _ in range(1000)]
+    pages = max(1, min(len(products) // 20, 50))
+
+    def product_list():
+        return {'method': 'GET', 'path': f'/api/products/?page={rng.randint(1, pages)}'}
+
+    def product_detail():
+        return {'method': 'GET', 'path': f'/api/products/{rng.choice(sample)}/'}
+
+    def featured():
+        return {'method': 'GET', 'path': '/api/products/featured/'}
+
+    def cart_total():
+        return {'method': 'GET', 'path': '/api/cart/total/'}
+
+    def order_create():
+        items = [{'product_id': product_id, 'quantity': 1} for product_id in rng.sample(sample, 2)]
+        return {'method': 'POST', 'path': '/api/orders/', 'data': {
+            'shipping_address': {'province': '上海', 'city': '上海', 'detail': '基准测试路1号'},
+            'contact_phone': '13800000000',
+            'contact_name': '基准买家',
+            'items': items,
+        }}
+
+    def payment():
+        # 每次支付一个新建的待付款订单，建单不计入耗时
+        product = Product.objects.only('price').get(pk=rng.choice(sample))
+        order = Order.objects.create(
+            user=user, total_amount=product.price, final_amount=product.price,
+            shipping_address={'province': '上海', 'city': '上海', 'detail': '基准测试路1号'},
+            contact_phone='13800000000', contact_name='基准买家',
+        )
+        OrderItem.objects.create(order=order, product=product, quantity=1, unit_price=product.price)
+        return {'method': 'POST', 'path': '/api/payments/process_payment/',
+                'data': {'order_id': order.pk, 'payment_method': 'alipay'}}
+
+    return {
+        'product_list': product_list,
+        'product_detail': product_detail,
+        'featured': featured,
+        'cart_total': cart_total,
+        'order_create': order_create,
+        'payment': payment,
+    }
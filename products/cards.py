@@ -0,0 +1,128 @@
+"""
+Product card read model.
+
+A listing tile needs the product row plus its artist name, primary image and
+tags. ``ProductCard`` keeps a flat copy of those related values, one row per
+product. The category is not copied: serializers already read it from the
+in-process category tree snapshot without a query. List endpoints
+``select_related('card')`` and render a whole page from one query.
+Serializers read the card through ``get_card`` / ``card_image`` and only fall
+back to per-row queries when the card was not loaded or has not been built
+yet.
+
+Cards are rebuilt incrementally by the signals in ``products.signals``:
+
+* product created or its artist changed: ``rebuild_cards``;
+* image or tag relation saved or deleted: ``schedule_card_rebuild``, which
+  rebuilds after commit so cascading product deletes leave no card behind;
+* artist renamed: the copied name is updated in place; tag renamed or
+  recoloured: the cards using it are rebuilt;
+* ``bulk_create`` paths call ``rebuild_cards`` themselves (``attach_images``,
+  ``attach_tags``, ``finalize_bulk_products``) and so does
+  ``store_derivatives`` after updating an image.
+
+``python manage.py rebuild_product_cards`` rebuilds every card.
+"""
+from collections import defaultdict
+from functools import partial
+
+from django.db import transaction
+
+from .models import Product, ProductCard, ProductImage, ProductTagRelation
+
+# 影响卡片内容的商品字段
+CARD_FIELDS = frozenset(['artist', 'artist_id'])
+IMAGE_FIELDS = ('id', 'alt_text', 'sort_order', 'width', 'height', 'derivatives')
+
+
+def image_data(image):
+    data = {field: getattr(image, field) for field in IMAGE_FIELDS}
+    data['image'] = image.image.name
+    return data
+
+
+def get_card(product):
+    """已随查询加载的卡片；未 select_related 或卡片尚未生成时返回 None，不查询数据库"""
+    if not Product.card.is_cached(product):
+        return None
+    try:
+        return product.card
+    except ProductCard.DoesNotExist:
+        return None
+
+
+def card_image(card):
+    """由卡片还原主图对象（未保存），可直接交给 ProductImageSerializer；卡片无主图时返回 None"""
+    if not card.primary_image:
+        return None
+    return ProductImage(product_id=card.product_id, is_primary=True, **card.primary_image)
+
+
+def build_cards(product_ids):
+    """为这些商品生成卡片对象（不写入数据库）"""
+    product_ids = list(product_ids)
+    images = {}
+    primary_images = ProductImage.objects.filter(product_id__in=product_ids, is_primary=True).order_by(
+        'product_id', 'sort_order', 'id'
+    )
+    for image in primary_images:
+        images.setdefault(image.product_id, image)
+
+    tags = defaultdict(list)
+    relations = ProductTagRelation.objects.filter(product_id__in=product_ids).select_related('tag').order_by(
+        'product_id', 'tag__name'
+    )
+    for relation in relations:
+        tags[relation.product_id].append(
+            {'id': relation.tag_id, 'name': relation.tag.name, 'color': relation.tag.color}
+        )
+
+    rows = Product.objects.filter(pk__in=product_ids).values_list('pk', 'artist__artist_name')
+    return [
+        ProductCard(
+            product_id=product_id,
+            artist_name=artist_name or '',
+            primary_image=image_data(images[product_id]) if product_id in images else None,
+            tags=tags.get(product_id, []),
+        )
+        for product_id, artist_name in rows
+    ]
+
+
+def rebuild_cards(product_ids, batch_size=1000):
+    """重建这些商品的卡片"""
+    product_ids = sorted(set(product_ids))
+    for start in range(0, len(product_ids), batch_size):
+        batch = product_ids[start:start + batch_size]
+        cards = build_cards(batch)
+        with transaction.atomic():
+            ProductCard.objects.filter(product_id__in=batch).delete()
+            ProductCard.objects.bulk_create(cards)
+
+
+def schedule_card_rebuild(product_ids):
+    """事务提交后重建卡片；级联删除商品时，提交后商品已不存在，不会重新写入卡片"""
+    transaction.on_commit(partial(rebuild_cards, list(product_ids)))
+
+
+def rebuild_all_cards(batch_size=1000):
+    """重建全部商品的卡片，返回处理的商品数"""
+    total = 0
+    batch = []
+    for product_id in Product.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=batch_size):
+        batch.append(product_id)
+        if len(batch) >= batch_size:
+            rebuild_cards(batch, batch_size)
+            total += len(batch)
+            batch = []
+    rebuild_cards(batch, batch_size)
+    return total + len(batch)
+
+
+def rename_artist(artist):
+    ProductCard.objects.filter(product__artist=artist).update(artist_name=artist.artist_name)
+
+
+def rebuild_tag_cards(tag):
+    """标签改名或改色后重建使用该标签的商品卡片"""
+    rebuild_cards(ProductTagRelation.objects.filter(tag=tag).values_list('product_id', flat=True))
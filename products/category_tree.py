@@ -0,0 +1,134 @@
+"""
+Process-local category tree.
+
+The whole ``Category`` table is loaded with a single query into an immutable
+snapshot that answers node, children and subtree lookups from dictionaries.
+The snapshot is tagged with the ``products.category`` generation (see
+``blendlumina.generations``); Category save/delete signals bump the
+generation, and every process rebuilds its snapshot lazily on next access.
+"""
+import threading
+
+from blendlumina.generations import get_generation
+
+CATEGORY_GENERATION = 'products.category'
+
+
+class CategoryTree:
+    """分类树快照，构建后只读"""
+
+    def __init__(self, categories, version):
+        self.version = version
+        self._nodes = {}
+        self._children = {}
+        self._active = []
+        self._roots = []
+        self._children_data = {}
+        self._lock = threading.RLock()
+
+        for category in categories:
+            self._nodes[category.id] = category
+            self._children.setdefault(category.id, [])
+        for category in categories:
+            if not category.is_active:
+                continue
+            self._active.append(category)
+            if category.parent_id is None:
+                self._roots.append(category)
+            elif category.parent_id in self._children:
+                self._children[category.parent_id].append(category)
+
+    def get(self, category_id):
+        """按ID获取分类（包含未启用的分类），不存在时返回 None"""
+        return self._nodes.get(category_id)
+
+    def nodes(self):
+        """所有启用的分类，按默认排序"""
+        return list(self._active)
+
+    def roots(self):
+        """启用的根分类"""
+        return list(self._roots)
+
+    def children(self, category_id):
+        """启用的直接子分类"""
+        return list(self._children.get(category_id, ()))
+
+    def ancestors(self, category_id):
+        """从父分类到根分类的祖先链"""
+        ancestors = []
+        node = self._nodes.get(category_id)
+        seen = {category_id}
+        while node is not None and node.parent_id is not None and node.parent_id not in seen:
+            seen.add(node.parent_id)
+            node = self._nodes.get(node.parent_id)
+            if node is not None:
+                ancestors.append(node)
+        return ancestors
+
+    def descendant_ids(self, category_id):
+        """分类自身及所有启用后代的ID"""
+        ids = []
+        seen = set()
+        stack = [category_id]
+        while stack:
+            current = stack.pop()
+            if current in seen:
+                continue
+            seen.add(current)
+            ids.append(current)
+            stack.extend(child.id for child in self._children.get(current, ()))
+        return ids
+
+    def inactive_subtree_paths(self, category_id):
+        """分类下未启用的子树的物化路径（嵌套在其他未启用子树中的不重复列出）"""
+        category = self._nodes.get(category_id)
+        if category is None or not category.path:
+            return []
+        paths = sorted(
+            node.path for node in self._nodes.values()
+            if not node.is_active and node.id != category_id and node.path and node.path.startswith(category.path)
+        )
+        collapsed = []
+        for path in paths:
+            if not collapsed or not path.startswith(collapsed[-1]):
+                collapsed.append(path)
+        return collapsed
+
+    def children_data(self, category_id, build):
+        """子分类的序列化结果，按快照缓存，build 为实际序列化函数"""
+        data = self._children_data.get(category_id)
+        if data is None:
+            with self._lock:
+                data = self._children_data.get(category_id)
+                if data is None:
+                    data = build(self.children(category_id))
+                    self._children_data[category_id] = data
+        return data
+
+
+_tree = None
+_tree_lock = threading.Lock()
+
+
+def get_category_tree():
+    """返回当前版本的分类树，版本变化时用一次查询重建"""
+    global _tree
+    from .models import Category
+
+    version = get_generation(CATEGORY_GENERATION)
+    tree = _tree
+    if tree is not None and tree.version == version:
+        return tree
+    with _tree_lock:
+        tree = _tree
+        if tree is None or tree.version != version:
+            tree = CategoryTree(list(Category.objects.all()), version)
+            _tree = tree
+    return tree
+
+
+def invalidate_category_tree(**kwargs):
+    """丢弃本进程的分类树快照"""
+    global _tree
+    _tree = None
@@ -0,0 +1,127 @@
+"""
+Facet counts for product browsing.
+
+One grouped query counts products per category (rolled up to the parent
+categories through the category tree) and one conditional aggregate counts
+price ranges, size ranges, ``is_original`` and ``is_limited``. Results are
+cached per filter combination and keyed by the generations of the models
+they depend on, so any product, category or range change invalidates them.
+Both the entries and the generations live in the shared default cache, so a
+write in any process (worker, admin, ``import_products``) invalidates the
+counts for all of them.
+"""
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from blendlumina.generations import get_generations
+from .category_tree import CATEGORY_GENERATION, get_category_tree
+from .filters import price_range_q, size_range_q
+from .models import PriceRange, SizeRange
+
+FACET_GENERATIONS = [
+    'products.product',
+    'products.pricerange',
+    'products.sizerange',
+    CATEGORY_GENERATION,
+]
+FACET_CACHE_TIMEOUT = 60 * 60
+# 不影响统计结果的参数，不参与缓存键
+IGNORED_PARAMS = frozenset(['page', 'page_size', 'ordering', 'cursor', 'pagination', 'format'])
+
+
+def facet_cache_key(query_params):
+    """缓存键：依赖模型的版本号 + 排序后的查询参数"""
+    generations = '.'.join(str(value) for value in get_generations(FACET_GENERATIONS))
+    params = '&'.join(
+        f'{key}={value}'
+        for key in sorted(query_params) if key not in IGNORED_PARAMS
+        for value in sorted(query_params.getlist(key))
+    )
+    digest = hashlib.md5(params.encode('utf-8')).hexdigest()
+    return f'products:facets:{generations}:{digest}'
+
+
+def _category_facets(queryset):
+    tree = get_category_tree()
+    counts = {}
+    rows = queryset.order_by().values_list('category_id').annotate(count=Count('id'))
+    for category_id, count in rows:
+        counts[category_id] = counts.get(category_id, 0) + count
+        # 子分类的数量累加到所有祖先分类
+        for ancestor in tree.ancestors(category_id):
+            counts[ancestor.id] = counts.get(ancestor.id, 0) + count
+
+    facets = []
+    for category_id, count in counts.items():
+        category = tree.get(category_id)
+        if category is None:
+            continue
+        facets.append({
+            'id': category.id,
+            'name': category.name,
+            'parent': category.parent_id,
+            'sort_order': category.sort_order,
+            'count': count,
+        })
+    facets.sort(key=lambda item: (item['parent'] is not None, item['sort_order'], item['name']))
+    for item in facets:
+        del item['sort_order']
+    return facets
+
+
+def compute_facets(queryset):
+    """计算筛选后商品集合的各维度数量"""
+    price_ranges = list(PriceRange.objects.order_by('min_price'))
+    size_ranges = list(SizeRange.objects.order_by('min_size'))
+
+    aggregates = {
+        'total': Count('id'),
+        'original_true': Count('id', filter=Q(is_original=True)),
+        'limited_true': Count('id', filter=Q(is_limited=True)),
+    }
+    for price_range in price_ranges:
+        aggregates[f'price_{price_range.id}'] = Count('id', filter=price_range_q(price_range))
+    for size_range in size_ranges:
+        aggregates[f'size_{size_range.id}'] = Count('id', filter=size_range_q(size_range))
+    counts = queryset.order_by().aggregate(**aggregates)
+
+    total = counts['total']
+    return {
+        'total': total,
+        'categories': _category_facets(queryset),
+        'price_ranges': [
+            {
+                'id': price_range.id,
+                'name': price_range.name,
+                'min_price': price_range.min_price,
+                'max_price': price_range.max_price,
+                'count': counts[f'price_{price_range.id}'],
+            }
+            for price_range in price_ranges
+        ],
+        'size_ranges': [
+            {
+                'id': size_range.id,
+                'name': size_range.name,
+                'min_size': size_range.min_size,
+                'max_size': size_range.max_size,
+                'count': counts[f'size_{size_range.id}'],
+            }
+            for size_range in size_ranges
+        ],
+        'is_original': {'true': counts['original_true'], 'false': total - counts['original_true']},
+        'is_limited': {'true': counts['limited_true'], 'false': total - counts['limited_true']},
+    }
+
+
+def get_facets(query_params, get_queryset):
+    """带缓存的分面统计；get_queryset 仅在缓存未命中时调用"""
+    # 先取版本号再统计：统计期间提交的写入会递增版本号，旧结果只会写入旧键
+    key = facet_cache_key(query_params)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(get_queryset())
+        cache.set(key, facets, FACET_CACHE_TIMEOUT)
+    return facets
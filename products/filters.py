@@ -0,0 +1,89 @@
+import django_filters
+from django.db.models import Q
+from rest_framework import filters
+
+from .attributes import parse_values, products_with_all, products_with_any
+from .models import PriceRange, Product, SizeRange
+from .search import rank_products
+
+# 查询参数名 -> ProductAttribute.kind
+ATTRIBUTE_KINDS = {'materials': 'material', 'techniques': 'technique'}
+
+
+def price_range_q(price_range):
+    """价格区间条件：含下限，不含上限；无上限时为开区间"""
+    condition = Q(price__gte=price_range.min_price)
+    if price_range.max_price is not None:
+        condition &= Q(price__lt=price_range.max_price)
+    return condition
+
+
+def size_range_q(size_range):
+    """尺寸区间条件，按解析出的体积匹配"""
+    condition = Q(size_volume__gte=size_range.min_size)
+    if size_range.max_size is not None:
+        condition &= Q(size_volume__lt=size_range.max_size)
+    return condition
+
+
+class ProductFilter(django_filters.FilterSet):
+    """商品筛选"""
+    price_range = django_filters.ModelChoiceFilter(
+        queryset=PriceRange.objects.all(), method='filter_price_range', label='价格区间'
+    )
+    size_range = django_filters.ModelChoiceFilter(
+        queryset=SizeRange.objects.all(), method='filter_size_range', label='尺寸区间'
+    )
+    price_min = django_filters.NumberFilter(field_name='price', lookup_expr='gte', label='最低价格')
+    price_max = django_filters.NumberFilter(field_name='price', lookup_expr='lte', label='最高价格')
+    year_min = django_filters.NumberFilter(field_name='year_created', lookup_expr='gte', label='最早创作年份')
+    year_max = django_filters.NumberFilter(field_name='year_created', lookup_expr='lte', label='最晚创作年份')
+    # 逗号分隔的多个取值：materials / techniques 含任一即可，*_all 需全部包含
+    materials = django_filters.CharFilter(method='filter_attribute_any', label='材质（任一）')
+    materials_all = django_filters.CharFilter(method='filter_attribute_all', label='材质（全部）')
+    techniques = django_filters.CharFilter(method='filter_attribute_any', label='技法（任一）')
+    techniques_all = django_filters.CharFilter(method='filter_attribute_all', label='技法（全部）')
+    
+    class Meta:
+        model = Product
+        fields = ['category', 'artist', 'status', 'is_original', 'is_limited']
+    
+    def filter_price_range(self, queryset, name, value):
+        return queryset.filter(price_range_q(value))
+    
+    def filter_size_range(self, queryset, name, value):
+        return queryset.filter(size_range_q(value))
+    
+    def filter_attribute_any(self, queryset, name, value):
+        values = parse_values(value)
+        if not values:
+            return queryset
+        return queryset.filter(id__in=products_with_any(ATTRIBUTE_KINDS[name], values))
+    
+    def filter_attribute_all(self, queryset, name, value):
+        values = parse_values(value)
+        if not values:
+            return queryset
+        return queryset.filter(id__in=products_with_all(ATTRIBUTE_KINDS[name.removesuffix('_all')], values))
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    商品搜索：默认沿用 SearchFilter 的 LIKE 匹配；
+    search_mode=fulltext 时改用本地倒排索引，并在未指定 ordering 时按相关度排序
+    """
+    search_mode_param = 'search_mode'
+    fulltext_mode = 'fulltext'
+    
+    def filter_queryset(self, request, queryset, view):
+        if request.query_params.get(self.search_mode_param) != self.fulltext_mode:
+            return super().filter_queryset(request, queryset, view)
+        
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        # 在已筛选的查询集上计算得分，筛选条件不会因结果截断而漏掉商品
+        queryset = rank_products(queryset, query)
+        if request.query_params.get(filters.OrderingFilter.ordering_param):
+            return queryset
+        return queryset.order_by('-search_rank', '-id')
@@ -0,0 +1,37 @@
+"""
+Pure Pillow image work executed inside the image pipeline's worker processes.
+
+This module must not import Django models: worker processes are started with
+the ``spawn`` method and only import what the task function needs.
+"""
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+
+def render_derivatives(source, specs, quality=80):
+    """
+    生成缩略图等衍生图片。
+
+    source 为文件路径或原图字节，specs 为 {名称: 最长边像素}。
+    返回 (原图宽, 原图高, {名称: (webp 字节, 宽, 高)})。
+    输出不携带 EXIF 等元数据。
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = BytesIO(source)
+    with Image.open(source) as original:
+        # 先按 EXIF 方向旋转，再丢弃元数据
+        image = ImageOps.exif_transpose(original)
+        width, height = image.size
+        if image.mode not in ('RGB', 'RGBA'):
+            has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        derivatives = {}
+        for name, max_edge in specs.items():
+            resized = image.copy()
+            resized.thumbnail((max_edge, max_edge), Image.LANCZOS)
+            buffer = BytesIO()
+            resized.save(buffer, format='WEBP', quality=quality, method=4)
+            derivatives[name] = (buffer.getvalue(), resized.width, resized.height)
+    return width, height, derivatives
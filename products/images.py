@@ -0,0 +1,153 @@
+"""
+Background derivative pipeline for uploaded product images.
+
+After an upload commits, the originals are handed to a process pool that
+renders WebP thumbnails and medium-size copies with metadata stripped. The
+resulting files, their dimensions and the original's dimensions are recorded
+on ``ProductImage`` so serializers can expose a srcset-style map without
+extra queries.
+
+Settings:
+    IMAGE_DERIVATIVES         {名称: 最长边像素}，默认 {'thumb': 320, 'medium': 960}
+    IMAGE_DERIVATIVE_QUALITY  WebP 质量（默认 80）
+    IMAGE_PIPELINE_WORKERS    进程池大小（默认 2）
+    IMAGE_PIPELINE_ASYNC      关闭时在当前进程同步生成（默认 True）
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connection, transaction
+
+from .cards import rebuild_cards
+from .image_processing import render_derivatives
+from .models import ProductImage, touch_products
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DERIVATIVES = {'thumb': 320, 'medium': 960}
+DERIVATIVE_DIR = 'products/derivatives'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_derivative_specs():
+    return getattr(settings, 'IMAGE_DERIVATIVES', DEFAULT_DERIVATIVES)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(
+                    max_workers=getattr(settings, 'IMAGE_PIPELINE_WORKERS', 2),
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+    return _executor
+
+
+def _read_source(image):
+    """优先传文件路径给子进程，存储不支持本地路径时读取字节"""
+    try:
+        return default_storage.path(image.image.name)
+    except NotImplementedError:
+        with default_storage.open(image.image.name, 'rb') as source:
+            return source.read()
+
+
+def needs_derivatives(image):
+    return bool(image.image) and image.derivatives.get('source') != image.image.name
+
+
+def store_derivatives(image_id, source_name, result):
+    """保存生成的衍生图片并记录尺寸"""
+    width, height, rendered = result
+    stem = os.path.splitext(os.path.basename(source_name))[0]
+    derivatives = {'source': source_name}
+    for name, (content, derivative_width, derivative_height) in rendered.items():
+        path = default_storage.save(f'{DERIVATIVE_DIR}/{stem}_{name}.webp', ContentFile(content))
+        derivatives[name] = {'name': path, 'width': derivative_width, 'height': derivative_height}
+    images = ProductImage.objects.filter(pk=image_id)
+    images.update(width=width, height=height, derivatives=derivatives)
+    # srcset 变化，使商品详情的条件请求校验值失效
+    product_ids = list(images.values_list('product_id', flat=True))
+    touch_products(product_ids)
+    rebuild_cards(product_ids)
+
+
+def process_image(image):
+    """在当前进程同步生成衍生图片"""
+    quality = getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', 80)
+    result = render_derivatives(_read_source(image), get_derivative_specs(), quality)
+    store_derivatives(image.pk, image.image.name, result)
+
+
+def _on_done(image_id, source_name, future):
+    # 回调运行在进程池的管理线程中，使用独立的数据库连接
+    close_old_connections()
+    try:
+        store_derivatives(image_id, source_name, future.result())
+    except Exception:
+        logger.exception('商品图片 %s 衍生图生成失败', image_id)
+    finally:
+        connection.close()
+
+
+def _submit(queryset):
+    images = [image for image in queryset if needs_derivatives(image)]
+    if not getattr(settings, 'IMAGE_PIPELINE_ASYNC', True):
+        for image in images:
+            try:
+                process_image(image)
+            except Exception:
+                logger.exception('商品图片 %s 衍生图生成失败', image.pk)
+        return
+
+    quality = getattr(settings, 'IMAGE_DERIVATIVE_QUALITY', 80)
+    specs = get_derivative_specs()
+    executor = _get_executor()
+    for image in images:
+        future = executor.submit(render_derivatives, _read_source(image), specs, quality)
+        future.add_done_callback(lambda done, pk=image.pk, name=image.image.name: _on_done(pk, name, done))
+
+
+def schedule_derivatives(image_ids):
+    """事务提交后把图片交给进程池处理，不阻塞当前请求"""
+    image_ids = list(image_ids)
+    if image_ids:
+        transaction.on_commit(lambda: _submit(ProductImage.objects.filter(pk__in=image_ids)))
+
+
+def schedule_product_derivatives(product_ids):
+    """批量插入的图片不触发信号且可能没有主键，按商品调度"""
+    product_ids = list(product_ids)
+    if product_ids:
+        transaction.on_commit(lambda: _submit(ProductImage.objects.filter(product_id__in=product_ids)))
+
+
+def derivative_url(image, name):
+    """指定衍生图的 URL，尚未生成时返回原图 URL"""
+    derivative = image.derivatives.get(name)
+    if derivative:
+        return default_storage.url(derivative['name'])
+    return image.image.url
+
+
+def srcset(image, build_url=None):
+    """原图及各衍生图的 URL 映射"""
+    if not image.image:
+        return {}
+    build_url = build_url or (lambda url: url)
+    urls = {'original': build_url(image.image.url)}
+    for name in get_derivative_specs():
+        derivative = image.derivatives.get(name)
+        if derivative:
+            urls[name] = build_url(default_storage.url(derivative['name']))
+    return urls
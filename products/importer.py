@@ -0,0 +1,266 @@
+"""
+Streaming bulk import of products from CSV or JSONL.
+
+Records are read one at a time and validated with ``ProductImportSerializer``,
+which keeps the rules of ``ProductCreateSerializer``. Artists, categories and
+tags are resolved through in-memory lookup maps instead of per-row queries.
+Valid rows are written in batches with ``bulk_create``; each batch is its own
+transaction followed by the derived writes normally done by ``save()`` and the
+post_save signals (search index, generations).
+
+A checkpoint file records how many input records have been committed, so an
+interrupted import can be resumed with the same command. Resuming is exact
+at batch granularity: a crash between a batch commit and the checkpoint write
+re-imports that batch.
+
+CSV columns are the serializer fields. ``materials``, ``techniques`` and
+``tags`` are ``|``-separated in CSV and plain lists in JSONL. ``artist``
+accepts an artist profile id, a username or an artist name. ``category``
+accepts an id, a unique name or a ``父分类/子分类`` path.
+"""
+import csv
+import json
+import os
+import time
+
+from django.db import connection, transaction
+from django.db.models import Max
+from rest_framework import serializers
+
+from users.models import ArtistProfile
+from .category_tree import get_category_tree
+from .ingest import finalize_bulk_products, resolve_tags
+from .models import Product, ProductTagRelation
+from .serializers import ProductCreateSerializer
+from .sizes import parse_size_volume
+
+LIST_FIELDS = ('materials', 'techniques', 'tags')
+LIST_SEPARATOR = '|'
+AMBIGUOUS = object()
+
+
+def read_records(path, file_format=None):
+    """逐条读取 CSV / JSONL 记录，返回 (行号, 记录) 生成器；无法解析的 JSON 行记录为 None"""
+    file_format = file_format or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+    with open(path, encoding='utf-8-sig', newline='') as source:
+        if file_format == 'csv':
+            reader = csv.DictReader(source)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for line_number, line in enumerate(source, start=1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                yield line_number, record if isinstance(record, dict) else None
+
+
+def normalize_record(record):
+    """CSV 的空单元格视为未提供，列表字段按 | 拆分"""
+    data = {}
+    for key, value in record.items():
+        if key is None:
+            continue
+        key = key.strip()
+        if isinstance(value, str):
+            value = value.strip()
+            if value == '':
+                continue
+            if key in LIST_FIELDS:
+                value = [item.strip() for item in value.split(LIST_SEPARATOR) if item.strip()]
+        data[key] = value
+    return data
+
+
+def build_artist_lookup():
+    """{ID / 用户名 / 艺术家名: 艺术家ID}；重名的艺术家名标记为不唯一"""
+    lookup = {}
+    names = {}
+    for artist_id, username, artist_name in ArtistProfile.objects.values_list('id', 'user__username', 'artist_name'):
+        lookup[str(artist_id)] = artist_id
+        lookup[username] = artist_id
+        names[artist_name] = AMBIGUOUS if artist_name in names else artist_id
+    for name, artist_id in names.items():
+        lookup.setdefault(name, artist_id)
+    return lookup
+
+
+def build_category_lookup():
+    """{ID / 名称 / 父分类/子分类 路径: 分类ID}，仅包含启用的分类"""
+    tree = get_category_tree()
+    lookup = {}
+    names = {}
+    for category in tree.nodes():
+        lookup[str(category.id)] = category.id
+        path = [ancestor.name for ancestor in reversed(tree.ancestors(category.id))] + [category.name]
+        lookup['/'.join(path)] = category.id
+        names[category.name] = AMBIGUOUS if category.name in names else category.id
+    for name, category_id in names.items():
+        lookup.setdefault(name, category_id)
+    return lookup
+
+
+class LookupField(serializers.Field):
+    """通过 context 中的查找表解析外键，不查询数据库"""
+    default_error_messages = {
+        'not_found': '{label}不存在: {value}',
+        'ambiguous': '{label}名称不唯一，请使用ID: {value}',
+    }
+
+    def __init__(self, lookup_name, label, **kwargs):
+        self.lookup_name = lookup_name
+        self.lookup_label = label
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        value = str(data).strip()
+        found = self.context[self.lookup_name].get(value)
+        if found is AMBIGUOUS:
+            self.fail('ambiguous', label=self.lookup_label, value=value)
+        if found is None:
+            self.fail('not_found', label=self.lookup_label, value=value)
+        return found
+
+    def to_representation(self, value):
+        return value
+
+
+class ProductImportSerializer(ProductCreateSerializer):
+    """导入用序列化器：沿用作品创建的校验规则，外键通过查找表解析"""
+    artist = LookupField('artists', '艺术家', source='artist_id')
+    category = LookupField('categories', '分类', source='category_id')
+    tags = serializers.ListField(
+        child=serializers.CharField(max_length=50), required=False, write_only=True
+    )
+
+    class Meta(ProductCreateSerializer.Meta):
+        fields = ProductCreateSerializer.Meta.fields + ['artist', 'tags']
+
+
+class ProductImporter:
+    """流式导入商品，按批写入"""
+
+    def __init__(self, batch_size=1000, checkpoint=None, dry_run=False, on_batch=None, on_error=None):
+        self.batch_size = batch_size
+        self.checkpoint = checkpoint
+        self.dry_run = dry_run
+        self.on_batch = on_batch
+        self.on_error = on_error
+        self.context = {'artists': build_artist_lookup(), 'categories': build_category_lookup()}
+        # 字段只构建一次，逐条调用 run_validation
+        self.serializer = ProductImportSerializer(context=self.context)
+        self.tags = {}
+        self.stats = {'read': 0, 'skipped': 0, 'imported': 0, 'rejected': 0, 'elapsed': 0.0}
+
+    def load_checkpoint(self, source):
+        if not self.checkpoint or not os.path.exists(self.checkpoint):
+            return 0
+        with open(self.checkpoint, encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get('source') != os.path.abspath(source):
+            raise ValueError(f'检查点文件属于另一个导入源: {state.get("source")}')
+        return state['records']
+
+    def save_checkpoint(self, source, records):
+        if not self.checkpoint or self.dry_run:
+            return
+        temporary = f'{self.checkpoint}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump({'source': os.path.abspath(source), 'records': records, 'imported': self.stats['imported']}, f)
+        os.replace(temporary, self.checkpoint)
+
+    def run(self, path, file_format=None):
+        started = time.monotonic()
+        done = self.load_checkpoint(path)
+        self.stats['skipped'] = done
+        batch = []
+        position = 0
+        for line_number, record in read_records(path, file_format):
+            position += 1
+            if position <= done:
+                continue
+            self.stats['read'] += 1
+            try:
+                if record is None:
+                    raise serializers.ValidationError({'non_field_errors': ['无法解析的 JSON 行']})
+                batch.append(self.serializer.run_validation(normalize_record(record)))
+            except serializers.ValidationError as exc:
+                self.stats['rejected'] += 1
+                if self.on_error:
+                    self.on_error(line_number, record, exc.detail)
+            if position - done >= self.batch_size:
+                self.write_batch(batch)
+                batch = []
+                done = position
+                self.save_checkpoint(path, done)
+                self.report(started)
+        self.write_batch(batch)
+        self.save_checkpoint(path, position)
+        self.report(started)
+        return self.stats
+
+    def report(self, started):
+        self.stats['elapsed'] = time.monotonic() - started
+        if self.on_batch:
+            self.on_batch(self.stats)
+
+    def resolve_tags(self, names):
+        missing = [name for name in names if name not in self.tags]
+        if missing:
+            self.tags.update(resolve_tags(missing))
+        return [self.tags[name] for name in names if name in self.tags]
+
+    def write_batch(self, rows):
+        if not rows:
+            return
+        products = []
+        tag_names = []
+        for data in rows:
+            data = dict(data)
+            tag_names.append(data.pop('tags', []))
+            product = Product(**data)
+            product.size_volume = parse_size_volume(product.size)
+            product.init_available_quantity()
+            products.append(product)
+        if self.dry_run:
+            self.stats['imported'] += len(products)
+            return
+
+        with transaction.atomic():
+            before = Product.objects.aggregate(last=Max('pk'))['last'] or 0
+            Product.objects.bulk_create(products)
+            if products[0].pk is None:
+                self.recover_pks(products, before)
+            relations = {}
+            for product, names in zip(products, tag_names):
+                for tag in self.resolve_tags(names):
+                    relations[(product.pk, tag.pk)] = ProductTagRelation(product_id=product.pk, tag_id=tag.pk)
+            ProductTagRelation.objects.bulk_create(list(relations.values()), ignore_conflicts=True)
+            finalize_bulk_products(products)
+        self.stats['imported'] += len(products)
+
+    @staticmethod
+    def recover_pks(products, before):
+        """
+        数据库不返回批量插入的主键时（MySQL），按 (艺术家, 标题) 取回本批新行的ID。
+
+        同一批内重复的 (艺术家, 标题) 按插入顺序对应。
+        """
+        pending = {}
+        for product in products:
+            pending.setdefault((product.artist_id, product.title), []).append(product)
+        rows = Product.objects.filter(
+            pk__gt=before,
+            artist_id__in={product.artist_id for product in products},
+        ).order_by('pk').values_list('pk', 'artist_id', 'title')
+        for pk, artist_id, title in rows.iterator(chunk_size=2000):
+            waiting = pending.get((artist_id, title))
+            if waiting:
+                waiting.pop(0).pk = pk
+        missing = sum(len(waiting) for waiting in pending.values())
+        if missing:
+            raise RuntimeError(f'{missing} 个导入商品无法取回主键（{connection.vendor}）')
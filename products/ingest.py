@@ -0,0 +1,120 @@
+"""
+Bulk write path for a work's images and tags.
+
+``attach_images`` inserts all images of a work in one ``bulk_create`` and
+``attach_tags`` resolves every tag name with one query, creates the missing
+tags and all relations with ``bulk_create``. The number of queries stays
+constant no matter how many images or tags an upload carries. Bulk inserts
+send no signals, so both functions touch the product's ``updated_at`` and
+rebuild its list card themselves. ``finalize_bulk_products`` does the same for
+products inserted with ``bulk_create``.
+"""
+from django.db.models import Count, Max, Q
+
+from blendlumina.generations import bump_generation
+from .attributes import sync_product_attributes
+from .cards import rebuild_cards
+from .images import schedule_product_derivatives
+from .models import Product, ProductImage, ProductTag, ProductTagRelation, touch_products
+from .search import index_products
+
+
+def clean_tag_names(names):
+    """去除空白和重复的标签名，保持原有顺序"""
+    max_length = ProductTag._meta.get_field('name').max_length
+    cleaned = []
+    seen = set()
+    for name in names:
+        name = (name or '').strip()[:max_length]
+        if name and name not in seen:
+            seen.add(name)
+            cleaned.append(name)
+    return cleaned
+
+
+def attach_images(product, files, alt_texts=(), append=False):
+    """
+    一次插入作品的全部图片。
+
+    新作品的第一张图片设为主图；append=True 时接在已有图片之后，
+    且仅在作品还没有主图时设置主图。
+    """
+    files = list(files)
+    if not files:
+        return []
+    alt_texts = list(alt_texts)
+    start, has_primary = 0, False
+    if append:
+        existing = product.images.aggregate(
+            last=Max('sort_order'), primaries=Count('id', filter=Q(is_primary=True))
+        )
+        if existing['last'] is not None:
+            start = existing['last'] + 1
+        has_primary = existing['primaries'] > 0
+
+    images = [
+        ProductImage(
+            product=product,
+            image=image,
+            alt_text=alt_texts[i] if i < len(alt_texts) else '',
+            is_primary=(i == 0 and not has_primary),
+            sort_order=start + i,
+        )
+        for i, image in enumerate(files)
+    ]
+    images = ProductImage.objects.bulk_create(images)
+    touch_products([product.pk])
+    rebuild_cards([product.pk])
+    # bulk_create 不发送 post_save，这里直接调度衍生图生成
+    schedule_product_derivatives([product.pk])
+    return images
+
+
+def resolve_tags(names):
+    """按名称取标签，不存在的批量创建；返回 {名称: 标签}"""
+    names = clean_tag_names(names)
+    if not names:
+        return {}
+    tags = {tag.name: tag for tag in ProductTag.objects.filter(name__in=names)}
+    missing = [name for name in names if name not in tags]
+    if missing:
+        # 并发上传可能同时创建同名标签，忽略冲突后重新读取
+        ProductTag.objects.bulk_create([ProductTag(name=name) for name in missing], ignore_conflicts=True)
+        tags.update((tag.name, tag) for tag in ProductTag.objects.filter(name__in=missing))
+
+    # 数据库排序规则不区分大小写时，已有标签可能与传入名称大小写不同
+    folded = {name.casefold(): tag for name, tag in tags.items()}
+    return {
+        name: tags.get(name) or folded[name.casefold()]
+        for name in names
+        if name in tags or name.casefold() in folded
+    }
+
+
+def attach_tags(product, names):
+    """为作品添加标签，已关联的标签会被忽略"""
+    tags = resolve_tags(names)
+    unique_tags = {tag.pk: tag for tag in tags.values()}
+    ProductTagRelation.objects.bulk_create(
+        [ProductTagRelation(product=product, tag=tag) for tag in unique_tags.values()],
+        ignore_conflicts=True,
+    )
+    if unique_tags:
+        touch_products([product.pk])
+        rebuild_cards([product.pk])
+    return list(unique_tags.values())
+
+
+def finalize_bulk_products(products):
+    """
+    补做批量插入商品时被跳过的 save() 和信号中的派生写入。
+
+    products 需已带主键；size_volume 和可售数量（init_available_quantity）应在插入前由调用方设置。
+    """
+    products = list(products)
+    if not products:
+        return
+    index_products(products)
+    sync_product_attributes(products)
+    rebuild_cards([product.pk for product in products])
+    bump_generation(Product._meta.label_lower)
@@ -0,0 +1,113 @@
+import json
+import platform
+import subprocess
+import time
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from blendlumina.bench import ClientTransport, HttpTransport, run_scenarios
+from products.benchmark import SCALES, bench_user, build_scenarios, clear_dataset, dataset_size, seed_dataset
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, timeout=5
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = '生成基准数据集并压测热点接口，以 JSON 输出延迟分位数、吞吐量和查询数'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=list(SCALES), default='1k', help='数据集规模（商品数）')
+        parser.add_argument('--seed', type=int, default=42, help='随机种子，相同种子生成相同的数据和请求序列')
+        parser.add_argument('--reseed', action='store_true', help='删除已有基准数据后重新生成')
+        parser.add_argument('--seed-only', action='store_true', help='只生成数据集，不执行压测')
+        parser.add_argument('--no-index', action='store_true', help='生成数据时不建立搜索索引')
+        parser.add_argument('--iterations', type=int, default=200, help='每个接口计入统计的请求数')
+        parser.add_argument('--warmup', type=int, default=20, help='每个接口预热的请求数')
+        parser.add_argument('--endpoints', help='只压测这些接口（逗号分隔）')
+        parser.add_argument('--url', help='压测运行中的服务器（如 http://127.0.0.1:8000），默认在进程内通过测试客户端请求')
+        parser.add_argument('--output', help='把结果写入该 JSON 文件，默认输出到标准输出')
+
+    def handle(self, *args, **options):
+        if options['iterations'] < 1 or options['warmup'] < 0:
+            raise CommandError('--iterations 必须大于 0，--warmup 不能为负数')
+        expected = SCALES[options['scale']]
+
+        existing = dataset_size()
+        if existing and options['reseed']:
+            self.stderr.write('删除已有基准数据...')
+            clear_dataset()
+            existing = 0
+        if existing and existing != expected:
+            raise CommandError(f'已有 {existing} 个商品的基准数据集，与 --scale {options["scale"]} 不符，请加 --reseed')
+        if not existing:
+            started = time.monotonic()
+
+            def on_progress(stage, counts):
+                self.stderr.write(f"{stage}: 商品 {counts['products']}，订单 {counts['orders']}（{time.monotonic() - started:.0f} 秒）")
+
+            counts = seed_dataset(options['scale'], options['seed'], index=not options['no_index'], on_progress=on_progress)
+            self.stderr.write(self.style.SUCCESS(
+                f'数据集生成完成，耗时 {time.monotonic() - started:.1f} 秒：'
+                + '，'.join(f'{name} {count}' for name, count in counts.items())
+            ))
+        if options['seed_only']:
+            return
+
+        scenarios = build_scenarios(options['seed'])
+        if options['endpoints']:
+            names = [name.strip() for name in options['endpoints'].split(',') if name.strip()]
+            unknown = set(names) - set(scenarios)
+            if unknown:
+                raise CommandError(f'未知接口: {", ".join(sorted(unknown))}；可选: {", ".join(scenarios)}')
+            scenarios = {name: scenarios[name] for name in names}
+
+        user = bench_user()
+        if options['url']:
+            token, _ = Token.objects.get_or_create(user=user)
+            transport = HttpTransport(options['url'], token=token.key)
+        else:
+            transport = ClientTransport(user)
+
+        def on_result(name, result):
+            self.stderr.write(
+                f"{name}: p50 {result['p50_ms']}ms  p95 {result['p95_ms']}ms  p99 {result['p99_ms']}ms  "
+                f"{result['throughput_rps']} 次/秒  错误 {result['errors']}"
+            )
+
+        results = run_scenarios(
+            transport, scenarios, options['iterations'], warmup=options['warmup'], on_result=on_result
+        )
+        report = {
+            'meta': {
+                'scale': options['scale'],
+                'products': dataset_size(),
+                'seed': options['seed'],
+                'iterations': options['iterations'],
+                'warmup': options['warmup'],
+                'transport': transport.name,
+                'url': options['url'],
+                'database': connection.vendor,
+                'commit': git_commit(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'timestamp': timezone.now().isoformat(),
+            },
+            'endpoints': results,
+        }
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f'结果已写入 {options["output"]}'))
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from products.rankings import compute_rankings
+
+
+class Command(BaseCommand):
+    help = '重新计算商品排行榜（建议通过定时任务执行）'
+
+    def handle(self, *args, **options):
+        self.stdout.write('开始计算商品排行榜...')
+        total = compute_rankings()
+        self.stdout.write(self.style.SUCCESS(f'排行榜计算完成，共写入 {total} 条记录'))
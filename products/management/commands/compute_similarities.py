@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from products.similarity import compute_similarities
+
+
+class Command(BaseCommand):
+    help = '计算相似作品（默认只处理上次运行后变更的商品，建议通过定时任务执行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='全部重新计算')
+
+    def handle(self, *args, **options):
+        self.stdout.write('开始计算相似作品...')
+        total = compute_similarities(full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f'相似作品计算完成，共重算 {total} 个商品'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from products.images import needs_derivatives, process_image
+from products.models import ProductImage
+
+
+class Command(BaseCommand):
+    help = '为商品图片生成 WebP 衍生图（补齐历史图片）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='重新生成已有衍生图的图片')
+
+    def handle(self, *args, **options):
+        self.stdout.write('开始生成商品图片衍生图...')
+        done = failed = 0
+        for image in ProductImage.objects.order_by('pk').iterator(chunk_size=200):
+            if not options['force'] and not needs_derivatives(image):
+                continue
+            try:
+                process_image(image)
+                done += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f'图片 {image.pk} 处理失败: {e}')
+        self.stdout.write(self.style.SUCCESS(f'衍生图生成完成，成功 {done} 张，失败 {failed} 张'))
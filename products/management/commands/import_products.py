@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from products.importer import ProductImporter
+
+
+class Command(BaseCommand):
+    help = '从 CSV 或 JSONL 文件批量导入商品（流式读取，支持断点续传）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV 或 JSONL 文件路径')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='文件格式，默认按扩展名判断')
+        parser.add_argument('--batch-size', type=int, default=1000, help='每批写入的记录数')
+        parser.add_argument('--checkpoint', help='检查点文件，存在时从上次提交的位置继续导入')
+        parser.add_argument('--errors', help='把校验失败的记录写入该 JSONL 文件')
+        parser.add_argument('--dry-run', action='store_true', help='只校验不写入')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size 必须大于 0')
+        errors_file = open(options['errors'], 'a', encoding='utf-8') if options['errors'] else None
+
+        def on_error(line_number, record, errors):
+            self.stderr.write(f'第 {line_number} 行校验失败: {json.dumps(errors, ensure_ascii=False)}')
+            if errors_file:
+                errors_file.write(json.dumps({'line': line_number, 'record': record, 'errors': errors}, ensure_ascii=False) + '\n')
+
+        def on_batch(stats):
+            rate = stats['imported'] / stats['elapsed'] if stats['elapsed'] else 0
+            self.stdout.write(
+                f"已读取 {stats['read']} 条，导入 {stats['imported']} 条，失败 {stats['rejected']} 条，"
+                f"{rate:.0f} 条/秒"
+            )
+
+        importer = ProductImporter(
+            batch_size=options['batch_size'],
+            checkpoint=options['checkpoint'],
+            dry_run=options['dry_run'],
+            on_batch=on_batch,
+            on_error=on_error,
+        )
+        try:
+            stats = importer.run(options['path'], options['format'])
+        except (OSError, ValueError) as e:
+            raise CommandError(f'导入失败: {e}')
+        finally:
+            if errors_file:
+                errors_file.close()
+
+        rate = stats['imported'] / stats['elapsed'] if stats['elapsed'] else 0
+        prefix = '校验完成（未写入）' if options['dry_run'] else '导入完成'
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}：读取 {stats['read']} 条，导入 {stats['imported']} 条，失败 {stats['rejected']} 条，"
+            f"跳过（断点之前） {stats['skipped']} 条，耗时 {stats['elapsed']:.1f} 秒，{rate:.0f} 条/秒"
+        ))
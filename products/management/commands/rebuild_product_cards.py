@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from products.cards import rebuild_all_cards
+
+
+class Command(BaseCommand):
+    help = '重建全部商品的列表卡片'
+
+    def handle(self, *args, **options):
+        self.stdout.write('开始重建商品卡片...')
+        total = rebuild_all_cards()
+        self.stdout.write(self.style.SUCCESS(f'商品卡片重建完成，共处理 {total} 个商品'))
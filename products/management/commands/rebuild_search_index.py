@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from products.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = '重建商品全文检索索引'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='每批索引的商品数')
+
+    def handle(self, *args, **options):
+        self.stdout.write('开始重建商品全文检索索引...')
+        total = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'索引重建完成，共索引 {total} 个商品'))
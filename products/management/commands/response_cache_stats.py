@@ -0,0 +1,23 @@
+from importlib import import_module
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from blendlumina.response_cache import get_response_cache_stats, reset_response_cache_stats
+
+
+class Command(BaseCommand):
+    help = '查看公开接口响应缓存的命中统计'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='输出后清零统计')
+
+    def handle(self, *args, **options):
+        # 加载路由以注册全部使用响应缓存的视图集
+        import_module(settings.ROOT_URLCONF)
+        stats = get_response_cache_stats()
+        for name, item in stats.items():
+            hit_rate = '-' if item['hit_rate'] is None else f"{item['hit_rate']:.1%}"
+            self.stdout.write(f"{name:<36} 命中 {item['hits']:>8}  未命中 {item['misses']:>8}  命中率 {hit_rate:>6}")
+        if options['reset']:
+            reset_response_cache_stats()
+            self.stdout.write(self.style.SUCCESS('统计已清零'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from products.attributes import rebuild_product_attributes
+
+
+class Command(BaseCommand):
+    help = '重建商品材质、技法的属性索引表'
+
+    def handle(self, *args, **options):
+        self.stdout.write('开始重建商品属性索引...')
+        total = rebuild_product_attributes()
+        self.stdout.write(self.style.SUCCESS(f'属性索引重建完成，共处理 {total} 个商品'))
@@ -0,0 +1,74 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0002_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductSearchDocument",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="search_document",
+                        serialize=False,
+                        to="products.product",
+                        verbose_name="商品",
+                    ),
+                ),
+                (
+                    "length",
+                    models.PositiveIntegerField(default=0, verbose_name="词元数"),
+                ),
+                (
+                    "indexed_at",
+                    models.DateTimeField(auto_now=True, verbose_name="索引时间"),
+                ),
+            ],
+            options={
+                "verbose_name": "商品索引文档",
+                "verbose_name_plural": "商品索引文档",
+            },
+        ),
+        migrations.CreateModel(
+            name="ProductSearchTerm",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("term", models.CharField(max_length=64, verbose_name="词元")),
+                (
+                    "frequency",
+                    models.PositiveIntegerField(default=1, verbose_name="词频"),
+                ),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_terms",
+                        to="products.product",
+                        verbose_name="商品",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "商品索引词元",
+                "verbose_name_plural": "商品索引词元",
+                "unique_together": {("term", "product")},
+            },
+        ),
+    ]
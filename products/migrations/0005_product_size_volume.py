@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:38
+
+from django.db import migrations, models
+
+from products.sizes import parse_size_volume
+
+
+def populate_size_volume(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    batch = []
+    for product in Product.objects.exclude(size="").only("id", "size").iterator():
+        volume = parse_size_volume(product.size)
+        if volume is None:
+            continue
+        product.size_volume = volume
+        batch.append(product)
+        if len(batch) >= 500:
+            Product.objects.bulk_update(batch, ["size_volume"])
+            batch = []
+    Product.objects.bulk_update(batch, ["size_volume"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0004_keyset_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="size_volume",
+            field=models.DecimalField(
+                blank=True,
+                decimal_places=2,
+                editable=False,
+                max_digits=12,
+                null=True,
+                verbose_name="体积(cm³)",
+            ),
+        ),
+        migrations.RunPython(populate_size_volume, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0005_product_size_volume"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductRanking",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "scope",
+                    models.CharField(
+                        choices=[
+                            ("overall", "总榜"),
+                            ("category", "分类榜"),
+                            ("artist", "艺术家榜"),
+                        ],
+                        max_length=20,
+                        verbose_name="榜单类型",
+                    ),
+                ),
+                (
+                    "scope_id",
+                    models.PositiveBigIntegerField(
+                        default=0, verbose_name="榜单对象ID"
+                    ),
+                ),
+                ("rank", models.PositiveIntegerField(verbose_name="名次")),
+                ("score", models.FloatField(verbose_name="得分")),
+                ("computed_at", models.DateTimeField(verbose_name="计算时间")),
+                (
+                    "product",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="rankings",
+                        to="products.product",
+                        verbose_name="商品",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "商品排行",
+                "verbose_name_plural": "商品排行",
+                "ordering": ["scope", "scope_id", "rank"],
+                "unique_together": {("scope", "scope_id", "rank")},
+            },
+        ),
+    ]
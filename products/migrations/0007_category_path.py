@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:39
+
+from django.db import migrations, models
+
+
+def populate_category_paths(apps, schema_editor):
+    Category = apps.get_model("products", "Category")
+    categories = {category.pk: category for category in Category.objects.all()}
+
+    def resolve(category, seen=()):
+        if category.path:
+            return category.path, category.depth
+        parent = categories.get(category.parent_id)
+        if parent is None or parent.pk in seen:
+            prefix, depth = "", 0
+        else:
+            parent_path, parent_depth = resolve(parent, seen + (category.pk,))
+            prefix, depth = parent_path, parent_depth + 1
+        category.path = f"{prefix}{category.pk:010d}/"
+        category.depth = depth
+        return category.path, category.depth
+
+    for category in categories.values():
+        resolve(category)
+    Category.objects.bulk_update(categories.values(), ["path", "depth"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0006_product_ranking"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="category",
+            name="depth",
+            field=models.PositiveSmallIntegerField(
+                default=0, editable=False, verbose_name="层级"
+            ),
+        ),
+        migrations.AddField(
+            model_name="category",
+            name="path",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                editable=False,
+                max_length=255,
+                verbose_name="分类路径",
+            ),
+        ),
+        migrations.RunPython(populate_category_paths, migrations.RunPython.noop),
+    ]
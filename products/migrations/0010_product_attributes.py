@@ -0,0 +1,100 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# 迁移不引用应用代码，以下是编写时 products.attributes 中的取值规则
+VALUE_MAX_LENGTH = 100
+
+
+def attribute_values(materials, techniques):
+    pairs = set()
+    for kind, values in (("material", materials), ("technique", techniques)):
+        if not isinstance(values, (list, tuple)):
+            continue
+        for value in values:
+            value = str(value).strip().lower()[:VALUE_MAX_LENGTH]
+            if value:
+                pairs.add((kind, value))
+    return pairs
+
+
+def populate_attributes(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    ProductAttribute = apps.get_model("products", "ProductAttribute")
+    batch = []
+    for product in (
+        Product.objects.only("id", "materials", "techniques").order_by("pk").iterator()
+    ):
+        for kind, value in attribute_values(product.materials, product.techniques):
+            batch.append(
+                ProductAttribute(product_id=product.pk, kind=kind, value=value)
+            )
+        if len(batch) >= 2000:
+            ProductAttribute.objects.bulk_create(batch)
+            batch = []
+    ProductAttribute.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0009_product_similarity"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductAttribute",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("material", "材质"), ("technique", "技法")],
+                        max_length=20,
+                        verbose_name="属性类型",
+                    ),
+                ),
+                ("value", models.CharField(max_length=100, verbose_name="属性值")),
+            ],
+            options={
+                "verbose_name": "商品属性",
+                "verbose_name_plural": "商品属性",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["status", "category", "price", "id"],
+                name="product_status_cat_price_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="productattribute",
+            name="product",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="attributes",
+                to="products.product",
+                verbose_name="商品",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="productattribute",
+            index=models.Index(
+                fields=["kind", "value", "product"], name="product_attribute_lookup_idx"
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="productattribute",
+            unique_together={("product", "kind", "value")},
+        ),
+        migrations.RunPython(populate_attributes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def populate_cards(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    ProductCard = apps.get_model("products", "ProductCard")
+    ProductImage = apps.get_model("products", "ProductImage")
+    ProductTagRelation = apps.get_model("products", "ProductTagRelation")
+    images = {}
+    # 倒序遍历，每个商品最终保留排序最靠前的主图
+    for image in ProductImage.objects.filter(is_primary=True).order_by(
+        "-product_id", "-sort_order", "-id"
+    ):
+        images[image.product_id] = {
+            "id": image.id,
+            "image": image.image.name,
+            "alt_text": image.alt_text,
+            "sort_order": image.sort_order,
+            "width": image.width,
+            "height": image.height,
+            "derivatives": image.derivatives,
+        }
+    tags = {}
+    for relation in ProductTagRelation.objects.select_related("tag").order_by(
+        "product_id", "tag__name"
+    ):
+        tags.setdefault(relation.product_id, []).append(
+            {
+                "id": relation.tag_id,
+                "name": relation.tag.name,
+                "color": relation.tag.color,
+            }
+        )
+    rows = Product.objects.values_list("pk", "artist__artist_name")
+    ProductCard.objects.bulk_create(
+        [
+            ProductCard(
+                product_id=pk,
+                artist_name=artist_name or "",
+                primary_image=images.get(pk),
+                tags=tags.get(pk, []),
+            )
+            for pk, artist_name in rows.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("products", "0010_product_attributes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProductCard",
+            fields=[
+                (
+                    "product",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="card",
+                        serialize=False,
+                        to="products.product",
+                        verbose_name="商品",
+                    ),
+                ),
+                (
+                    "artist_name",
+                    models.CharField(
+                        blank=True, max_length=100, verbose_name="艺术家名称"
+                    ),
+                ),
+                (
+                    "primary_image",
+                    models.JSONField(blank=True, null=True, verbose_name="主图"),
+                ),
+                (
+                    "tags",
+                    models.JSONField(blank=True, default=list, verbose_name="标签"),
+                ),
+                (
+                    "built_at",
+                    models.DateTimeField(auto_now=True, verbose_name="生成时间"),
+                ),
+            ],
+            options={
+                "verbose_name": "商品卡片",
+                "verbose_name_plural": "商品卡片",
+            },
+        ),
+        migrations.RunPython(populate_cards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:07
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def populate_available_quantity(apps, schema_editor):
+    Product = apps.get_model("products", "Product")
+    OrderItem = apps.get_model("orders", "OrderItem")
+    limited = Product.objects.filter(is_limited=True, limited_quantity__isnull=False)
+    sold = dict(
+        OrderItem.objects.filter(product__in=limited)
+        .exclude(order__status__in=["cancelled", "refunded"])
+        .values("product_id")
+        .annotate(sold=Sum("quantity"))
+        .values_list("product_id", "sold")
+    )
+    # 可售数量 = 限量数量 - 未取消订单已售数量
+    for product_id, limited_quantity in limited.values_list("id", "limited_quantity"):
+        Product.objects.filter(pk=product_id).update(
+            available_quantity=max(0, limited_quantity - sold.get(product_id, 0))
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("orders", "0003_initial"),
+        ("products", "0011_product_card"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="available_quantity",
+            field=models.PositiveIntegerField(
+                blank=True, editable=False, null=True, verbose_name="可售数量"
+            ),
+        ),
+        migrations.RunPython(populate_available_quantity, migrations.RunPython.noop),
+    ]
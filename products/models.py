@@ -1,6 +1,14 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.db.models.expressions import Combinable
+from django.db.models.functions import Concat, Substr
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
+from blendlumina.generations import bump_generation
 from users.models import User, ArtistProfile
+from .category_tree import CATEGORY_GENERATION, invalidate_category_tree
+from .sizes import parse_size_volume
 
 
 class Category(models.Model):
@@ -11,6 +19,9 @@ class Category(models.Model):
     image = models.ImageField(upload_to='categories/', blank=True, verbose_name='分类图片')
     sort_order = models.PositiveIntegerField(default=0, verbose_name='排序')
     is_active = models.BooleanField(default=True, verbose_name='是否启用')
+    # 物化路径：祖先到自身的ID链，如 "0000000001/0000000005/"，用于一次范围查询取整棵子树
+    path = models.CharField(max_length=255, blank=True, db_index=True, editable=False, verbose_name='分类路径')
+    depth = models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='层级')
     
     class Meta:
         verbose_name = '商品分类'
@@ -19,6 +30,39 @@ class Category(models.Model):
     
     def __str__(self):
         return self.name
+    
+    @staticmethod
+    def path_segment(pk):
+        return f'{pk:010d}/'
+    
+    def clean(self):
+        super().clean()
+        if self.pk and self.parent_id:
+            parent_path = Category.objects.filter(pk=self.parent_id).values_list('path', flat=True).first() or ''
+            if self.parent_id == self.pk or (self.path and parent_path.startswith(self.path)):
+                raise ValidationError({'parent': '不能将分类移动到自身或其子分类下'})
+    
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        parent = self.parent if self.parent_id else None
+        new_path = (parent.path if parent else '') + self.path_segment(self.pk)
+        new_depth = parent.depth + 1 if parent else 0
+        if new_path == self.path and new_depth == self.depth:
+            return
+        
+        old_path, old_depth = self.path, self.depth
+        with transaction.atomic():
+            Category.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+            if old_path:
+                # 分类移动后同步改写所有后代的路径前缀
+                Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+                    depth=F('depth') + (new_depth - old_depth),
+                )
+        self.path, self.depth = new_path, new_depth
+        # 路径在 post_save 之后才写入，需再次使分类树失效
+        bump_generation(CATEGORY_GENERATION)
+        transaction.on_commit(invalidate_category_tree)
 
 
 class PriceRange(models.Model):
@@ -66,6 +110,10 @@ class Usage(models.Model):
         return self.name
 
 
+# 决定可售数量的字段，见 Product.sync_available_quantity
+STOCK_FIELDS = ('is_limited', 'limited_quantity', 'available_quantity')
+
+
 class Product(models.Model):
     """商品模型"""
     STATUS_CHOICES = [
@@ -82,6 +130,7 @@ class Product(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='价格')
     original_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name='原价')
     size = models.CharField(max_length=100, blank=True, verbose_name='尺寸')
+    size_volume = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, editable=False, verbose_name='体积(cm³)')
     weight = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True, verbose_name='重量(kg)')
     materials = models.JSONField(default=list, verbose_name='材质')
     techniques = models.JSONField(default=list, verbose_name='技法')
@@ -89,6 +138,8 @@ class Product(models.Model):
     is_original = models.BooleanField(default=True, verbose_name='是否原创')
     is_limited = models.BooleanField(default=False, verbose_name='是否限量')
     limited_quantity = models.PositiveIntegerField(null=True, blank=True, verbose_name='限量数量')
+    # 限量作品的可售数量，下单时原子扣减，见 orders/inventory.py；非限量作品为空（不限）
+    available_quantity = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name='可售数量')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft', verbose_name='状态')
     views_count = models.PositiveIntegerField(default=0, verbose_name='浏览量')
     likes_count = models.PositiveIntegerField(default=0, verbose_name='点赞数')
@@ -99,9 +150,106 @@ class Product(models.Model):
         verbose_name = '商品'
         verbose_name_plural = '商品'
         ordering = ['-created_at']
+        # 游标分页按 (status, 排序字段, id) 定位，见 blendlumina/pagination.py
+        indexes = [
+            models.Index(fields=['status', 'created_at', 'id'], name='product_status_created_idx'),
+            models.Index(fields=['status', 'price', 'id'], name='product_status_price_idx'),
+            models.Index(fields=['status', 'views_count', 'id'], name='product_status_views_idx'),
+            models.Index(fields=['status', 'likes_count', 'id'], name='product_status_likes_idx'),
+            # 按分类浏览并按价格筛选或排序
+            models.Index(fields=['status', 'category', 'price', 'id'], name='product_status_cat_price_idx'),
+        ]
     
     def __str__(self):
         return self.title
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记录读取时的限量设置，保存时据此调整可售数量
+        loaded = dict(zip(field_names, values))
+        if all(name in loaded for name in STOCK_FIELDS):
+            instance._loaded_stock = tuple(loaded[name] for name in STOCK_FIELDS)
+        return instance
+    
+    def save(self, *args, **kwargs):
+        # 体积由尺寸文本解析，供尺寸区间筛选使用
+        self.size_volume = parse_size_volume(self.size)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'size' in update_fields:
+                update_fields.add('size_volume')
+            if update_fields & {'is_limited', 'limited_quantity'} and self.sync_available_quantity():
+                update_fields.add('available_quantity')
+            kwargs['update_fields'] = update_fields
+        elif self._state.adding or args or kwargs.get('force_insert'):
+            self.init_available_quantity()
+        elif not self.sync_available_quantity():
+            # 可售数量由库存模块用条件更新维护，整行保存时不写回内存中可能过期的值
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'available_quantity'
+            ]
+        super().save(*args, **kwargs)
+        if isinstance(self.available_quantity, Combinable):
+            self.refresh_from_db(fields=['available_quantity'])
+        self._loaded_stock = (self.is_limited, self.limited_quantity, self.available_quantity)
+    
+    def sync_available_quantity(self):
+        """
+        已有商品修改限量设置时调整可售数量，返回是否需要写入 available_quantity。
+
+        * 不再限量（或未填限量数量）：可售数量清空；
+        * 首次限量：限量数量减去未取消、未退款订单中已售出的件数；
+        * 修改限量数量：按增减量用 F() 表达式调整，不覆盖并发下单的扣减，最少为 0。
+        """
+        if not self.is_limited or self.limited_quantity is None:
+            changed = self.available_quantity is not None
+            self.available_quantity = None
+            return changed
+        loaded = getattr(self, '_loaded_stock', None)
+        if loaded is None:
+            loaded = Product.objects.filter(pk=self.pk).values_list(*STOCK_FIELDS).first() or (False, None, None)
+        was_limited, old_quantity, old_available = loaded
+        if not was_limited or old_quantity is None or old_available is None:
+            self.available_quantity = max(0, self.limited_quantity - self.sold_quantity())
+            return True
+        delta = self.limited_quantity - old_quantity
+        if delta == 0:
+            return False
+        if delta > 0:
+            self.available_quantity = F('available_quantity') + delta
+        else:
+            self.available_quantity = Case(
+                When(available_quantity__gte=-delta, then=F('available_quantity') - (-delta)),
+                default=Value(0),
+            )
+        return True
+    
+    def sold_quantity(self):
+        """未取消、未退款订单中已售出的件数"""
+        sold = self.orderitem_set.exclude(order__status__in=['cancelled', 'refunded']).aggregate(
+            total=Sum('quantity')
+        )['total']
+        return sold or 0
+    
+    def init_available_quantity(self):
+        """新建的限量作品以限量数量作为可售数量（bulk_create 前由调用方调用）；返回是否修改了可售数量"""
+        if not self.is_limited:
+            available_quantity = None
+        elif self.available_quantity is None:
+            available_quantity = self.limited_quantity
+        else:
+            return False
+        changed = available_quantity != self.available_quantity
+        self.available_quantity = available_quantity
+        return changed
+
+
+def touch_products(product_ids):
+    """图片、标签等关联数据变化时刷新商品的 updated_at，使条件请求的校验值失效"""
+    Product.objects.filter(pk__in=list(product_ids)).update(updated_at=timezone.now())
 
 
 class ProductImage(models.Model):
@@ -111,6 +259,10 @@ class ProductImage(models.Model):
     alt_text = models.CharField(max_length=200, blank=True, verbose_name='图片描述')
     is_primary = models.BooleanField(default=False, verbose_name='是否主图')
     sort_order = models.PositiveIntegerField(default=0, verbose_name='排序')
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name='宽度')
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name='高度')
+    # {'source': 原图文件名, 名称: {'name': 文件名, 'width': 宽, 'height': 高}}
+    derivatives = models.JSONField(default=dict, blank=True, editable=False, verbose_name='衍生图片')
     
     class Meta:
         verbose_name = '商品图片'
@@ -146,3 +298,116 @@ class ProductTagRelation(models.Model):
     
     def __str__(self):
         return f"{self.product.title} - {self.tag.name}"
+
+
+class ProductSearchDocument(models.Model):
+    """商品全文索引文档"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='search_document', verbose_name='商品')
+    length = models.PositiveIntegerField(default=0, verbose_name='词元数')
+    indexed_at = models.DateTimeField(auto_now=True, verbose_name='索引时间')
+    
+    class Meta:
+        verbose_name = '商品索引文档'
+        verbose_name_plural = '商品索引文档'
+    
+    def __str__(self):
+        return f"{self.product_id} ({self.length})"
+
+
+class ProductSearchTerm(models.Model):
+    """商品全文索引倒排项"""
+    term = models.CharField(max_length=64, verbose_name='词元')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_terms', verbose_name='商品')
+    frequency = models.PositiveIntegerField(default=1, verbose_name='词频')
+    
+    class Meta:
+        verbose_name = '商品索引词元'
+        verbose_name_plural = '商品索引词元'
+        unique_together = ['term', 'product']
+    
+    def __str__(self):
+        return f"{self.term} - {self.product_id}"
+
+
+class ProductRanking(models.Model):
+    """商品排行榜（预计算）"""
+    SCOPE_CHOICES = [
+        ('overall', '总榜'),
+        ('category', '分类榜'),
+        ('artist', '艺术家榜'),
+    ]
+    
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES, verbose_name='榜单类型')
+    scope_id = models.PositiveBigIntegerField(default=0, verbose_name='榜单对象ID')
+    rank = models.PositiveIntegerField(verbose_name='名次')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='rankings', verbose_name='商品')
+    score = models.FloatField(verbose_name='得分')
+    computed_at = models.DateTimeField(verbose_name='计算时间')
+    
+    class Meta:
+        verbose_name = '商品排行'
+        verbose_name_plural = '商品排行'
+        ordering = ['scope', 'scope_id', 'rank']
+        unique_together = ['scope', 'scope_id', 'rank']
+    
+    def __str__(self):
+        return f"{self.get_scope_display()}#{self.scope_id} {self.rank} - {self.product_id}"
+
+
+class ProductSimilarity(models.Model):
+    """相似作品（预计算的近邻表）"""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='similarities', verbose_name='商品')
+    neighbor = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='neighbor_of', verbose_name='相似商品')
+    rank = models.PositiveSmallIntegerField(verbose_name='名次')
+    score = models.FloatField(verbose_name='相似度')
+    computed_at = models.DateTimeField(verbose_name='计算时间')
+    
+    class Meta:
+        verbose_name = '相似作品'
+        verbose_name_plural = '相似作品'
+        ordering = ['product', 'rank']
+        unique_together = ['product', 'rank']
+    
+    def __str__(self):
+        return f"{self.product_id} #{self.rank} - {self.neighbor_id}"
+
+
+class ProductAttribute(models.Model):
+    """商品材质、技法的规范化副本（每个取值一行），供带索引的属性筛选使用"""
+    KIND_CHOICES = [
+        ('material', '材质'),
+        ('technique', '技法'),
+    ]
+    
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='attributes', verbose_name='商品')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name='属性类型')
+    value = models.CharField(max_length=100, verbose_name='属性值')
+    
+    class Meta:
+        verbose_name = '商品属性'
+        verbose_name_plural = '商品属性'
+        unique_together = ['product', 'kind', 'value']
+        indexes = [
+            models.Index(fields=['kind', 'value', 'product'], name='product_attribute_lookup_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id} {self.get_kind_display()}: {self.value}"
+
+
+class ProductCard(models.Model):
+    """商品列表卡片（读模型）：列表展示所需的关联数据的扁平副本，由信号增量维护；分类取自分类树快照，不在此复制"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='card', verbose_name='商品')
+    artist_name = models.CharField(max_length=100, blank=True, verbose_name='艺术家名称')
+    # {'id', 'image', 'alt_text', 'sort_order', 'width', 'height', 'derivatives'}，无主图时为空
+    primary_image = models.JSONField(null=True, blank=True, verbose_name='主图')
+    # [{'id', 'name', 'color'}]，按标签名排序
+    tags = models.JSONField(default=list, blank=True, verbose_name='标签')
+    built_at = models.DateTimeField(auto_now=True, verbose_name='生成时间')
+    
+    class Meta:
+        verbose_name = '商品卡片'
+        verbose_name_plural = '商品卡片'
+    
+    def __str__(self):
+        return f"{self.product_id} ({self.built_at})"
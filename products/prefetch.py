@@ -0,0 +1,37 @@
+"""
+Batch loading helpers for product listings.
+
+``primary_image_prefetch`` loads the primary ``ProductImage`` of every
+product on a page with one query and stores it on ``product.primary_images``.
+Serializers read it through ``get_primary_image``, which also accepts the
+primary image stored on a ``select_related('card')`` product card (see
+``products.cards``), and only fall back to a per-row query when neither was
+loaded.
+"""
+from django.db.models import Prefetch
+
+from .cards import card_image, get_card
+from .models import ProductImage
+
+PRIMARY_IMAGES_ATTR = 'primary_images'
+
+
+def primary_image_prefetch(lookup='images'):
+    """主图预取，lookup 为指向 Product.images 的关联路径，如 'product__images'"""
+    return Prefetch(
+        lookup,
+        queryset=ProductImage.objects.filter(is_primary=True),
+        to_attr=PRIMARY_IMAGES_ATTR,
+    )
+
+
+def get_primary_image(product):
+    """获取商品主图，优先使用预取结果，其次使用商品卡片"""
+    prefetched = getattr(product, PRIMARY_IMAGES_ATTR, None)
+    if prefetched is not None:
+        return prefetched[0] if prefetched else None
+    card = get_card(product)
+    if card is not None:
+        return card_image(card)
+    return product.images.filter(is_primary=True).first()
+
@@ -0,0 +1,172 @@
+"""
+Precomputed product rankings.
+
+Published original works are scored from views, likes, sales and age, and
+the top N of every scope (overall, per category including parent categories,
+per artist) is stored in ``ProductRanking``. ``ProductViewSet.featured`` then
+reads an ordered list with one indexed query.
+
+Rankings are recomputed by ``python manage.py compute_rankings`` (run it from
+cron) and, at most once per ``MIN_RECOMPUTE_INTERVAL``, after counter flushes.
+A flush can run inline in a request, so that recompute happens on a
+background thread and the request never waits for it.
+
+Settings (``PRODUCT_RANKING``, all keys optional):
+    TOP_N                   每个榜单保留的商品数（默认 50）
+    WEIGHTS                 views / likes / sales 的权重
+    DECAY                   时间衰减方式：'exponential'（半衰期）或 'gravity'（Hacker News 式）
+    HALF_LIFE_DAYS          指数衰减的半衰期（天）
+    GRAVITY                 gravity 衰减的指数
+    MIN_RECOMPUTE_INTERVAL  计数刷新触发重算的最小间隔（秒）
+"""
+import heapq
+import logging
+import math
+import threading
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .category_tree import get_category_tree
+from .models import Product, ProductRanking
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RANKING_SETTINGS = {
+    'TOP_N': 50,
+    'WEIGHTS': {'views': 1.0, 'likes': 3.0, 'sales': 10.0},
+    'DECAY': 'exponential',
+    'HALF_LIFE_DAYS': 30,
+    'GRAVITY': 1.5,
+    'MIN_RECOMPUTE_INTERVAL': 300,
+}
+# 计入销量的订单状态
+SALES_ORDER_STATUSES = ['paid', 'processing', 'shipped', 'delivered', 'completed']
+RECOMPUTE_LOCK_KEY = 'products:rankings:recompute'
+
+
+def get_ranking_settings():
+    config = dict(DEFAULT_RANKING_SETTINGS)
+    config.update(getattr(settings, 'PRODUCT_RANKING', {}))
+    weights = dict(DEFAULT_RANKING_SETTINGS['WEIGHTS'])
+    weights.update(config['WEIGHTS'])
+    config['WEIGHTS'] = weights
+    return config
+
+
+def time_decay(age_hours, config):
+    """时间衰减系数，取值 (0, 1]"""
+    age_hours = max(age_hours, 0)
+    if config['DECAY'] == 'gravity':
+        return 1 / math.pow(age_hours / 24 + 1, config['GRAVITY'])
+    half_life_hours = config['HALF_LIFE_DAYS'] * 24
+    return math.pow(0.5, age_hours / half_life_hours)
+
+
+def score_product(views, likes, sales, age_hours, config):
+    """综合浏览、点赞、销量和发布时间的得分"""
+    weights = config['WEIGHTS']
+    popularity = (
+        weights['views'] * math.log1p(views)
+        + weights['likes'] * math.log1p(likes)
+        + weights['sales'] * math.log1p(sales)
+    )
+    return popularity * time_decay(age_hours, config)
+
+
+def _sales_by_product():
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    rows = (
+        OrderItem.objects.filter(order__status__in=SALES_ORDER_STATUSES)
+        .values_list('product_id')
+        .annotate(quantity=Sum('quantity'))
+        .order_by()
+    )
+    return dict(rows)
+
+
+def compute_rankings():
+    """重新计算全部榜单，返回写入的排行记录数"""
+    config = get_ranking_settings()
+    top_n = config['TOP_N']
+    now = timezone.now()
+    tree = get_category_tree()
+    sales = _sales_by_product()
+
+    heaps = defaultdict(list)
+
+    def push(scope_key, entry):
+        heap = heaps[scope_key]
+        if len(heap) < top_n:
+            heapq.heappush(heap, entry)
+        elif entry > heap[0]:
+            heapq.heapreplace(heap, entry)
+
+    candidates = Product.objects.filter(status='published', is_original=True).values_list(
+        'id', 'category_id', 'artist_id', 'views_count', 'likes_count', 'created_at'
+    ).order_by()
+    for product_id, category_id, artist_id, views, likes, created_at in candidates.iterator(chunk_size=2000):
+        age_hours = (now - created_at).total_seconds() / 3600
+        score = score_product(views, likes, sales.get(product_id, 0), age_hours, config)
+        # 得分相同时较新的商品（ID 更大）排前
+        entry = (score, product_id)
+        push(('overall', 0), entry)
+        push(('artist', artist_id), entry)
+        push(('category', category_id), entry)
+        for ancestor in tree.ancestors(category_id):
+            push(('category', ancestor.id), entry)
+
+    rankings = []
+    for (scope, scope_id), heap in heaps.items():
+        for rank, (score, product_id) in enumerate(sorted(heap, reverse=True), start=1):
+            rankings.append(ProductRanking(
+                scope=scope, scope_id=scope_id, rank=rank,
+                product_id=product_id, score=score, computed_at=now,
+            ))
+    with transaction.atomic():
+        ProductRanking.objects.all().delete()
+        ProductRanking.objects.bulk_create(rankings, batch_size=1000)
+    return len(rankings)
+
+
+def recompute_if_stale():
+    """距上次由计数触发的重算超过最小间隔时重算一次"""
+    interval = get_ranking_settings()['MIN_RECOMPUTE_INTERVAL']
+    if cache.add(RECOMPUTE_LOCK_KEY, timezone.now().isoformat(), interval):
+        compute_rankings()
+        return True
+    return False
+
+
+def recompute_in_background():
+    """
+    与 recompute_if_stale 相同，但在后台线程中重算，调用方（计数刷新，可能在请求中）不等待。
+
+    返回是否启动了重算。
+    """
+    interval = get_ranking_settings()['MIN_RECOMPUTE_INTERVAL']
+    if not cache.add(RECOMPUTE_LOCK_KEY, timezone.now().isoformat(), interval):
+        return False
+    thread = threading.Thread(target=_compute_in_thread, name='product-rankings', daemon=True)
+    thread.start()
+    return True
+
+
+def _compute_in_thread():
+    try:
+        compute_rankings()
+    except Exception:
+        logger.exception('排行榜重算失败')
+    finally:
+        # 后台线程使用独立的数据库连接，用完即关闭
+        connection.close()
+
+
+def ranked_products(queryset, scope='overall', scope_id=0):
+    """按预计算名次排序的商品查询集"""
+    return queryset.filter(rankings__scope=scope, rankings__scope_id=scope_id).order_by('rankings__rank')
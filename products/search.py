@@ -0,0 +1,151 @@
+"""
+Local full-text search over products.
+
+Titles and descriptions are split into latin words plus CJK unigrams and
+bigrams, stored as an inverted index in ``ProductSearchTerm`` and ranked with
+BM25. The index is kept up to date by Product save signals and can be rebuilt
+with ``python manage.py rebuild_search_index``.
+
+``rank_products(queryset, query)`` scores inside the database: the filtered
+queryset is joined to the matching postings and annotated with the BM25 sum as
+``search_rank``, so filters (status, category, price, ...) apply before any
+page is cut and ordering is a plain ``ORDER BY search_rank``. Only the
+per-term IDF (one grouped query over the postings) and the corpus statistics
+are computed in Python.
+"""
+import math
+import re
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Case, Count, F, FloatField, Sum, Value, When
+from django.db.models.functions import Cast, Coalesce
+
+from .models import Product, ProductSearchDocument, ProductSearchTerm
+
+# 标题中的词元权重更高
+TITLE_WEIGHT = 2
+BM25_K1 = 1.2
+BM25_B = 0.75
+MAX_TERM_LENGTH = 64
+CORPUS_STATS_CACHE_KEY = 'products:search:corpus_stats'
+CORPUS_STATS_TIMEOUT = 60
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+|[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+')
+_CJK_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]')
+
+# 被检索影响的字段，save(update_fields=...) 未涉及时跳过重建索引
+INDEXED_FIELDS = frozenset(['title', 'description'])
+
+
+def tokenize(text):
+    """切分文本：拉丁字符按单词，中文按单字和相邻双字"""
+    tokens = []
+    for run in _TOKEN_RE.findall((text or '').lower()):
+        if not _CJK_RE.match(run):
+            tokens.append(run[:MAX_TERM_LENGTH])
+            continue
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def _document_terms(product):
+    counts = Counter(tokenize(product.description))
+    for token in tokenize(product.title):
+        counts[token] += TITLE_WEIGHT
+    return counts
+
+
+def index_products(products):
+    """为一批商品重建倒排索引"""
+    products = list(products)
+    if not products:
+        return
+    product_ids = [product.id for product in products]
+    documents = []
+    postings = []
+    for product in products:
+        counts = _document_terms(product)
+        documents.append(ProductSearchDocument(product_id=product.id, length=sum(counts.values())))
+        postings.extend(
+            ProductSearchTerm(term=term, product_id=product.id, frequency=frequency)
+            for term, frequency in counts.items()
+        )
+    with transaction.atomic():
+        ProductSearchTerm.objects.filter(product_id__in=product_ids).delete()
+        ProductSearchDocument.objects.filter(product_id__in=product_ids).delete()
+        ProductSearchDocument.objects.bulk_create(documents)
+        ProductSearchTerm.objects.bulk_create(postings, batch_size=1000)
+
+
+def index_product(product):
+    """为单个商品重建倒排索引"""
+    index_products([product])
+
+
+def rebuild_index(batch_size=500):
+    """
+    清空并重建全部索引，返回已索引的商品数。
+
+    整个重建在一个事务中完成，提交前检索仍读取旧索引，不会看到空的或部分的索引。
+    """
+    total = 0
+    batch = []
+    with transaction.atomic():
+        ProductSearchTerm.objects.all().delete()
+        ProductSearchDocument.objects.all().delete()
+        for product in Product.objects.only('id', 'title', 'description').order_by('id').iterator(chunk_size=batch_size):
+            batch.append(product)
+            if len(batch) >= batch_size:
+                index_products(batch)
+                total += len(batch)
+                batch = []
+        index_products(batch)
+        transaction.on_commit(lambda: cache.delete(CORPUS_STATS_CACHE_KEY))
+    return total + len(batch)
+
+
+def _corpus_stats():
+    """文档总数与平均长度，短时间缓存，避免每次检索都扫描文档表"""
+    stats = cache.get(CORPUS_STATS_CACHE_KEY)
+    if stats is None:
+        row = ProductSearchDocument.objects.aggregate(total=Count('product'), avg_length=Avg('length'))
+        stats = (row['total'] or 0, row['avg_length'] or 1)
+        cache.set(CORPUS_STATS_CACHE_KEY, stats, CORPUS_STATS_TIMEOUT)
+    return stats
+
+
+def term_idfs(terms, total):
+    """各词元的 IDF（按全部已索引商品计算，与筛选条件无关）；未出现的词元不返回"""
+    rows = ProductSearchTerm.objects.filter(term__in=terms).values('term').annotate(df=Count('product')).order_by()
+    return {row['term']: math.log(1 + (total - row['df'] + 0.5) / (row['df'] + 0.5)) for row in rows}
+
+
+def rank_products(queryset, query):
+    """
+    只保留匹配 query 的商品，并注解 BM25 得分 search_rank（越大越相关）。
+
+    得分在数据库中按筛选后的商品计算，不会先截断再筛选；没有可匹配的词元时返回空查询集。
+    """
+    terms = set(tokenize(query))
+    total, avg_length = _corpus_stats() if terms else (0, 1)
+    idfs = term_idfs(terms, total) if total else {}
+    if not idfs:
+        # 保留 search_rank 注解，调用方可照常按得分排序
+        return queryset.none().annotate(search_rank=Value(0.0, output_field=FloatField()))
+
+    frequency = Cast('search_terms__frequency', FloatField())
+    length = Cast(Coalesce(F('search_document__length'), 0), FloatField())
+    idf = Case(
+        *[When(search_terms__term=term, then=Value(value)) for term, value in idfs.items()],
+        default=Value(0.0),
+        output_field=FloatField(),
+    )
+    norm = Value(BM25_K1 * (1 - BM25_B)) + Value(BM25_K1 * BM25_B / avg_length) * length
+    score = idf * frequency * Value(BM25_K1 + 1) / (frequency + norm)
+    # 过滤与注解使用同一个倒排项连接，按商品分组求和
+    return queryset.filter(search_terms__term__in=list(idfs)).annotate(
+        search_rank=Sum(score, output_field=FloatField())
+    )
@@ -1,5 +1,10 @@
 from rest_framework import serializers
+from blendlumina.counters import LiveCounterField
 from .models import Category, PriceRange, SizeRange, Usage, Product, ProductImage, ProductTag
+from .cards import get_card
+from .category_tree import get_category_tree
+from .images import srcset
+from .prefetch import get_primary_image
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -7,11 +12,31 @@ class CategorySerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Category
-        fields = '__all__'
+        # 物化路径是内部索引结构，不对外暴露
+        exclude = ['path', 'depth']
     
     def get_children(self, obj):
-        children = Category.objects.filter(parent=obj, is_active=True)
-        return CategorySerializer(children, many=True).data
+        # 子分类从分类树快照读取，序列化结果随快照缓存
+        return get_category_tree().children_data(
+            obj.id, lambda children: CategorySerializer(children, many=True).data
+        )
+
+
+class TreeCategoryField(serializers.Field):
+    """从分类树快照读取商品所属分类，避免逐行查询分类表"""
+    
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        kwargs['source'] = 'category_id'
+        super().__init__(**kwargs)
+    
+    def to_representation(self, value):
+        category = get_category_tree().get(value)
+        if category is None:
+            category = Category.objects.filter(pk=value).first()
+            if category is None:
+                return None
+        return CategorySerializer(category, context=self.context).data
 
 
 class PriceRangeSerializer(serializers.ModelSerializer):
@@ -39,14 +64,23 @@ class ProductTagSerializer(serializers.ModelSerializer):
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
+    srcset = serializers.SerializerMethodField()
+    
     class Meta:
         model = ProductImage
-        fields = '__all__'
+        exclude = ['derivatives']
+    
+    def get_srcset(self, obj):
+        """原图及已生成的衍生图 URL，如 {'original': ..., 'thumb': ..., 'medium': ...}"""
+        request = self.context.get('request')
+        return srcset(obj, request.build_absolute_uri if request else None)
 
 
 class ProductSerializer(serializers.ModelSerializer):
-    category = CategorySerializer(read_only=True)
+    category = TreeCategoryField()
     images = ProductImageSerializer(many=True, read_only=True)
+    views_count = LiveCounterField()
+    likes_count = LiveCounterField()
     tags = ProductTagSerializer(many=True, read_only=True)
     
     class Meta:
@@ -55,19 +89,38 @@ class ProductSerializer(serializers.ModelSerializer):
 
 
 class ProductListSerializer(serializers.ModelSerializer):
-    category = CategorySerializer(read_only=True)
+    """列表卡片；查询集 select_related('card') 时主图、艺术家名和标签均来自商品卡片"""
+    category = TreeCategoryField()
     primary_image = serializers.SerializerMethodField()
+    artist_name = serializers.SerializerMethodField()
+    tags = serializers.SerializerMethodField()
+    views_count = LiveCounterField()
+    likes_count = LiveCounterField()
     
     class Meta:
         model = Product
         fields = ['id', 'title', 'price', 'original_price', 'category', 'primary_image', 
-                 'views_count', 'likes_count', 'created_at']
+                 'artist_name', 'tags', 'is_limited', 'available_quantity', 'views_count', 'likes_count',
+                 'created_at']
     
     def get_primary_image(self, obj):
-        primary_image = obj.images.filter(is_primary=True).first()
+        primary_image = get_primary_image(obj)
         if primary_image:
-            return ProductImageSerializer(primary_image).data
+            return ProductImageSerializer(primary_image, context=self.context).data
         return None
+    
+    def get_artist_name(self, obj):
+        card = get_card(obj)
+        if card is not None:
+            return card.artist_name
+        return obj.artist.artist_name
+    
+    def get_tags(self, obj):
+        """[{'id', 'name', 'color'}]，按标签名排序"""
+        card = get_card(obj)
+        if card is not None:
+            return card.tags
+        return list(ProductTag.objects.filter(producttagrelation__product=obj).order_by('name').values('id', 'name', 'color'))
 
 
 class ProductCreateSerializer(serializers.ModelSerializer):
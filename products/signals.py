@@ -0,0 +1,118 @@
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from blendlumina.counters import counters_flushed
+from blendlumina.generations import track_model
+from users.models import ArtistProfile
+from .attributes import SYNCED_FIELDS, sync_product_attributes
+from .cards import CARD_FIELDS, rebuild_cards, rebuild_tag_cards, rename_artist, schedule_card_rebuild
+from .category_tree import invalidate_category_tree
+from .images import needs_derivatives, schedule_derivatives
+from .models import Category, PriceRange, Product, ProductImage, ProductTag, ProductTagRelation, SizeRange, Usage, touch_products
+from .rankings import recompute_in_background
+from .search import INDEXED_FIELDS, index_product
+
+logger = logging.getLogger(__name__)
+
+
+track_model(Category)
+track_model(Product)
+track_model(ProductTag)
+track_model(PriceRange)
+track_model(SizeRange)
+track_model(Usage)
+
+
+@receiver(post_save, sender=Category, dispatch_uid='products.category_tree.save')
+@receiver(post_delete, sender=Category, dispatch_uid='products.category_tree.delete')
+def category_changed(sender, instance, **kwargs):
+    """分类变更提交后丢弃本进程的分类树快照；事务回滚时快照保持不变"""
+    transaction.on_commit(invalidate_category_tree)
+
+
+@receiver(post_save, sender=Product, dispatch_uid='products.search.index')
+def index_product_on_save(sender, instance, update_fields=None, raw=False, **kwargs):
+    """商品标题或描述变化时更新全文索引（删除由外键级联完成）"""
+    if raw:
+        return
+    if update_fields is not None and not INDEXED_FIELDS.intersection(update_fields):
+        return
+    index_product(instance)
+
+
+@receiver(post_save, sender=Product, dispatch_uid='products.attributes.sync')
+def sync_attributes_on_save(sender, instance, update_fields=None, raw=False, **kwargs):
+    """材质或技法变化时重写商品的属性行"""
+    if raw:
+        return
+    if update_fields is not None and not SYNCED_FIELDS.intersection(update_fields):
+        return
+    sync_product_attributes([instance])
+
+
+@receiver(post_save, sender=ProductImage, dispatch_uid='products.images.touch_save')
+@receiver(post_delete, sender=ProductImage, dispatch_uid='products.images.touch_delete')
+@receiver(post_save, sender=ProductTagRelation, dispatch_uid='products.tags.touch_save')
+@receiver(post_delete, sender=ProductTagRelation, dispatch_uid='products.tags.touch_delete')
+def touch_product(sender, instance, raw=False, **kwargs):
+    """商品图片或标签关联变化时刷新商品的 updated_at"""
+    if not raw:
+        touch_products([instance.product_id])
+
+
+@receiver(post_save, sender=ProductImage, dispatch_uid='products.images.derivatives')
+def generate_image_derivatives(sender, instance, raw=False, **kwargs):
+    """新图片或更换原图后，在事务提交后于后台生成衍生图"""
+    if raw or not needs_derivatives(instance):
+        return
+    schedule_derivatives([instance.pk])
+
+
+@receiver(post_save, sender=Product, dispatch_uid='products.cards.product')
+def rebuild_card_on_save(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    """新商品或艺术家变化时重建商品卡片"""
+    if raw:
+        return
+    if not created and update_fields is not None and not CARD_FIELDS.intersection(update_fields):
+        return
+    rebuild_cards([instance.pk])
+
+
+@receiver(post_save, sender=ProductImage, dispatch_uid='products.cards.image_save')
+@receiver(post_delete, sender=ProductImage, dispatch_uid='products.cards.image_delete')
+@receiver(post_save, sender=ProductTagRelation, dispatch_uid='products.cards.tag_save')
+@receiver(post_delete, sender=ProductTagRelation, dispatch_uid='products.cards.tag_delete')
+def rebuild_card_on_relation_change(sender, instance, raw=False, **kwargs):
+    """主图或标签关联变化时重建商品卡片"""
+    if not raw:
+        schedule_card_rebuild([instance.product_id])
+
+
+@receiver(post_save, sender=ProductTag, dispatch_uid='products.cards.tag')
+def update_cards_on_tag_change(sender, instance, created=False, raw=False, **kwargs):
+    if not raw and not created:
+        rebuild_tag_cards(instance)
+
+
+@receiver(post_save, sender=ArtistProfile, dispatch_uid='products.cards.artist')
+def update_cards_on_artist_change(sender, instance, created=False, update_fields=None, raw=False, **kwargs):
+    """艺术家名称可能变化时更新其作品卡片"""
+    if raw or created:
+        return
+    if update_fields is not None and 'artist_name' not in update_fields:
+        return
+    rename_artist(instance)
+
+
+@receiver(counters_flushed, dispatch_uid='products.rankings.counters')
+def refresh_rankings(sender, changed, **kwargs):
+    """商品计数写入后按最小间隔在后台重算排行榜，不阻塞触发刷新的请求"""
+    if Product._meta.label not in changed:
+        return
+    try:
+        recompute_in_background()
+    except Exception:
+        logger.exception('排行榜重算失败')
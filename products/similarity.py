@@ -0,0 +1,289 @@
+"""
+Item-to-item "similar works".
+
+Every published product is encoded as a sparse, L2-normalised feature vector
+over its category (and, at a lower weight, the category's ancestors),
+materials, techniques and tags. Cosine similarity is computed with NumPy one
+tile at a time, ``BLOCK_SIZE`` query rows against ``COLUMN_BLOCK_SIZE``
+products, using an inverted index of the features; the running top-k of each
+row is merged across tiles, so memory stays at one tile of floats no matter
+how large the catalogue grows. The top-k neighbours of each product are stored in
+``ProductSimilarity``; ``ProductViewSet.similar`` reads them with one indexed
+query.
+
+``compute_similarities()`` refreshes incrementally: only products changed since
+the previous run are re-scored, together with every product whose stored
+top-k list could be affected by them. Since cosine similarity is symmetric,
+those are the products that currently list a changed product, or that would
+now rank one above their k-th neighbour. The previous run is the newest
+``ProductSimilarity.computed_at`` in the database, so every process and host
+sees the same watermark; an empty table means a full run. Run ``python
+manage.py compute_similarities`` from cron; ``--full`` recomputes everything.
+
+Settings (``PRODUCT_SIMILARITY``, all keys optional):
+    TOP_K              每个商品保留的相似商品数（默认 12）
+    BLOCK_SIZE         每次计算的查询行数（默认 256）
+    COLUMN_BLOCK_SIZE  每次计算的候选商品数（默认 8192）
+    WEIGHTS            各类特征的权重：category / parent_category / material / technique / tag
+"""
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from .category_tree import get_category_tree
+from .models import Product, ProductSimilarity, ProductTagRelation
+
+DEFAULT_SIMILARITY_SETTINGS = {
+    'TOP_K': 12,
+    'BLOCK_SIZE': 256,
+    'COLUMN_BLOCK_SIZE': 8192,
+    'WEIGHTS': {
+        'category': 1.0,
+        'parent_category': 0.5,
+        'material': 1.0,
+        'technique': 1.0,
+        'tag': 1.0,
+    },
+}
+
+
+def get_similarity_settings():
+    config = dict(DEFAULT_SIMILARITY_SETTINGS)
+    config.update(getattr(settings, 'PRODUCT_SIMILARITY', {}))
+    weights = dict(DEFAULT_SIMILARITY_SETTINGS['WEIGHTS'])
+    weights.update(config['WEIGHTS'])
+    config['WEIGHTS'] = weights
+    return config
+
+
+def _normalize_term(value):
+    return str(value).strip().lower()
+
+
+def product_features(category_id, materials, techniques, tag_ids, tree, weights):
+    """商品的特征 {特征: 权重}"""
+    features = {('category', category_id): weights['category']}
+    for ancestor in tree.ancestors(category_id):
+        features[('category', ancestor.id)] = weights['parent_category']
+    for material in materials or ():
+        if _normalize_term(material):
+            features[('material', _normalize_term(material))] = weights['material']
+    for technique in techniques or ():
+        if _normalize_term(technique):
+            features[('technique', _normalize_term(technique))] = weights['technique']
+    for tag_id in tag_ids:
+        features[('tag', tag_id)] = weights['tag']
+    return {feature: weight for feature, weight in features.items() if weight > 0}
+
+
+class FeatureMatrix:
+    """稀疏特征矩阵：按行存储，同时建立按特征的倒排表"""
+
+    def __init__(self, product_ids, rows):
+        self.product_ids = np.asarray(product_ids, dtype=np.int64)
+        self.position = {product_id: i for i, product_id in enumerate(product_ids)}
+        # 特征按键排序编号，每个单元格按固定顺序累加，得分与分块方式和其他商品无关，
+        # 增量与全量计算的结果（含同分时的先后）逐位一致
+        vocabulary = {
+            feature: column for column, feature in enumerate(sorted({feature for features in rows for feature in features}))
+        }
+        self.rows = []
+        postings = defaultdict(lambda: ([], []))
+        for i, features in enumerate(rows):
+            norm = np.sqrt(sum(weight * weight for weight in features.values())) or 1.0
+            row = []
+            for feature, weight in features.items():
+                column = vocabulary[feature]
+                value = weight / norm
+                row.append((column, value))
+                items, values = postings[column]
+                items.append(i)
+                values.append(value)
+            self.rows.append(row)
+        self.postings = {
+            column: (np.asarray(items, dtype=np.int64), np.asarray(values, dtype=np.float32))
+            for column, (items, values) in postings.items()
+        }
+
+    def __len__(self):
+        return len(self.rows)
+
+    def score_block(self, block, start=0, stop=None):
+        """
+        block 中每个商品与位置在 [start, stop) 的商品的余弦相似度，
+        返回 len(block) x (stop - start) 的矩阵；stop 为空时到最后一个商品。
+        """
+        stop = len(self.rows) if stop is None else min(stop, len(self.rows))
+        scores = np.zeros((len(block), stop - start), dtype=np.float32)
+        by_column = defaultdict(lambda: ([], []))
+        for row_index, i in enumerate(block):
+            for column, value in self.rows[i]:
+                rows, values = by_column[column]
+                rows.append(row_index)
+                values.append(value)
+        # 每个特征一次外积累加：同一特征的查询行 x 列块内含该特征的商品（倒排表按位置有序）
+        for column in sorted(by_column):
+            rows, values = by_column[column]
+            items, item_values = self.postings[column]
+            low, high = np.searchsorted(items, (start, stop))
+            if low == high:
+                continue
+            scores[np.ix_(rows, items[low:high] - start)] += np.outer(
+                np.asarray(values, dtype=np.float32), item_values[low:high]
+            )
+        # 排除自身
+        block = np.asarray(block, dtype=np.int64)
+        inside = np.nonzero((block >= start) & (block < stop))[0]
+        scores[inside, block[inside] - start] = 0
+        return scores
+
+    def column_blocks(self, size):
+        """按列块切分全部商品，依次返回 (start, stop)"""
+        for start in range(0, len(self.rows), size):
+            yield start, min(start + size, len(self.rows))
+
+
+def top_k(scores, k):
+    """每行得分最高的 k 个 (位置, 得分)，只保留正分；同分时位置靠前的优先"""
+    width = scores.shape[1]
+    k = min(k, width)
+    if k <= 0:
+        return [[] for _ in range(scores.shape[0])]
+    # 第 k 大的得分；与之同分的候选全部保留后再按位置取舍，argpartition 在同分时的选择不确定
+    kth = np.partition(scores, width - k, axis=1)[:, width - k]
+    results = []
+    for row, value in enumerate(kth):
+        columns = np.flatnonzero((scores[row] >= value) & (scores[row] > 0))
+        values = scores[row, columns]
+        order = np.lexsort((columns, -values))[:k]
+        results.append([(int(columns[j]), float(values[j])) for j in order])
+    return results
+
+
+def block_top_k(matrix, block, config):
+    """block 中每个商品的前 k 个 (位置, 得分)，逐列块计算并合并"""
+    k = config['TOP_K']
+    best = [[] for _ in block]
+    for start, stop in matrix.column_blocks(config['COLUMN_BLOCK_SIZE']):
+        scores = matrix.score_block(block, start, stop)
+        for candidates, neighbors in zip(best, top_k(scores, k)):
+            candidates.extend((start + position, score) for position, score in neighbors)
+    return [sorted(candidates, key=lambda item: (-item[1], item[0]))[:k] for candidates in best]
+
+
+def load_feature_matrix(config):
+    tree = get_category_tree()
+    tags = defaultdict(list)
+    relations = ProductTagRelation.objects.filter(product__status='published').values_list('product_id', 'tag_id')
+    for product_id, tag_id in relations.iterator(chunk_size=5000):
+        tags[product_id].append(tag_id)
+
+    product_ids = []
+    rows = []
+    products = Product.objects.filter(status='published').order_by('id').values_list(
+        'id', 'category_id', 'materials', 'techniques'
+    )
+    for product_id, category_id, materials, techniques in products.iterator(chunk_size=2000):
+        product_ids.append(product_id)
+        rows.append(product_features(category_id, materials, techniques, tags.get(product_id, ()), tree, config['WEIGHTS']))
+    return FeatureMatrix(product_ids, rows)
+
+
+def _affected_products(matrix, changed, config):
+    """增量模式下需要重算的商品位置"""
+    k = config['TOP_K']
+    changed_positions = [matrix.position[product_id] for product_id in changed if product_id in matrix.position]
+    affected = set(changed_positions)
+    # 当前列表中含有变更商品的商品
+    listing = ProductSimilarity.objects.filter(neighbor_id__in=changed).values_list('product_id', flat=True)
+    affected.update(matrix.position[product_id] for product_id in listing if product_id in matrix.position)
+
+    # 各商品第 k 名的得分；列表不满 k 个时任何正分都能进入
+    threshold = np.zeros(len(matrix), dtype=np.float32)
+    full_lists = (
+        ProductSimilarity.objects.values('product_id')
+        .annotate(count=Count('id'), lowest=Min('score'))
+        .filter(count__gte=k)
+        .values_list('product_id', 'lowest')
+        .order_by()
+    )
+    for product_id, lowest in full_lists.iterator(chunk_size=5000):
+        position = matrix.position.get(product_id)
+        if position is not None:
+            threshold[position] = lowest
+
+    block_size = config['BLOCK_SIZE']
+    for block_start in range(0, len(changed_positions), block_size):
+        block = changed_positions[block_start:block_start + block_size]
+        for start, stop in matrix.column_blocks(config['COLUMN_BLOCK_SIZE']):
+            scores = matrix.score_block(block, start, stop)
+            # 相似度对称：变更商品对 j 的得分达到 j 的第 k 名时，j 的列表需要更新
+            # （同分时按位置先后取舍，变更商品可能挤掉原第 k 名）
+            _, columns = np.nonzero((scores >= threshold[np.newaxis, start:stop]) & (scores > 0))
+            affected.update(start + int(column) for column in columns)
+    return sorted(affected)
+
+
+def _similarity_rows(matrix, block, config, computed_at):
+    for i, neighbors in zip(block, block_top_k(matrix, block, config)):
+        product_id = int(matrix.product_ids[i])
+        for rank, (neighbor, score) in enumerate(neighbors, start=1):
+            yield ProductSimilarity(
+                product_id=product_id,
+                neighbor_id=int(matrix.product_ids[neighbor]),
+                rank=rank,
+                score=score,
+                computed_at=computed_at,
+            )
+
+
+def last_computed_at():
+    """
+    上次计算的开始时间，即库中最新的 computed_at；表为空时返回 None（全量计算）。
+
+    没有变更的运行不写入新行，水位停在更早的一次，下次只会多检查一些商品，不会漏掉变更。
+    """
+    return ProductSimilarity.objects.aggregate(last=Max('computed_at'))['last']
+
+
+def compute_similarities(full=False):
+    """
+    重新计算相似作品，返回重算的商品数。
+
+    默认只处理上次运行后变更的商品及受其影响的商品；full=True 时全部重算。
+    """
+    config = get_similarity_settings()
+    started = timezone.now()
+    last_run = None if full else last_computed_at()
+
+    matrix = load_feature_matrix(config)
+    if last_run is None:
+        targets = list(range(len(matrix)))
+        stale = ProductSimilarity.objects.all()
+    else:
+        changed = set(Product.objects.filter(updated_at__gte=last_run).values_list('id', flat=True))
+        if not changed:
+            return 0
+        targets = _affected_products(matrix, changed, config)
+        # 变更后不再发布的商品不保留相似列表
+        stale = ProductSimilarity.objects.filter(
+            product_id__in={int(matrix.product_ids[i]) for i in targets} | changed
+        )
+
+    block_size = config['BLOCK_SIZE']
+    with transaction.atomic():
+        stale.delete()
+        # 逐块计算并写入，内存中只保留一个块的结果
+        for start in range(0, len(targets), block_size):
+            block = targets[start:start + block_size]
+            ProductSimilarity.objects.bulk_create(_similarity_rows(matrix, block, config, started), batch_size=1000)
+    return len(targets)
+
+
+def similar_products(queryset, product_id):
+    """按相似度排序的相似商品查询集"""
+    return queryset.filter(neighbor_of__product_id=product_id).order_by('neighbor_of__rank')
@@ -0,0 +1,49 @@
+"""
+Parsing of the free-text ``Product.size`` field.
+
+``SizeRange`` buckets are expressed in cm³, while ``Product.size`` holds
+strings such as ``"60x80x3cm"`` or ``"120 × 45 × 30 mm"``. The parsed volume is
+stored on ``Product.size_volume`` so size facets and filters run in SQL.
+"""
+import re
+from decimal import Decimal, InvalidOperation
+
+_NUMBER_RE = re.compile(r'\d+(?:\.\d+)?')
+# 单位换算为厘米
+_UNIT_FACTORS = (
+    ('mm', Decimal('0.1')),
+    ('毫米', Decimal('0.1')),
+    ('cm', Decimal('1')),
+    ('厘米', Decimal('1')),
+    ('m', Decimal('100')),
+    ('米', Decimal('100')),
+)
+_MAX_VOLUME = Decimal('9999999999.99')
+
+
+def _unit_factor(text):
+    for unit, factor in _UNIT_FACTORS:
+        if unit in text:
+            return factor
+    return Decimal('1')
+
+
+def parse_size_volume(size):
+    """从尺寸文本解析体积（cm³）；不足三个维度时返回 None"""
+    if not size:
+        return None
+    text = size.lower()
+    try:
+        dimensions = [Decimal(number) for number in _NUMBER_RE.findall(text)]
+    except InvalidOperation:
+        return None
+    if len(dimensions) < 3:
+        return None
+    factor = _unit_factor(text)
+    volume = Decimal('1')
+    for dimension in dimensions[:3]:
+        volume *= dimension * factor
+    volume = volume.quantize(Decimal('0.01'))
+    if volume > _MAX_VOLUME:
+        return None
+    return volume
@@ -1,3 +1,1044 @@
-from django.test import TestCase
+import base64
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from blendlumina.counters import CounterBuffer
+from blendlumina.query_budget import QueryBudgetTestMixin
+from users.models import ArtistProfile, User
+from .attributes import products_with_all, products_with_any
+from .cards import rebuild_all_cards
+from .category_tree import get_category_tree, invalidate_category_tree
+from .images import srcset
+from .importer import ProductImporter
+from .ingest import attach_images, attach_tags
+from .models import (
+    Category, PriceRange, Product, ProductImage, ProductRanking, ProductSearchTerm, ProductSimilarity, ProductTag,
+    ProductTagRelation,
+)
+from .rankings import compute_rankings, get_ranking_settings, ranked_products, score_product, time_decay
+from .search import rank_products, rebuild_index, tokenize
+from .similarity import compute_similarities, similar_products
+
+# 测试在单进程中运行，使用进程内缓存即可
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    """商品与分类接口的查询数不随商品数增长，且不超过视图集声明的预算"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.root = Category.objects.create(name='绘画')
+        cls.children = [Category.objects.create(name=f'油画{i}', parent=cls.root) for i in range(3)]
+        user = User.objects.create_user('artist', password='pw', user_type='artist')
+        artist = ArtistProfile.objects.create(user=user, artist_name='画家甲')
+        tags = [ProductTag.objects.create(name=f'标签{i}') for i in range(3)]
+        cls.buyer = User.objects.create_user('buyer', password='pw')
+        cls.products = []
+        for i in range(12):
+            product = Product.objects.create(
+                title=f'作品{i}', description=f'山水风景 {i}', artist=artist,
+                category=cls.children[i % 3], price=Decimal(100 + i), status='published',
+                materials=['油画布'] if i % 2 else ['宣纸'], techniques=['写实'],
+                views_count=i, likes_count=i,
+            )
+            ProductImage.objects.create(product=product, image=f'products/p{i}.jpg', is_primary=True)
+            ProductTagRelation.objects.create(product=product, tag=tags[i % 3])
+            cls.products.append(product)
+        rebuild_all_cards()
+        compute_rankings()
+        compute_similarities(full=True)
+
+    def setUp(self):
+        cache.clear()
+        # 测试事务不会提交，清空版本号后需同时丢弃其他测试留下的分类树快照；
+        # 预算按稳定状态计算，先加载本测试数据的分类树
+        invalidate_category_tree()
+        get_category_tree()
+        # 预算含会话认证的查询，以登录用户请求
+        self.client.force_login(self.buyer)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertWithinQueryBudget(response)
+        return response
+
+    def test_category_list(self):
+        self.assertEqual(len(self.get('/api/categories/').json()), 4)
+
+    def test_category_retrieve(self):
+        data = self.get(f'/api/categories/{self.root.pk}/').json()
+        self.assertNotIn('path', data)
+        self.assertNotIn('depth', data)
+        self.assertEqual(len(data['children']), 3)
+
+    def test_root_categories(self):
+        self.assertEqual([row['id'] for row in self.get('/api/categories/root_categories/').json()], [self.root.pk])
+
+    def test_product_list(self):
+        self.assertEqual(len(self.get('/api/products/').json()['results']), 12)
+
+    def test_product_list_cursor(self):
+        self.assertEqual(len(self.get('/api/products/?pagination=cursor&page_size=5').json()['results']), 5)
+
+    def test_product_retrieve(self):
+        self.get(f'/api/products/{self.products[0].pk}/')
+
+    def test_featured(self):
+        self.assertEqual(len(self.get('/api/products/featured/?limit=10').json()), 10)
+
+    def test_featured_by_category(self):
+        self.get(f'/api/products/featured/?category={self.root.pk}')
+
+    def test_similar(self):
+        self.assertTrue(self.get(f'/api/products/{self.products[0].pk}/similar/').json())
+
+    def test_facets(self):
+        self.get('/api/products/facets/')
+
+    def test_by_category(self):
+        data = self.get(f'/api/products/by_category/?category_id={self.root.pk}').json()
+        self.assertEqual(len(data['results']), 12)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductSearchTests(TestCase):
+    """全文检索：分词、BM25 排序、保存时增量索引与全量重建"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('artist', password='pw', user_type='artist')
+        cls.artist = ArtistProfile.objects.create(user=user, artist_name='画家甲')
+        cls.painting = Category.objects.create(name='绘画')
+        cls.print = Category.objects.create(name='版画')
+        # 标题命中权重高于仅描述命中；描述越短得分越高
+        cls.title_hit = cls.create('山水', '一幅作品', cls.painting)
+        cls.short_hit = cls.create('秋日', '山水', cls.painting)
+        cls.long_hit = cls.create('冬日', '山水 以及很长很长很长很长的一段描述文字', cls.print)
+        cls.miss = cls.create('花鸟', '工笔花鸟', cls.painting)
+
+    @classmethod
+    def create(cls, title, description, category):
+        return Product.objects.create(
+            title=title, description=description, artist=cls.artist, category=category,
+            price=Decimal('100'), status='published',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query, queryset=None):
+        queryset = Product.objects.all() if queryset is None else queryset
+        return list(rank_products(queryset, query).order_by('-search_rank', '-id'))
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('Oil on 山水画'), ['oil', 'on', '山', '水', '画', '山水', '水画'])
+        self.assertEqual(tokenize(''), [])
+
+    def test_bm25_ordering(self):
+        self.assertEqual(self.search('山水'), [self.title_hit, self.short_hit, self.long_hit])
+        self.assertEqual(self.search('？！'), [])
+        self.assertEqual(self.search('不存在'), [])
+
+    def test_filters_apply_before_ranking(self):
+        self.assertEqual(
+            self.search('山水', Product.objects.filter(category=self.print)), [self.long_hit]
+        )
+        response = self.client.get(
+            f'/api/products/?search=山水&search_mode=fulltext&category={self.painting.pk}'
+        )
+        self.assertEqual(
+            [row['id'] for row in response.json()['results']], [self.title_hit.pk, self.short_hit.pk]
+        )
+
+    def test_index_follows_product_save(self):
+        self.miss.title = '山水花鸟'
+        self.miss.save()
+        self.assertIn(self.miss, self.search('山水'))
+
+        self.title_hit.title = '人物'
+        self.title_hit.save(update_fields=['title'])
+        self.assertNotIn(self.title_hit, self.search('山水'))
+        self.assertEqual(self.search('人物'), [self.title_hit])
+
+    def test_rebuild_index(self):
+        ProductSearchTerm.objects.all().delete()
+        self.assertEqual(self.search('山水'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(rebuild_index(batch_size=2), 4)
+        self.assertEqual(self.search('山水'), [self.title_hit, self.short_hit, self.long_hit])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class CategoryTreeTests(TestCase):
+    """分类树快照只在事务提交后失效"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.root = Category.objects.create(name='绘画')
+
+    def setUp(self):
+        cache.clear()
+        invalidate_category_tree()
+
+    def test_rolled_back_change_keeps_snapshot(self):
+        tree = get_category_tree()
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                Category.objects.create(name='油画', parent=self.root)
+                self.assertIs(get_category_tree(), tree)
+                raise RuntimeError
+        self.assertIs(get_category_tree(), tree)
+        self.assertEqual([node.pk for node in get_category_tree().children(self.root.pk)], [])
+
+    def test_committed_change_rebuilds_snapshot(self):
+        tree = get_category_tree()
+        with self.captureOnCommitCallbacks(execute=True):
+            child = Category.objects.create(name='油画', parent=self.root)
+        self.assertIsNot(get_category_tree(), tree)
+        self.assertEqual([node.pk for node in get_category_tree().children(self.root.pk)], [child.pk])
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class KeysetPaginationTests(TestCase):
+    """游标分页逐页读取的结果与页码分页一致，无效游标返回 404"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('artist', password='pw', user_type='artist')
+        artist = ArtistProfile.objects.create(user=user, artist_name='画家甲')
+        category = Category.objects.create(name='绘画')
+        # 价格有重复值，检验 (排序字段, id) 定位
+        for i in range(45):
+            Product.objects.create(
+                title=f'作品{i}', description='描述', artist=artist, category=category,
+                price=Decimal(100 + i % 4), status='published', views_count=(i * 7) % 45,
+            )
+        rebuild_all_cards()
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            data = response.json()
+            ids.extend(row['id'] for row in data['results'])
+            url = data['next']
+        return ids
+
+    def test_cursor_walk_matches_offset_pages(self):
+        for ordering in ['-views_count', 'views_count', '-created_at']:
+            with self.subTest(ordering=ordering):
+                offset = self.walk(f'/api/products/?ordering={ordering}')
+                cursor = self.walk(f'/api/products/?ordering={ordering}&pagination=cursor&page_size=7')
+                self.assertEqual(len(offset), 45)
+                self.assertEqual(cursor, offset)
+
+    def test_cursor_walk_breaks_ties_by_id(self):
+        expected = list(Product.objects.order_by('-price', '-id').values_list('id', flat=True))
+        self.assertEqual(self.walk('/api/products/?ordering=-price&pagination=cursor&page_size=4'), expected)
+        expected = list(Product.objects.order_by('price', 'id').values_list('id', flat=True))
+        self.assertEqual(self.walk('/api/products/?ordering=price&pagination=cursor&page_size=4'), expected)
+
+    def test_invalid_cursor(self):
+        next_url = self.client.get('/api/products/?ordering=price&pagination=cursor&page_size=4').json()['next']
+        cursor = next_url.split('cursor=')[1].split('&')[0]
+        bad_value = base64.urlsafe_b64encode(b'{"o":"price","v":"abc","pk":1}').decode('ascii')
+        for url in [
+            '/api/products/?cursor=not-a-cursor',
+            f'/api/products/?cursor={bad_value}&ordering=price',
+            # 游标与当前排序不符
+            f'/api/products/?cursor={cursor}&ordering=-views_count',
+        ]:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class FacetTests(TestCase):
+    """分面统计：子分类数量汇总到父分类，商品变更后缓存失效"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('artist', password='pw', user_type='artist')
+        cls.artist = ArtistProfile.objects.create(user=user, artist_name='画家甲')
+        cls.painting = Category.objects.create(name='绘画')
+        cls.oil = Category.objects.create(name='油画', parent=cls.painting)
+        cls.watercolor = Category.objects.create(name='水彩', parent=cls.painting)
+        cls.sculpture = Category.objects.create(name='雕塑')
+        cls.cheap = PriceRange.objects.create(name='低价', min_price=Decimal('0'), max_price=Decimal('150'))
+        cls.expensive = PriceRange.objects.create(name='高价', min_price=Decimal('150'))
+        cls.oil_works = [cls.create(cls.oil, '100'), cls.create(cls.oil, '200')]
+        cls.create(cls.watercolor, '120', is_limited=True, limited_quantity=5)
+        cls.create(cls.sculpture, '500')
+        # 未发布的商品不计入
+        cls.create(cls.oil, '100', status='draft')
+
+    @classmethod
+    def create(cls, category, price, status='published', **fields):
+        return Product.objects.create(
+            title='作品', description='描述', artist=cls.artist, category=category,
+            price=Decimal(price), status=status, **fields
+        )
+
+    def setUp(self):
+        cache.clear()
+        invalidate_category_tree()
+
+    def facets(self, query=''):
+        response = self.client.get(f'/api/products/facets/{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        data = response.json()
+        data['categories'] = {row['id']: row['count'] for row in data['categories']}
+        data['price_ranges'] = {row['id']: row['count'] for row in data['price_ranges']}
+        return data
+
+    def test_counts_roll_up_to_parent_categories(self):
+        data = self.facets()
+        self.assertEqual(data['total'], 4)
+        self.assertEqual(data['categories'], {
+            self.painting.pk: 3, self.oil.pk: 2, self.watercolor.pk: 1, self.sculpture.pk: 1,
+        })
+        self.assertEqual(data['price_ranges'], {self.cheap.pk: 2, self.expensive.pk: 2})
+        self.assertEqual(data['is_limited'], {'true': 1, 'false': 3})
+
+        data = self.facets(f'?price_range={self.cheap.pk}')
+        self.assertEqual(data['categories'], {self.painting.pk: 2, self.oil.pk: 1, self.watercolor.pk: 1})
+
+    def test_product_save_invalidates_cached_counts(self):
+        self.assertEqual(self.facets()['categories'][self.oil.pk], 2)
+
+        # 不经过模型保存的写入不会递增版本号，仍读取缓存
+        Product.objects.filter(pk=self.oil_works[0].pk).update(category=self.sculpture)
+        self.assertEqual(self.facets()['categories'][self.oil.pk], 2)
+
+        product = self.oil_works[1]
+        product.category = self.sculpture
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        data = self.facets()
+        self.assertNotIn(self.oil.pk, data['categories'])
+        self.assertEqual(data['categories'][self.painting.pk], 1)
+        self.assertEqual(data['categories'][self.sculpture.pk], 3)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class RankingTests(TestCase):
+    """预计算排行榜：时间衰减、各榜单的排序，以及排行榜为空时 featured 的回退"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('artist', password='pw', user_type='artist')
+        cls.artist = ArtistProfile.objects.create(user=user, artist_name='画家甲')
+        other = User.objects.create_user('other', password='pw', user_type='artist')
+        cls.other_artist = ArtistProfile.objects.create(user=other, artist_name='画家乙')
+        cls.painting = Category.objects.create(name='绘画')
+        cls.oil = Category.objects.create(name='油画', parent=cls.painting)
+        cls.watercolor = Category.objects.create(name='水彩', parent=cls.painting)
+        cls.sculpture = Category.objects.create(name='雕塑')
+
+        cls.fresh = cls.create(cls.oil, views=10)
+        cls.stale = cls.create(cls.oil, views=11, age_days=60)
+        cls.popular = cls.create(cls.watercolor, views=1000, age_days=60)
+        cls.statue = cls.create(cls.sculpture, views=1, age_days=60, artist=cls.other_artist)
+        # 非原创作品不进入排行榜
+        cls.copy = cls.create(cls.oil, views=5000, is_original=False)
+
+    @classmethod
+    def create(cls, category, views, age_days=0, artist=None, **fields):
+        product = Product.objects.create(
+            title='作品', description='描述', artist=artist or cls.artist, category=category,
+            price=Decimal('100'), status='published', views_count=views, **fields
+        )
+        if age_days:
+            Product.objects.filter(pk=product.pk).update(created_at=timezone.now() - timedelta(days=age_days))
+        return product
+
+    def setUp(self):
+        cache.clear()
+        invalidate_category_tree()
+
+    def ranked(self, scope='overall', scope_id=0):
+        return list(ranked_products(Product.objects.all(), scope, scope_id))
+
+    def test_time_decay(self):
+        config = get_ranking_settings()
+        self.assertEqual(time_decay(0, config), 1)
+        self.assertAlmostEqual(time_decay(config['HALF_LIFE_DAYS'] * 24, config), 0.5)
+        gravity = dict(config, DECAY='gravity')
+        self.assertEqual(time_decay(0, gravity), 1)
+        self.assertGreater(time_decay(24, gravity), time_decay(48, gravity))
+        # 同样的热度，新作品得分更高；足够热门的旧作品仍可排在前面
+        self.assertGreater(score_product(10, 0, 0, 0, config), score_product(10, 0, 0, 24 * 60, config))
+        self.assertGreater(score_product(1000, 0, 0, 24 * 60, config), score_product(10, 0, 0, 24 * 60, config))
+
+    def test_scope_ordering(self):
+        compute_rankings()
+        self.assertEqual(self.ranked(), [self.fresh, self.popular, self.stale, self.statue])
+        # 父分类榜单包含子分类的作品
+        self.assertEqual(self.ranked('category', self.painting.pk), [self.fresh, self.popular, self.stale])
+        self.assertEqual(self.ranked('category', self.oil.pk), [self.fresh, self.stale])
+        self.assertEqual(self.ranked('artist', self.other_artist.pk), [self.statue])
+
+    @override_settings(PRODUCT_RANKING={'TOP_N': 2})
+    def test_top_n(self):
+        compute_rankings()
+        self.assertEqual(self.ranked(), [self.fresh, self.popular])
+        self.assertEqual(ProductRanking.objects.filter(scope='category', scope_id=self.painting.pk).count(), 2)
+
+    def test_featured_falls_back_when_rankings_are_empty(self):
+        self.assertFalse(ProductRanking.objects.exists())
+        data = self.client.get('/api/products/featured/?limit=10').json()
+        self.assertEqual([row['id'] for row in data], [self.popular.pk, self.stale.pk, self.fresh.pk, self.statue.pk])
+        # 分类榜单不回退
+        self.assertEqual(self.client.get(f'/api/products/featured/?category={self.oil.pk}').json(), [])
+
+        compute_rankings()
+        data = self.client.get('/api/products/featured/?limit=10').json()
+        self.assertEqual([row['id'] for row in data], [self.fresh.pk, self.popular.pk, self.stale.pk, self.statue.pk])
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES,
+    PRODUCT_SIMILARITY={'TOP_K': 3, 'BLOCK_SIZE': 4, 'COLUMN_BLOCK_SIZE': 5},
+)
+class SimilarityTests(TestCase):
+    """相似作品：增量计算与全量计算结果一致，下架商品从其他商品的列表中移除"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('artist', password='pw', user_type='artist')
+        artist = ArtistProfile.objects.create(user=user, artist_name='画家甲')
+        painting = Category.objects.create(name='绘画')
+        categories = [Category.objects.create(name=f'子分类{i}', parent=painting) for i in range(3)]
+        cls.tags = [ProductTag.objects.create(name=f'标签{i}') for i in range(4)]
+        materials = [['油画布'], ['宣纸'], ['油画布', '木板'], []]
+        techniques = [['写实'], ['写意'], []]
+        cls.products = []
+        for i in range(14):
+            product = Product.objects.create(
+                title=f'作品{i}', description='描述', artist=artist, category=categories[i % 3],
+                price=Decimal('100'), status='published',
+                materials=materials[i % 4], techniques=techniques[i % 3],
+            )
+            ProductTagRelation.objects.create(product=product, tag=cls.tags[i % 4])
+            cls.products.append(product)
+
+    def setUp(self):
+        cache.clear()
+        invalidate_category_tree()
+        compute_similarities(full=True)
+
+    def snapshot(self):
+        return sorted(
+            (row.product_id, row.rank, row.neighbor_id, round(row.score, 5))
+            for row in ProductSimilarity.objects.all()
+        )
+
+    def assertIncrementalMatchesFull(self):
+        self.assertGreater(compute_similarities(), 0)
+        incremental = self.snapshot()
+        compute_similarities(full=True)
+        self.assertEqual(incremental, self.snapshot())
+
+    def test_incremental_after_tag_edit(self):
+        ProductTagRelation.objects.create(product=self.products[0], tag=self.tags[1])
+        ProductTagRelation.objects.filter(product=self.products[5], tag=self.tags[1]).delete()
+        self.assertIncrementalMatchesFull()
+
+    def test_incremental_after_material_edit(self):
+        product = self.products[3]
+        product.materials = ['宣纸']
+        product.techniques = ['写意']
+        product.save()
+        self.assertIncrementalMatchesFull()
+
+    def test_no_changes_recomputes_nothing(self):
+        before = self.snapshot()
+        self.assertEqual(compute_similarities(), 0)
+        self.assertEqual(self.snapshot(), before)
+
+    def test_unpublished_product_leaves_neighbour_lists(self):
+        product = self.products[2]
+        self.assertTrue(ProductSimilarity.objects.filter(neighbor=product).exists())
+        product.status = 'draft'
+        product.save()
+        compute_similarities()
+        self.assertFalse(ProductSimilarity.objects.filter(neighbor=product).exists())
+        self.assertFalse(ProductSimilarity.objects.filter(product=product).exists())
+        for other in self.products[:2]:
+            self.assertEqual(len(similar_products(Product.objects.all(), other.pk)), 3)
+        incremental = self.snapshot()
+        compute_similarities(full=True)
+        self.assertEqual(incremental, self.snapshot())
+
+
+@override_settings(CACHES=LOCMEM_CACHES, COUNTER_WRITE_BEHIND=True, COUNTER_FLUSH_INTERVAL=3600)
+class CounterBufferTests(TestCase):
+    """计数写缓冲：增量合并为分组的 F() 更新，读取时合并缓冲中的增量"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('artist', password='pw', user_type='artist')
+        artist = ArtistProfile.objects.create(user=user, artist_name='画家甲')
+        category = Category.objects.create(name='绘画')
+        cls.products = [
+            Product.objects.create(
+                title=f'作品{i}', description='描述', artist=artist, category=category,
+                price=Decimal('100'), status='published', views_count=10,
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.buffer = CounterBuffer()
+        for target in ['blendlumina.counters.counter_buffer', 'products.views.counter_buffer']:
+            patcher = mock.patch(target, self.buffer)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch('products.signals.recompute_in_background')
+        self.recompute = patcher.start()
+        self.addCleanup(patcher.stop)
+        # 先于 patch 还原执行，取消刷新定时器
+        self.addCleanup(self.buffer.flush)
+
+    def counts(self, product):
+        return tuple(Product.objects.filter(pk=product.pk).values_list('views_count', 'likes_count').get())
+
+    def test_flush_writes_grouped_updates(self):
+        first, second, third = self.products
+        for _ in range(3):
+            self.buffer.increment(first, 'views_count')
+            self.buffer.increment(second, 'views_count')
+        self.assertEqual(self.buffer.increment(first, 'likes_count'), 1)
+        self.buffer.increment(third, 'likes_count')
+        self.assertEqual(self.counts(first), (10, 0))
+
+        # (views_count, +3) 与 (likes_count, +1) 各一条 UPDATE
+        with self.assertNumQueries(2):
+            self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(self.counts(first), (13, 1))
+        self.assertEqual(self.counts(second), (13, 0))
+        self.assertEqual(self.counts(third), (10, 1))
+        self.recompute.assert_called_once_with()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.buffer.flush(), 0)
+
+    def test_live_counter_field_includes_buffered_increments(self):
+        product = self.products[0]
+        url = f'/api/products/{product.pk}/'
+        self.assertEqual(self.client.post(f'{url}increment_views/').json()['views_count'], 11)
+        self.assertEqual(self.client.post(f'{url}increment_views/').json()['views_count'], 12)
+        self.assertEqual(self.client.get(url).json()['views_count'], 12)
+        self.assertEqual(self.counts(product), (10, 0))
+
+        self.buffer.flush()
+        self.assertEqual(self.counts(product), (12, 0))
+        self.assertEqual(self.client.get(url).json()['views_count'], 12)
+
+    @override_settings(COUNTER_WRITE_BEHIND=False)
+    def test_without_write_behind_updates_immediately(self):
+        product = self.products[0]
+        self.assertEqual(self.buffer.increment(product, 'views_count'), 11)
+        self.assertEqual(self.counts(product), (11, 0))
+        self.assertEqual(self.buffer.flush(), 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ConditionalRetrieveTests(TestCase):
+    """商品详情的条件请求：未变化时 304，商品、图片或标签变化后重新返回 200"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('artist', password='pw', user_type='artist')
+        artist = ArtistProfile.objects.create(user=user, artist_name='画家甲')
+        category = Category.objects.create(name='绘画')
+        cls.tag = ProductTag.objects.create(name='山水')
+        cls.product = Product.objects.create(
+            title='作品', description='描述', artist=artist, category=category,
+            price=Decimal('100'), status='published',
+        )
+        cls.url = f'/api/products/{cls.product.pk}/'
+
+    def setUp(self):
+        cache.clear()
+        invalidate_category_tree()
+
+    def validators(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        return response['ETag'], response['Last-Modified']
+
+    def assertNotModified(self, etag, last_modified):
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+    def assertModified(self, etag, last_modified):
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+    @contextmanager
+    def later(self, seconds=5):
+        # Last-Modified 精确到秒，变更时把时间拨后（updated_at 与版本号的递增时间）
+        now = timezone.now() + timedelta(seconds=seconds)
+        with mock.patch('django.utils.timezone.now', return_value=now), \
+                mock.patch('blendlumina.generations.time.time', return_value=now.timestamp()):
+            yield
+
+    def test_unchanged_product_is_not_modified(self):
+        etag, last_modified = self.validators()
+        self.assertNotModified(etag, last_modified)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='W/"other"').status_code, 200)
+
+    def test_product_change(self):
+        etag, last_modified = self.validators()
+        with self.later():
+            self.product.price = Decimal('120')
+            self.product.save()
+        self.assertModified(etag, last_modified)
+        self.assertNotModified(*self.validators())
+
+    def test_image_change(self):
+        etag, last_modified = self.validators()
+        with self.later():
+            ProductImage.objects.create(product=self.product, image='products/new.jpg', is_primary=True)
+        self.assertModified(etag, last_modified)
+
+    def test_tag_change(self):
+        etag, last_modified = self.validators()
+        with self.later():
+            relation = ProductTagRelation.objects.create(product=self.product, tag=self.tag)
+        self.assertModified(etag, last_modified)
+
+        # 标签改名只递增标签表的版本号，同样使详情失效
+        etag, last_modified = self.validators()
+        with self.later(10), self.captureOnCommitCallbacks(execute=True):
+            relation.tag.name = '花鸟'
+            relation.tag.save()
+        self.assertModified(etag, last_modified)
+
+
+class ImportInterrupted(Exception):
+    pass
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductImportTests(TestCase):
+    """批量导入：CSV 列表字段、JSONL 坏行、艺术家与分类的查找、断点续传、无 RETURNING 时取回主键"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('painter', password='pw', user_type='artist')
+        cls.artist = ArtistProfile.objects.create(user=user, artist_name='画家甲')
+        # 两位同名艺术家，按名称导入时不唯一
+        for username in ['twin1', 'twin2']:
+            twin = User.objects.create_user(username, password='pw', user_type='artist')
+            ArtistProfile.objects.create(user=twin, artist_name='同名画家')
+        cls.painting = Category.objects.create(name='绘画')
+        cls.oil = Category.objects.create(name='油画', parent=cls.painting)
+        cls.print = Category.objects.create(name='版画')
+        # 与 绘画/油画 同名的子分类
+        Category.objects.create(name='油画', parent=cls.print)
+
+    def setUp(self):
+        cache.clear()
+        invalidate_category_tree()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def write_jsonl(self, name, records):
+        return self.write(name, ''.join(
+            (record if isinstance(record, str) else json.dumps(record, ensure_ascii=False)) + '\n'
+            for record in records
+        ))
+
+    def record(self, title, **fields):
+        return {'title': title, 'description': '描述', 'artist': 'painter', 'category': '绘画', 'price': '100', **fields}
+
+    def run_import(self, path, **options):
+        errors = []
+        importer = ProductImporter(on_error=lambda line, record, detail: errors.append((line, detail)), **options)
+        return importer.run(path), errors
+
+    def test_csv_splits_list_fields(self):
+        path = self.write('products.csv', (
+            'title,description,artist,category,price,materials,techniques,tags\n'
+            '秋山,描述,painter,绘画/油画,120,油画布| 木板 ,写实,山水|秋景\n'
+            '冬雪,描述,画家甲,版画,80,,,\n'
+        ))
+        call_command('import_products', path, stdout=StringIO(), stderr=StringIO())
+
+        autumn = Product.objects.get(title='秋山')
+        self.assertEqual((autumn.artist_id, autumn.category_id), (self.artist.pk, self.oil.pk))
+        self.assertEqual(autumn.materials, ['油画布', '木板'])
+        self.assertEqual(autumn.techniques, ['写实'])
+        self.assertEqual(
+            sorted(autumn.producttagrelation_set.values_list('tag__name', flat=True)), ['山水', '秋景']
+        )
+        winter = Product.objects.get(title='冬雪')
+        self.assertEqual((winter.category_id, winter.materials), (self.print.pk, []))
+        # 导入的商品进入全文索引
+        self.assertEqual(list(rank_products(Product.objects.all(), '秋山')), [autumn])
+
+    def test_jsonl_rejects_bad_lines(self):
+        path = self.write_jsonl('products.jsonl', [
+            self.record('甲'),
+            '{not json',
+            '["not", "an", "object"]',
+            self.record('乙', price='-1'),
+            self.record('丙', materials=['宣纸']),
+        ])
+        errors_path = os.path.join(self.directory, 'errors.jsonl')
+        stderr = StringIO()
+        call_command('import_products', path, errors=errors_path, stdout=StringIO(), stderr=stderr)
+
+        self.assertEqual(sorted(Product.objects.values_list('title', flat=True)), ['丙', '甲'])
+        with open(errors_path, encoding='utf-8') as f:
+            rejected = [json.loads(line) for line in f]
+        self.assertEqual([row['line'] for row in rejected], [2, 3, 4])
+        self.assertIn('price', rejected[2]['errors'])
+        self.assertIn('第 2 行校验失败', stderr.getvalue())
+
+    def test_artist_and_category_lookups(self):
+        path = self.write_jsonl('products.jsonl', [
+            self.record('按ID', artist=str(self.artist.pk), category=str(self.oil.pk)),
+            self.record('按名称', artist='画家甲', category='绘画/油画'),
+            self.record('同名艺术家', artist='同名画家'),
+            self.record('未知艺术家', artist='nobody'),
+            self.record('同名分类', category='油画'),
+            self.record('未知分类', category='雕塑'),
+        ])
+        stats, errors = self.run_import(path)
+
+        self.assertEqual((stats['imported'], stats['rejected']), (2, 4))
+        self.assertEqual(
+            set(Product.objects.values_list('artist_id', 'category_id')), {(self.artist.pk, self.oil.pk)}
+        )
+        messages = {line: str(next(iter(detail.values()))[0]) for line, detail in errors}
+        self.assertIn('不唯一', messages[3])
+        self.assertIn('不存在', messages[4])
+        self.assertIn('不唯一', messages[5])
+        self.assertIn('不存在', messages[6])
+
+    def test_checkpoint_resume(self):
+        path = self.write_jsonl('products.jsonl', [self.record(f'作品{i}') for i in range(5)])
+        checkpoint = os.path.join(self.directory, 'checkpoint.json')
+
+        def interrupt(stats):
+            raise ImportInterrupted
+
+        with self.assertRaises(ImportInterrupted):
+            ProductImporter(batch_size=2, checkpoint=checkpoint, on_batch=interrupt).run(path)
+        self.assertEqual(Product.objects.count(), 2)
+
+        stats = ProductImporter(batch_size=2, checkpoint=checkpoint).run(path)
+        self.assertEqual((stats['skipped'], stats['read'], stats['imported']), (2, 3, 3))
+        self.assertEqual(
+            sorted(Product.objects.values_list('title', flat=True)), [f'作品{i}' for i in range(5)]
+        )
+        # 检查点属于另一个导入源时拒绝续传
+        other = self.write_jsonl('other.jsonl', [self.record('其他')])
+        with self.assertRaises(ValueError):
+            ProductImporter(checkpoint=checkpoint).run(other)
+
+    def test_recover_pks_without_returning(self):
+        Product.objects.create(
+            title='重名', description='描述', artist=self.artist, category=self.painting, price=Decimal('100')
+        )
+        path = self.write_jsonl('products.jsonl', [
+            self.record('重名', tags=['第一']),
+            self.record('重名', tags=['第二']),
+            self.record('独有', tags=['第三']),
+        ])
+        features = type(connection.features)
+        recover_pks = mock.Mock(side_effect=ProductImporter.recover_pks)
+        with mock.patch.object(features, 'can_return_rows_from_bulk_insert', False), \
+                mock.patch.object(ProductImporter, 'recover_pks', recover_pks):
+            stats, errors = self.run_import(path)
+        self.assertEqual((stats['imported'], errors), (3, []))
+        recover_pks.assert_called_once()
+
+        imported = list(Product.objects.filter(producttagrelation__isnull=False).order_by('pk'))
+        self.assertEqual(
+            [(product.title, product.producttagrelation_set.get().tag.name) for product in imported],
+            [('重名', '第一'), ('重名', '第二'), ('独有', '第三')],
+        )
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHES,
+    IMAGE_PIPELINE_ASYNC=False,
+    IMAGE_DERIVATIVES={'thumb': 40, 'medium': 100},
+)
+class ImageDerivativeTests(TestCase):
+    """上传图片提交后生成 WebP 衍生图，记录尺寸并出现在 srcset 中"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('artist', password='pw', user_type='artist')
+        artist = ArtistProfile.objects.create(user=user, artist_name='画家甲')
+        category = Category.objects.create(name='绘画')
+        cls.product = Product.objects.create(
+            title='作品', description='描述', artist=artist, category=category,
+            price=Decimal('100'), status='published',
+        )
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = override_settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def upload(self, name, size):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'red').save(buffer, format='PNG')
+        with self.captureOnCommitCallbacks(execute=True):
+            return ProductImage.objects.create(
+                product=self.product, image=SimpleUploadedFile(name, buffer.getvalue()), is_primary=True
+            )
+
+    def test_derivatives_and_srcset(self):
+        image = self.upload('work.png', (200, 120))
+        image.refresh_from_db()
+        self.assertEqual((image.width, image.height), (200, 120))
+        self.assertEqual(image.derivatives['source'], image.image.name)
+        self.assertEqual(
+            {name: (image.derivatives[name]['width'], image.derivatives[name]['height']) for name in ['thumb', 'medium']},
+            {'thumb': (40, 24), 'medium': (100, 60)},
+        )
+        with default_storage.open(image.derivatives['thumb']['name'], 'rb') as f:
+            self.assertEqual(Image.open(f).format, 'WEBP')
+
+        urls = srcset(image)
+        self.assertEqual(set(urls), {'original', 'thumb', 'medium'})
+        self.assertTrue(urls['thumb'].endswith('.webp'))
+        data = self.client.get(f'/api/products/{self.product.pk}/').json()
+        self.assertEqual(data['images'][0]['srcset']['medium'], f'http://testserver{urls["medium"]}')
+
+    def test_unchanged_image_is_not_rendered_again(self):
+        image = self.upload('work.png', (200, 120))
+        image.refresh_from_db()
+        with mock.patch('products.images.render_derivatives') as render, self.captureOnCommitCallbacks(execute=True):
+            image.alt_text = '红色'
+            image.save()
+        render.assert_not_called()
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class BulkAttachTests(TestCase):
+    """作品图片和标签的批量写入：查询数不随图片数或标签数增长"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('artist', password='pw', user_type='artist')
+        artist = ArtistProfile.objects.create(user=user, artist_name='画家甲')
+        category = Category.objects.create(name='绘画')
+        cls.products = [
+            Product.objects.create(
+                title=f'作品{i}', description='描述', artist=artist, category=category,
+                price=Decimal('100'), status='published',
+            )
+            for i in range(2)
+        ]
+        ProductTag.objects.create(name='山水')
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        media = override_settings(MEDIA_ROOT=directory.name)
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def files(self, count):
+        return [SimpleUploadedFile(f'p{i}.jpg', b'jpeg') for i in range(count)]
+
+    def count_queries(self, function, *args, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            function(*args, **kwargs)
+        return len(queries)
+
+    def test_attach_images(self):
+        small, large = self.products
+        self.assertEqual(self.count_queries(attach_images, small, self.files(1)),
+                         self.count_queries(attach_images, large, self.files(6), alt_texts=['一', '二']))
+
+        images = list(large.images.order_by('sort_order'))
+        self.assertEqual([image.sort_order for image in images], list(range(6)))
+        self.assertEqual([image.is_primary for image in images], [True] + [False] * 5)
+        self.assertEqual([image.alt_text for image in images[:3]], ['一', '二', ''])
+        self.assertEqual(Product.objects.get(pk=large.pk).card.primary_image['image'], images[0].image.name)
+
+        # 追加的图片接在已有图片之后，不再设置主图
+        attach_images(large, self.files(2), append=True)
+        images = list(large.images.order_by('sort_order'))
+        self.assertEqual([image.sort_order for image in images], list(range(8)))
+        self.assertEqual(sum(image.is_primary for image in images), 1)
+
+    def test_attach_tags(self):
+        small, large = self.products
+        names = ['山水', ' 花鸟 ', '花鸟', '', '人物', '秋景', '冬雪', '夜色', '晨光']
+        self.assertEqual(self.count_queries(attach_tags, small, ['新标签']),
+                         self.count_queries(attach_tags, large, names))
+
+        expected = ['人物', '冬雪', '夜色', '山水', '晨光', '秋景', '花鸟']
+        self.assertEqual(sorted(large.producttagrelation_set.values_list('tag__name', flat=True)), expected)
+        self.assertEqual(ProductTag.objects.filter(name='山水').count(), 1)
+        self.assertEqual(sorted(tag['name'] for tag in Product.objects.get(pk=large.pk).card.tags), expected)
+
+        # 已关联的标签被忽略
+        attach_tags(large, ['山水', '花鸟'])
+        self.assertEqual(large.producttagrelation_set.count(), 7)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class AttributeFilterTests(TestCase):
+    """材质和技法筛选：任一 / 全部匹配，属性行随商品保存同步"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('artist', password='pw', user_type='artist')
+        artist = ArtistProfile.objects.create(user=user, artist_name='画家甲')
+        category = Category.objects.create(name='绘画')
+
+        def create(title, price, materials, techniques):
+            return Product.objects.create(
+                title=title, description='描述', artist=artist, category=category, price=Decimal(price),
+                status='published', materials=materials, techniques=techniques,
+            )
+
+        cls.panel = create('木板油画', '100', ['油画布', '木板'], ['写实'])
+        cls.canvas = create('布面油画', '200', [' Canvas ', '油画布'], ['写意'])
+        cls.paper = create('水墨', '300', ['宣纸'], [])
+
+    def setUp(self):
+        cache.clear()
+
+    def matching(self, subquery):
+        return set(Product.objects.filter(id__in=subquery).values_list('title', flat=True))
+
+    def listed(self, query):
+        response = self.client.get(f'/api/products/?{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return {row['title'] for row in response.json()['results']}
+
+    def test_any_and_all(self):
+        self.assertEqual(self.matching(products_with_any('material', ['木板', '宣纸'])), {'木板油画', '水墨'})
+        self.assertEqual(self.matching(products_with_all('material', ['油画布', '木板'])), {'木板油画'})
+        self.assertEqual(self.matching(products_with_all('material', ['油画布', '宣纸'])), set())
+
+        self.assertEqual(self.listed('materials=木板, 宣纸'), {'木板油画', '水墨'})
+        self.assertEqual(self.listed('materials_all=油画布,canvas'), {'布面油画'})
+        self.assertEqual(self.listed('techniques=写实,写意'), {'木板油画', '布面油画'})
+        self.assertEqual(self.listed('materials=油画布&price_min=150&price_max=300'), {'布面油画'})
+
+    def test_attributes_follow_product_edits(self):
+        self.paper.materials = ['宣纸', '木板']
+        self.paper.save(update_fields=['materials'])
+        self.assertEqual(self.matching(products_with_all('material', ['宣纸', '木板'])), {'水墨'})
+
+        self.panel.materials = ['油画布']
+        self.panel.save()
+        self.assertEqual(self.listed('materials=木板'), {'水墨'})
+
+        # 未涉及材质和技法的保存不重写属性行
+        self.panel.materials = ['宣纸']
+        self.panel.save(update_fields=['price'])
+        self.assertEqual(self.listed('materials=油画布'), {'木板油画', '布面油画'})
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ProductCardTests(TestCase):
+    """商品卡片随图片、标签和艺术家名变化重建，列表页读取卡片"""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('artist', password='pw', user_type='artist')
+        cls.artist = ArtistProfile.objects.create(user=user, artist_name='画家甲')
+        category = Category.objects.create(name='绘画')
+        cls.tag = ProductTag.objects.create(name='山水', color='#000000')
+        cls.product = Product.objects.create(
+            title='作品', description='描述', artist=cls.artist, category=category,
+            price=Decimal('100'), status='published',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def listed(self):
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['results'][0]
+
+    def card(self):
+        return Product.objects.select_related('card').get(pk=self.product.pk).card
+
+    def test_card_is_built_on_create(self):
+        card = self.card()
+        self.assertEqual((card.artist_name, card.primary_image, card.tags), ('画家甲', None, []))
+
+    def test_image_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = ProductImage.objects.create(product=self.product, image='products/a.jpg', is_primary=True)
+        self.assertEqual(self.card().primary_image['image'], 'products/a.jpg')
+        self.assertTrue(self.listed()['primary_image']['image'].endswith('products/a.jpg'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+        self.assertIsNone(self.card().primary_image)
+        self.assertIsNone(self.listed()['primary_image'])
+
+    def test_tag_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductTagRelation.objects.create(product=self.product, tag=self.tag)
+        self.assertEqual(self.card().tags, [{'id': self.tag.pk, 'name': '山水', 'color': '#000000'}])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tag.name = '花鸟'
+            self.tag.color = '#ff0000'
+            self.tag.save()
+        self.assertEqual(self.listed()['tags'], [{'id': self.tag.pk, 'name': '花鸟', 'color': '#ff0000'}])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductTagRelation.objects.filter(product=self.product).delete()
+        self.assertEqual(self.card().tags, [])
+
+    def test_artist_rename(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.artist.artist_name = '画家乙'
+            self.artist.save()
+        self.assertEqual(self.card().artist_name, '画家乙')
+        self.assertEqual(self.listed()['artist_name'], '画家乙')
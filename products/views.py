@@ -5,7 +5,18 @@ from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db import transaction
-from .models import Category, PriceRange, SizeRange, Usage, Product, ProductImage, ProductTag, ProductTagRelation
+from django.http import Http404
+from blendlumina.conditional import ConditionalRetrieveMixin
+from blendlumina.counters import counter_buffer
+from blendlumina.pagination import HybridPagination
+from blendlumina.response_cache import CachedResponseMixin
+from .models import Category, PriceRange, SizeRange, Usage, Product, ProductImage, ProductTag
+from .category_tree import CATEGORY_GENERATION, get_category_tree
+from .filters import ProductFilter, ProductSearchFilter
+from .facets import get_facets
+from .ingest import attach_images, attach_tags
+from .rankings import get_ranking_settings, ranked_products
+from .similarity import get_similarity_settings, similar_products
 from .serializers import (
     CategorySerializer, PriceRangeSerializer, SizeRangeSerializer, UsageSerializer,
     ProductSerializer, ProductListSerializer, ProductImageSerializer, ProductTagSerializer,
@@ -16,53 +27,83 @@ from .serializers import (
 # Create your views here.
 
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.filter(is_active=True)
     serializer_class = CategorySerializer
     permission_classes = [permissions.AllowAny]
+    cache_models = [Category]
+    # 数据来自分类树快照，未命中缓存时最多重建一次快照
+    query_budgets = {'list': 3, 'retrieve': 3, 'root_categories': 3}
     
     def list(self, request, *args, **kwargs):
-        """重写list方法，返回数组格式而不是分页格式"""
-        queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(queryset, many=True)
+        """重写list方法，返回数组格式而不是分页格式；数据来自分类树快照"""
+        serializer = self.get_serializer(get_category_tree().nodes(), many=True)
+        return Response(serializer.data)
+    
+    def retrieve(self, request, *args, **kwargs):
+        """从分类树快照获取单个分类"""
+        try:
+            category = get_category_tree().get(int(kwargs[self.lookup_field]))
+        except (TypeError, ValueError):
+            category = None
+        if category is None or not category.is_active:
+            raise Http404
+        serializer = self.get_serializer(category)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def root_categories(self, request):
         """获取根分类"""
-        root_categories = self.queryset.filter(parent__isnull=True)
-        serializer = self.get_serializer(root_categories, many=True)
+        serializer = self.get_serializer(get_category_tree().roots(), many=True)
         return Response(serializer.data)
 
 
-class PriceRangeViewSet(viewsets.ReadOnlyModelViewSet):
+class PriceRangeViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     queryset = PriceRange.objects.all()
     serializer_class = PriceRangeSerializer
     permission_classes = [permissions.AllowAny]
+    cache_models = [PriceRange]
 
 
-class SizeRangeViewSet(viewsets.ReadOnlyModelViewSet):
+class SizeRangeViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     queryset = SizeRange.objects.all()
     serializer_class = SizeRangeSerializer
     permission_classes = [permissions.AllowAny]
+    cache_models = [SizeRange]
 
 
-class UsageViewSet(viewsets.ReadOnlyModelViewSet):
+class UsageViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Usage.objects.all()
     serializer_class = UsageSerializer
     permission_classes = [permissions.AllowAny]
+    cache_models = [Usage]
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ConditionalRetrieveMixin, viewsets.ModelViewSet):
     queryset = Product.objects.filter(status='published')
     serializer_class = ProductSerializer
     permission_classes = [permissions.AllowAny]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = ['category', 'artist', 'status', 'is_original', 'is_limited']
+    # ProductSearchFilter 需放在 OrderingFilter 之后，以便全文检索按相关度排序
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, ProductSearchFilter]
+    filterset_class = ProductFilter
     search_fields = ['title', 'description']
     ordering_fields = ['price', 'created_at', 'views_count', 'likes_count']
     ordering = ['-created_at']
+    pagination_class = HybridPagination
     parser_classes = [MultiPartParser, FormParser]
+    # 详情中嵌套的分类和标签来自其他表，其版本号参与条件请求校验
+    validator_generations = [CATEGORY_GENERATION, 'products.producttag']
+    # 单个 action 的 SQL 查询上限（含会话认证的 2 次查询），见 blendlumina/query_budget.py
+    query_budgets = {
+        'list': 6, 'retrieve': 5, 'featured': 5, 'similar': 5, 'facets': 6, 'by_category': 6,
+    }
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            # 列表页的主图、艺术家名和标签来自商品卡片，整页一次查询
+            queryset = queryset.select_related('card')
+        return queryset
     
     def get_serializer_class(self):
         if self.action == 'list':
@@ -85,34 +126,88 @@ class ProductViewSet(viewsets.ModelViewSet):
     def increment_views(self, request, pk=None):
         """增加浏览量"""
         product = self.get_object()
-        product.views_count += 1
-        product.save()
-        return Response({'message': '浏览量增加成功'})
+        views_count = counter_buffer.increment(product, 'views_count')
+        return Response({'message': '浏览量增加成功', 'views_count': views_count})
     
     @action(detail=True, methods=['post'])
     def increment_likes(self, request, pk=None):
         """增加点赞数"""
         product = self.get_object()
-        product.likes_count += 1
-        product.save()
-        return Response({'message': '点赞成功'})
+        likes_count = counter_buffer.increment(product, 'likes_count')
+        return Response({'message': '点赞成功', 'likes_count': likes_count})
     
     @action(detail=False, methods=['get'])
     def featured(self, request):
-        """获取推荐商品"""
-        featured_products = self.queryset.filter(is_original=True).order_by('-views_count')[:10]
+        """获取推荐商品，读取预计算排行榜；可按 category 或 artist 获取对应榜单"""
+        scope, scope_id = 'overall', 0
+        try:
+            if request.query_params.get('category'):
+                scope, scope_id = 'category', int(request.query_params['category'])
+            elif request.query_params.get('artist'):
+                scope, scope_id = 'artist', int(request.query_params['artist'])
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response({'error': '参数格式错误'}, status=400)
+        limit = max(1, min(limit, get_ranking_settings()['TOP_N']))
+        
+        featured_products = list(
+            ranked_products(self.queryset, scope, scope_id).select_related('card')[:limit]
+        )
+        if not featured_products and scope == 'overall':
+            # 排行榜尚未计算时退回实时排序
+            featured_products = self.queryset.filter(is_original=True).order_by('-views_count').select_related(
+                'card'
+            )[:limit]
         serializer = ProductListSerializer(featured_products, many=True)
         return Response(serializer.data)
     
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """相似作品，读取预计算的近邻表"""
+        try:
+            product_id = int(pk)
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            return Response({'error': '参数格式错误'}, status=400)
+        limit = max(1, min(limit, get_similarity_settings()['TOP_K']))
+        
+        similar = list(
+            similar_products(self.queryset, product_id).select_related('card')[:limit]
+        )
+        if not similar and not self.queryset.filter(pk=product_id).exists():
+            raise Http404
+        serializer = ProductListSerializer(similar, many=True)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """分面统计：按分类（含父分类汇总）、价格区间、尺寸区间、原创、限量计数"""
+        facets = get_facets(request.query_params, lambda: self.filter_queryset(self.get_queryset()))
+        return Response(facets)
+    
     @action(detail=False, methods=['get'])
     def by_category(self, request):
-        """按分类获取商品"""
+        """按分类获取商品（包含所有子分类），分页返回"""
         category_id = request.query_params.get('category_id')
-        if category_id:
-            products = self.queryset.filter(category_id=category_id)
-            serializer = ProductListSerializer(products, many=True)
-            return Response(serializer.data)
-        return Response({'error': '请提供分类ID'}, status=400)
+        if not category_id:
+            return Response({'error': '请提供分类ID'}, status=400)
+        try:
+            category = get_category_tree().get(int(category_id))
+        except ValueError:
+            category = None
+        if category is None or not category.path:
+            return Response({'error': '分类不存在'}, status=404)
+        
+        # 按物化路径前缀做一次范围查询取整棵子树的商品，未启用的子分类及其后代除外
+        products = self.filter_queryset(self.get_queryset()).filter(
+            category__path__startswith=category.path
+        )
+        for path in get_category_tree().inactive_subtree_paths(category.id):
+            products = products.exclude(category__path__startswith=path)
+        products = products.select_related('card')
+        page = self.paginate_queryset(products)
+        serializer = ProductListSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
     
     @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def upload_work(self, request):
@@ -127,29 +222,21 @@ class ProductViewSet(viewsets.ModelViewSet):
                 
                 # 创建作品
                 product_data = request.data.copy()
-                product_data['artist'] = request.user.artist_profile.id
                 product_data['status'] = 'draft'  # 默认为草稿状态
                 
                 serializer = ProductCreateSerializer(data=product_data)
                 if serializer.is_valid():
-                    product = serializer.save()
+                    product = serializer.save(artist=request.user.artist_profile)
                     
-                    # 处理图片上传
+                    # 处理图片上传（第一张图片设为主图），衍生图在事务提交后由后台进程池生成
                     images = request.FILES.getlist('images')
-                    for i, image in enumerate(images):
-                        ProductImage.objects.create(
-                            product=product,
-                            image=image,
-                            alt_text=request.data.get(f'image_alt_{i}', ''),
-                            is_primary=(i == 0),  # 第一张图片设为主图
-                            sort_order=i
-                        )
+                    attach_images(
+                        product, images,
+                        alt_texts=[request.data.get(f'image_alt_{i}', '') for i in range(len(images))],
+                    )
                     
                     # 处理标签
-                    tag_names = request.data.getlist('tags')
-                    for tag_name in tag_names:
-                        tag, created = ProductTag.objects.get_or_create(name=tag_name)
-                        ProductTagRelation.objects.create(product=product, tag=tag)
+                    attach_tags(product, request.data.getlist('tags'))
                     
                     return Response({
                         'message': '作品上传成功',